@@ -0,0 +1,158 @@
+import glob
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import typer
+from tqdm import tqdm
+from typer import Typer
+from typing_extensions import Annotated
+
+from entrypoint.config import BASE_DIR, MANIFEST_DIR
+from models.row import HfRow, RequeueRow
+from services.audio_qc import DEFAULT_QC_THRESHOLDS, QcThresholds, safe_check_audio
+from services.global_index import AUDIO_INDEX, open_global_index
+from services.manifest import load_manifest
+from services.resampler import safe_resample_wav
+
+app = Typer(help="Команды для проверки и обработки аудио.")
+
+
+def _read_metadata(dataset_path: str) -> list[HfRow]:
+    with open(os.path.join(dataset_path, "metadata.jsonl"), encoding="utf-8") as metadata_file:
+        return [HfRow.model_validate_json(line) for line in metadata_file if line.strip()]
+
+
+def _rewrite_metadata(dataset_path: str, rows: list[HfRow]) -> None:
+    metadata_path = os.path.join(dataset_path, "metadata.jsonl")
+    tmp_path = f"{metadata_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as metadata_file:
+        for row in rows:
+            metadata_file.write(row.to_jsonl())
+    os.replace(tmp_path, metadata_path)
+
+
+@app.command()
+def qc(
+        dataset_path: Annotated[str, typer.Option(
+            exists=True, file_okay=False, resolve_path=True,
+            help="Папка датасета с metadata.jsonl, например output_elevenlabs/den4ikai")],
+        workers: Annotated[int, typer.Option(min=1, show_default=True)] = os.cpu_count() or 1,
+        trim: Annotated[bool, typer.Option("--trim", help="Обрезать тишину по краям клипов")] = False,
+        drop_rejected: Annotated[bool, typer.Option(
+            "--drop-rejected", help="Удалить забракованные клипы из metadata.jsonl и с диска")] = False,
+        max_edge_silence: Annotated[float, typer.Option(show_default=True)] = DEFAULT_QC_THRESHOLDS.max_edge_silence,
+        silence_db: Annotated[float, typer.Option(show_default=True)] = DEFAULT_QC_THRESHOLDS.silence_db,
+):
+    """
+    Проверяет WAV клипы датасета: RMS, пики, клиппинг, доля тишины, тишина по краям и длительность.
+    Забракованные строки сохраняются в payload_datasets для повторного синтеза.
+    """
+    thresholds = QcThresholds(silence_db=silence_db, max_edge_silence=max_edge_silence)
+    rows = _read_metadata(dataset_path)
+    wav_rows = [row for row in rows if row.file_name.lower().endswith(".wav")]
+    audio_paths = [os.path.join(dataset_path, row.file_name) for row in wav_rows]
+    source = os.path.basename(dataset_path)
+
+    report_path = os.path.join(dataset_path, "qc_report.jsonl")
+    rejected_rows = []
+    trimmed_count = 0
+    # Анализ упирается в CPU, поэтому процессы, а не потоки
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor, \
+            open(report_path, "w", encoding="utf-8") as report_file:
+        results = executor.map(partial(safe_check_audio, thresholds=thresholds, trim=trim),
+                               audio_paths, chunksize=16)
+        for row, result in tqdm(zip(wav_rows, results), total=len(wav_rows), desc="QC"):
+            report_file.write(json.dumps({"id": row.id, **result._asdict()}, ensure_ascii=False) + "\n")
+            trimmed_count += result.trimmed
+            if result.reasons:
+                rejected_rows.append(row)
+
+    typer.echo(f"Проверено клипов: {len(wav_rows)}, забраковано: {len(rejected_rows)}, обрезано: {trimmed_count}")
+    typer.echo(f"Отчет: {report_path}")
+    if not rejected_rows:
+        return
+
+    # Список брака в формате payload: его можно сразу подать в jsonl-to-audio.
+    # Строки сохраняют исходный source и не берут из кэша то же забракованное аудио
+    requeue_path = os.path.join(BASE_DIR, "payload_datasets", f"{source}_qc_rejected.jsonl")
+    with open(requeue_path, "w", encoding="utf-8") as requeue_file:
+        for row in rejected_rows:
+            requeue_file.write(
+                RequeueRow(id=row.id, text=row.text, source=row.source, bypass_audio_cache=True).to_jsonl())
+    # Иначе jsonl-to-audio пропустит эти тексты как уже озвученные
+    with open_global_index(AUDIO_INDEX) as audio_index:
+        for row in rejected_rows:
+            audio_index.discard(row.text)
+    typer.echo(f"Список для повторного синтеза: {requeue_path}")
+
+    if drop_rejected:
+        rejected_ids = {row.id for row in rejected_rows}
+        _rewrite_metadata(dataset_path, [row for row in rows if row.id not in rejected_ids])
+        for row in rejected_rows:
+            audio_path = os.path.join(dataset_path, row.file_name)
+            if os.path.exists(audio_path):
+                os.remove(audio_path)
+        typer.echo("Забракованные клипы удалены; пересоберите манифест: manifest build --full")
+
+
+@app.command()
+def resample(
+        input_path: Annotated[str, typer.Option(
+            exists=True, file_okay=False, resolve_path=True, show_default=True)] = os.path.join(
+            BASE_DIR, "output_elevenlabs"),
+        target_rate: Annotated[int, typer.Option(min=8000, show_default=True)] = 24000,
+        workers: Annotated[int, typer.Option(min=1, show_default=True)] = os.cpu_count() or 1,
+        manifest_path: Annotated[str, typer.Option(show_default=True)] = MANIFEST_DIR,
+):
+    """
+    Передискретизирует WAV клипы всех датасетов в папке до target_rate
+    в папку audio_<частота> рядом с audio и переписывает пути в metadata.jsonl.
+    Клипы, которые по манифесту уже имеют нужную частоту, пропускаются.
+    """
+    manifest = load_manifest(manifest_path, columns=["audio_path", "sample_rate"])
+    converted = set(manifest.loc[manifest["sample_rate"] == target_rate, "audio_path"])
+    target_dir_name = f"audio_{target_rate}"
+    rewritten_count = 0
+
+    for metadata_path in sorted(glob.glob(os.path.join(input_path, "**", "metadata.jsonl"), recursive=True)):
+        dataset_path = os.path.dirname(metadata_path)
+        rows = _read_metadata(dataset_path)
+        jobs = []
+        new_file_names = {}
+        for row in rows:
+            audio_path = os.path.normpath(os.path.join(dataset_path, row.file_name))
+            if not row.file_name.lower().endswith(".wav") or audio_path in converted:
+                continue
+            new_file_name = os.path.join(target_dir_name, os.path.basename(row.file_name))
+            target_path = os.path.join(dataset_path, new_file_name)
+            new_file_names[row.id] = new_file_name
+            # Прерванный прогон: уже сконвертированные файлы не трогаем
+            if not os.path.exists(target_path):
+                jobs.append((row.id, audio_path, target_path))
+        if not new_file_names:
+            continue
+
+        failed_ids = set()
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            errors = executor.map(partial(safe_resample_wav, target_rate=target_rate),
+                                  [(audio_path, target_path) for _, audio_path, target_path in jobs], chunksize=8)
+            for (row_id, audio_path, _), error in tqdm(zip(jobs, errors), total=len(jobs), desc=dataset_path):
+                if error:
+                    failed_ids.add(row_id)
+                    typer.echo(f"Ошибка конвертации {audio_path}: {error}", err=True)
+
+        for row in rows:
+            if row.id in new_file_names and row.id not in failed_ids:
+                row.file_name = new_file_names[row.id]
+        _rewrite_metadata(dataset_path, rows)
+        rewritten_count += 1
+        typer.echo(f"{dataset_path}: сконвертировано {len(jobs) - len(failed_ids)}, "
+                   f"ошибок {len(failed_ids)}, пути в metadata.jsonl обновлены")
+
+    if rewritten_count:
+        typer.echo("Исходные клипы не удалены. Пересоберите манифест: manifest build --full")
+    else:
+        typer.echo("Все клипы уже сконвертированы")
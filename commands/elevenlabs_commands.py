@@ -1,19 +1,39 @@
 import json
 import os
-import wave
-from typing import Iterator
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from itertools import islice
+from typing import Optional
 
 import typer
-from elevenlabs import save
-from elevenlabs import VoiceSettings
 from typer import Typer
 from typing_extensions import Annotated
 
-from entrypoint.config import BASE_DIR
-from exceptions import Limit
-from models.row import BaseRow, HfRow
+from entrypoint.config import BASE_DIR, CACHE_DIR, MANIFEST_DIR
+from models.row import BaseRow, HfRow, RequeueRow
 from models.voice import ElevenlabsVoice
-from services.elevenlabs_service import get_client, get_voice
+from services.audio_cache import AudioCache, make_audio_key
+from services.elevenlabs_service import (
+    ELEVENLABS_MODEL,
+    VOICE_SETTINGS,
+    get_client,
+    get_output_format,
+    get_voice,
+    synthesize_to_file,
+)
+from services.global_index import AUDIO_INDEX, dataset_source, open_global_index
+from services.manifest import hours_by, load_manifest
+from services.progress_journal import ProgressJournal
+from services.rate_limiter import RateLimits, get_rate_limiter
+from services.synthesis_estimator import (
+    DEFAULT_CHARS_PER_SECOND,
+    calibrate_chars_per_second,
+    estimate_payload,
+    estimate_row,
+)
+from services.voice_scheduler import plan_voices
+from utils import format_duration
 
 app = Typer(help="Команды для обработки текста.")
 
@@ -28,9 +48,22 @@ def jsonl_to_audio(
                                                             case_sensitive=False)] = ElevenlabsVoice.sfrv,
         limit: Annotated[int, typer.Option(prompt=True, show_default=True)] = 5,
         audio_format: Annotated[str, typer.Option(show_default=True)] = ".wav",  # .wav .mp3
+        concurrency: Annotated[int, typer.Option(min=1, show_default=True,
+                                                 help="Кол-во одновременных запросов к ElevenLabs")] = 1,
+        audio_cache: Annotated[bool, typer.Option("--audio-cache/--no-audio-cache",
+                                                  help="Переиспользовать ранее синтезированное аудио")] = True,
+        skip_synthesized: Annotated[bool, typer.Option("--skip-synthesized/--no-skip-synthesized",
+                                                       help="Пропускать тексты, уже озвученные в любом датасете")] = True,
+        reject_out_of_bounds: Annotated[bool, typer.Option(
+            "--reject-out-of-bounds/--flag-out-of-bounds",
+            help="Не синтезировать строки, которые по оценке нарушат требования к длительности и фонемам")] = True,
+        manifest_path: Annotated[str, typer.Option(show_default=True,
+                                                   help="Манифест для калибровки темпа голоса")] = MANIFEST_DIR,
+        source_name: Annotated[Optional[str], typer.Option(
+            help="Источник в metadata.jsonl (по умолчанию - имя входного файла)")] = None,
 ):
     input_file_path = os.path.join(BASE_DIR, "payload_datasets", input_file_name)
-    source = input_file_name.replace(".jsonl", "")
+    source = os.path.basename(input_file_name).replace(".jsonl", "")
     client = get_client()
     voice = get_voice(client, voice_name.value)
     typer.echo(f"voice '{voice.voice_id}' found")
@@ -38,96 +71,261 @@ def jsonl_to_audio(
     os.makedirs(output_path, exist_ok=True)
     output_metadata_file_path = os.path.join(output_path, "metadata.jsonl")
 
-    # Временный файл, который станет новым input_file_path.
-    # Он будет содержать все строки, которые не были успешно обработаны.
-    temp_input_for_next_run_path = input_file_path + ".processing_temp"
+    # Журнал обработанных строк лежит рядом с metadata.jsonl; входной файл не переписывается
+    journal_path = os.path.join(output_path, f"{source}.progress")
+    rejected_file_path = os.path.join(output_path, f"{source}.rejected.jsonl")
 
-    with open(input_file_path, "r", newline='', encoding="utf-8") as f:
-        rows_to_process_from_input = list(f)
+    audio_dir_path = os.path.join(output_path, "audio")
+    os.makedirs(audio_dir_path, exist_ok=True)
+
+    cache = AudioCache(os.path.join(CACHE_DIR, "tts_audio")) if audio_cache else None
+    output_format = get_output_format(audio_format)
+    voice_settings_json = VOICE_SETTINGS.model_dump_json()
+    chars_per_second = calibrate_chars_per_second(manifest_path).get(voice.name, DEFAULT_CHARS_PER_SECOND)
+
+    # Общий лимитер ElevenLabs: повторяет 429 и временные ошибки с джиттером
+    # и снижает параллельность при троттлинге, не превышая --concurrency
+    limiter = get_rate_limiter("elevenlabs", RateLimits(initial_concurrency=concurrency, max_concurrency=concurrency))
+
+    def synthesize(text: str, full_audio_path: str) -> None:
+        limiter.run_sync(lambda: synthesize_to_file(client, voice, text, full_audio_path, audio_format),
+                         tokens=len(text))
+
+    def synthesize_row(row: bytes) -> tuple[HfRow, bool]:
+        """Возвращает строку метаданных и признак того, что аудио взято из кэша"""
+        base_row = RequeueRow(**json.loads(row))
+        audio_name = f"{source}_{base_row.id}{audio_format}"
+        relative_audio_path = os.path.join("audio", audio_name)
+        full_audio_path = os.path.join(audio_dir_path, audio_name)
+        # Строки, возвращенные QC, остаются в своем исходном источнике
+        hf_row = HfRow(id=base_row.id, text=base_row.text, file_name=relative_audio_path,
+                       source=source_name or base_row.source or source, style="default", voice=voice.name)
+        if cache is None:
+            synthesize(base_row.text, full_audio_path)
+            return hf_row, False
+
+        key = make_audio_key(voice.voice_id, ELEVENLABS_MODEL, voice_settings_json, output_format, base_row.text)
+        if not base_row.bypass_audio_cache and cache.fetch(key, audio_format, full_audio_path):
+            return hf_row, True
+        synthesize(base_row.text, full_audio_path)
+        cache.store(key, audio_format, full_audio_path, replace=base_row.bypass_audio_cache)
+        return hf_row, False
+
+    def safe_synthesize_row(
+            pending_row: tuple[int, int, bytes]
+    ) -> tuple[Optional[HfRow], bool, Optional[Exception]]:
+        # Ошибка одной строки не должна останавливать весь прогон
+        try:
+            return *synthesize_row(pending_row[2]), None
+        except Exception as e_row_processing:
+            return None, False, e_row_processing
 
     output_file_mode = 'w' if os.path.exists(output_metadata_file_path) == 0 else 'a'
 
+    done_count = 0
+    failed_count = 0
+    skipped_count = 0
+    rejected_count = 0
+    flagged_count = 0
+    expected_seconds = 0.0
+    cached_count = 0
+    saved_characters = 0
+    started_at = time.perf_counter()
     try:
-        with open(temp_input_for_next_run_path, "w", newline='', encoding="utf-8") as temp_input_file, \
-                open(output_metadata_file_path, output_file_mode, newline='', encoding='utf-8') as output_file:
+        with open(output_metadata_file_path, output_file_mode, newline='', encoding='utf-8') as output_file, \
+                ProgressJournal(journal_path, sync_with=[output_file]) as journal, \
+                ThreadPoolExecutor(max_workers=concurrency) as executor, \
+                open(rejected_file_path, "a", encoding="utf-8") as rejected_file, \
+                ExitStack() as indexes:
+            audio_index = indexes.enter_context(open_global_index(AUDIO_INDEX)) if skip_synthesized else None
+            journal.load(input_file_path)
+            # Тексты, уже поставленные в синтез этим запуском: в индекс они попадут только после синтеза
+            queued_texts: set[str] = set()
 
-            if not rows_to_process_from_input:
-                typer.echo("Исходный файл был пуст")
-
-            for i, row in enumerate(rows_to_process_from_input):
-                try:
+            def unsynthesized_rows():
+                # Индекс не потокобезопасен: проверяем и пополняем его только в главном потоке
+                nonlocal skipped_count, rejected_count, flagged_count, expected_seconds
+                for start, end, row in journal.iter_pending(input_file_path):
                     base_row = BaseRow(**json.loads(row))
+                    if audio_index is not None and (base_row.text in audio_index or base_row.text in queued_texts):
+                        journal.record(start, end, base_row.id, row)
+                        skipped_count += 1
+                        continue
+                    # Проверка требований до запроса к API: синтез такой строки оплачивается впустую
+                    estimate = estimate_row(base_row.text, chars_per_second)
+                    violation = estimate.violation()
+                    if violation and reject_out_of_bounds:
+                        rejected_file.write(json.dumps({**base_row.model_dump(), "reason": violation},
+                                                       ensure_ascii=False) + "\n")
+                        journal.record(start, end, base_row.id, row)
+                        rejected_count += 1
+                        continue
+                    if violation:
+                        flagged_count += 1
+                        typer.echo(f"Строка {base_row.id} вне требований: {violation}", err=True)
+                    expected_seconds += estimate.duration
+                    if audio_index is not None:
+                        queued_texts.add(base_row.text)
+                    yield start, end, row
+
+            rows_in_run = list(islice(unsynthesized_rows(), limit))
+            if not rows_in_run:
+                typer.echo("Необработанных строк не осталось")
+            else:
+                typer.echo(f"К синтезу: {len(rows_in_run)} строк, ожидается {format_duration(expected_seconds)} "
+                           f"аудио (темп голоса {chars_per_second:.1f} симв/с)")
 
-                    audio_dir_path = os.path.join(output_path, "audio")
-                    os.makedirs(audio_dir_path, exist_ok=True)
-                    audio_name = f"{source}_{base_row.id}{audio_format}"
-                    relative_audio_path = os.path.join("audio", audio_name)
-                    full_audio_path = os.path.join(audio_dir_path, audio_name)
-                    audio_bytes = client.generate(
-                        text=base_row.text,
-                        voice=voice,
-                        model="eleven_multilingual_v2",
-                        output_format="pcm_48000" if audio_format == ".wav" else "mp3_44100_192",
-                        voice_settings=VoiceSettings(
-                            # Определяет, насколько стабилен голос и насколько случайным является каждое его поколение. Более низкие значения расширяют эмоциональный диапазон голоса. Более высокие значения могут привести к монотонному голосу с ограниченными эмоциями.
-                            stability=0.8,
-                            # Определяет, насколько точно ИИ должен придерживаться оригинального голоса при попытке его воспроизведения.
-                            similarity_boost=0.8,
-                            speed=1,
-                            use_speaker_boost=True,
-                            # Определяет преувеличение стиля голоса. Эта настройка пытается усилить стиль оригинального диктора. Она потребляет дополнительные вычислительные ресурсы и может увеличить задержку, если установить значение, отличное от 0.
-                            style=0
-                        )
-                    )
-                    if isinstance(audio_bytes, Iterator):
-                        audio_bytes = b"".join(audio_bytes)
-                    if audio_format == ".wav":
-                        with wave.open(full_audio_path, 'wb') as wavfile:
-                            # Установка параметров WAV файла:
-                            # (nchannels, sampwidth, framerate, nframes, comptype, compname)
-                            # nchannels: 1 для моно, 2 для стерео
-                            # sampwidth: ширина сэмпла в байтах (1 для 8-бит, 2 для 16-бит, 3 для 24-бит)
-                            # framerate: частота дискретизации (например, 48000)
-                            # nframes: количество кадров (0 если неизвестно заранее, будет обновлено при закрытии)
-                            # comptype: тип сжатия ('NONE' для PCM)
-                            # compname: описание сжатия ('not compressed' для PCM)
-
-                            nchannels = 1  # ПРЕДПОЛОЖЕНИЕ: Моно
-                            sampwidth = 2  # ПРЕДПОЛОЖЕНИЕ: 16 бит (2 байта на сэмпл)
-                            framerate = 48000  # Соответствует вашему output_format
-                            nframes = 0  # Будет вычислено автоматически при записи всех кадров
-                            comptype = 'NONE'
-                            compname = 'NONE'
-
-                            wavfile.setparams((nchannels, sampwidth, framerate, nframes, comptype, compname))
-                            wavfile.writeframes(audio_bytes)
-                    else:
-                        save(audio_bytes, full_audio_path)
-                    hf_row = HfRow(**base_row.model_dump(), file_name=relative_audio_path, source=source,
-                                   style="default", voice=voice.name)
-                    output_file.write(hf_row.to_jsonl())
-                    if i == limit:
-                        raise Limit("limit reached")
-                except Limit as e:
-                    for k in range(i + 1, len(rows_to_process_from_input)):
-                        temp_input_file.write(rows_to_process_from_input[k])
-
-                    # Передаем ошибку дальше, чтобы прервать выполнение и зафиксировать состояние
-                    raise e
-
-                except Exception as e_row_processing:
-                    # Записываем эту "проблемную" строку в temp_input_for_next_run_path
-                    temp_input_file.write(base_row.to_jsonl())
-
-                    # Также записываем все ОСТАВШИЕСЯ строки из первоначального списка
-                    # в temp_input_for_next_run_path, так как они еще не были обработаны.
-                    for k in range(i + 1, len(rows_to_process_from_input)):
-                        temp_input_file.write(rows_to_process_from_input[k])
-
-                    # Передаем ошибку дальше, чтобы прервать выполнение и зафиксировать состояние
-                    raise e_row_processing
+            # executor.map возвращает результаты в порядке входных строк,
+            # поэтому metadata.jsonl пишется детерминированно при любой concurrency
+            for (start, end, row), (hf_row, from_cache, error) in zip(
+                    rows_in_run, executor.map(safe_synthesize_row, rows_in_run)):
+                if error is not None:
+                    # Строка не попадает в журнал и будет повторена при следующем запуске
+                    failed_count += 1
+                    typer.echo(f"Ошибка синтеза строки (смещение {start}): {error}", err=True)
+                    continue
+                output_file.write(hf_row.to_jsonl())
+                journal.record(start, end, hf_row.id, row)
+                if audio_index is not None:
+                    audio_index.add(hf_row.text, dataset_source(hf_row.source))
+                done_count += 1
+                if from_cache:
+                    cached_count += 1
+                    saved_characters += len(hf_row.text)
     except Exception as e_fatal:
         typer.echo(e_fatal, err=True)
         raise typer.Exit(code=1) from e_fatal
-    finally:
-        os.replace(temp_input_for_next_run_path, input_file_path)
+
+    elapsed = time.perf_counter() - started_at
+    clips_per_second = done_count / elapsed if elapsed > 0 else 0.0
+    typer.echo(f"Синтезировано: {done_count}, ошибок: {failed_count}, "
+               f"время: {elapsed:.1f}с, скорость: {clips_per_second:.2f} клипов/с")
+    if skip_synthesized:
+        typer.echo(f"Пропущено уже озвученных текстов: {skipped_count}")
+    if rejected_count:
+        typer.echo(f"Отклонено до синтеза: {rejected_count} (см. {rejected_file_path})")
+    if flagged_count:
+        typer.echo(f"Синтезировано строк вне требований: {flagged_count}")
+    if cache is not None:
+        typer.echo(f"Из кэша аудио: {cached_count}, сэкономлено символов: {saved_characters}")
+    typer.echo(limiter.stats_line())
+
+
+@app.command()
+def estimate(
+        input_file_name: Annotated[str, typer.Option(show_default=True)] = "den4ikai.jsonl",
+        manifest_path: Annotated[str, typer.Option(show_default=True)] = MANIFEST_DIR,
+        voice_name: Annotated[Optional[ElevenlabsVoice], typer.Option(case_sensitive=False)] = None,
+):
+    """
+    Оценивает payload файл до синтеза: фонемы, ожидаемые часы и строки вне требований по каждому голосу.
+    """
+    input_file_path = os.path.join(BASE_DIR, "payload_datasets", input_file_name)
+    chars_per_second = calibrate_chars_per_second(manifest_path)
+    if voice_name is not None:
+        chars_per_second = {voice_name.value: chars_per_second.get(voice_name.value, DEFAULT_CHARS_PER_SECOND)}
+    if not chars_per_second:
+        typer.echo(f"В манифесте нет откалиброванных голосов, темп по умолчанию {DEFAULT_CHARS_PER_SECOND} симв/с")
+        chars_per_second = {"default": DEFAULT_CHARS_PER_SECOND}
+
+    estimates = estimate_payload(input_file_path, chars_per_second)
+    typer.echo(f"Строк: {len(estimates)}, символов: {estimates['char_count'].sum()}, "
+               f"максимум фонем: {estimates['phoneme_count'].max() if len(estimates) else 0}")
+    for voice, rate in chars_per_second.items():
+        in_bounds = ~estimates[f"out_of_bounds_{voice}"]
+        expected = estimates.loc[in_bounds, f"duration_{voice}"].sum()
+        typer.echo(f"{voice} ({rate:.1f} симв/с): {format_duration(expected)}, "
+                   f"вне требований: {(~in_bounds).sum()}")
+
+
+@app.command()
+def schedule(
+        input_file_name: Annotated[str, typer.Option(show_default=True)] = "den4ikai.jsonl",
+        voices: Annotated[Optional[list[ElevenlabsVoice]], typer.Option(
+            "--voice", case_sensitive=False, help="Голоса для распределения (по умолчанию все)")] = None,
+        target_hours: Annotated[float, typer.Option(show_default=True, help="Цель часов на голос")] = 1.0,
+        output_path: Annotated[
+            str, typer.Option(show_default=True)] = os.path.join(
+            BASE_DIR, "output_elevenlabs"),
+        manifest_path: Annotated[str, typer.Option(show_default=True)] = MANIFEST_DIR,
+        audio_format: Annotated[str, typer.Option(show_default=True)] = ".wav",
+        concurrency: Annotated[int, typer.Option(min=1, show_default=True)] = 1,
+        run: Annotated[bool, typer.Option("--run/--plan-only", help="Сразу запустить синтез очередей")] = True,
+):
+    """
+    Распределяет строки payload файла между голосами так, чтобы каждый голос добрал target_hours,
+    и дописывает их в очереди payload_datasets/<файл>__<голос>.jsonl, которые затем синтезирует.
+    """
+    voices = voices or list(ElevenlabsVoice)
+    client = get_client()
+    # В метаданных голос записан под именем из API, а не под строкой поиска
+    voice_names = {voice: get_voice(client, voice.value).name for voice in voices}
+    stem = input_file_name.replace(".jsonl", "")
+    payload_path = os.path.join(BASE_DIR, "payload_datasets")
+    queue_file_names = {voice: f"{stem}__{voice.name}.jsonl" for voice in voices}
+
+    manifest = load_manifest(manifest_path, columns=["voice", "duration"])
+    current_seconds = (hours_by(manifest, "voice") * 3600).to_dict()
+    calibrated = calibrate_chars_per_second(manifest_path)
+    chars_per_second = {name: calibrated.get(name, DEFAULT_CHARS_PER_SECOND) for name in voice_names.values()}
+
+    queued_texts = set()
+    queued_seconds: dict[str, float] = {}
+    with open_global_index(AUDIO_INDEX) as audio_index:
+        # Уже поставленные в очередь, но не озвученные строки засчитываются голосу заранее
+        for voice, name in voice_names.items():
+            queue_path = os.path.join(payload_path, queue_file_names[voice])
+            if not os.path.exists(queue_path):
+                continue
+            with open(queue_path, encoding="utf-8") as queue_file:
+                for line in queue_file:
+                    row = BaseRow.model_validate_json(line)
+                    queued_texts.add(row.text)
+                    if row.text not in audio_index:
+                        queued_seconds[name] = (queued_seconds.get(name, 0.0)
+                                                + estimate_row(row.text, chars_per_second[name]).duration)
+        with open(os.path.join(payload_path, input_file_name), encoding="utf-8") as payload_file:
+            rows = [row for row in (BaseRow.model_validate_json(line) for line in payload_file if line.strip())
+                    if row.text not in audio_index and row.text not in queued_texts]
+
+    plans = plan_voices(rows, current_seconds, queued_seconds,
+                        {name: target_hours * 3600 for name in voice_names.values()}, chars_per_second)
+    total_chars = 0
+    for plan in plans:
+        total_chars += plan.assigned_chars
+        reached = plan.current_seconds + plan.queued_seconds + plan.assigned_seconds
+        status = "" if reached >= plan.target_seconds else " (не хватило строк)"
+        typer.echo(f"{plan.voice}: есть {format_duration(plan.current_seconds)}, "
+                   f"в очереди {format_duration(plan.queued_seconds)}, "
+                   f"добавлено {len(plan.rows)} строк ~{format_duration(plan.assigned_seconds)}{status}")
+    typer.echo(f"Символов к синтезу: {total_chars}, строк без голоса: {len(rows) - sum(len(p.rows) for p in plans)}")
+
+    plans_by_name = {plan.voice: plan for plan in plans}
+    for voice, name in voice_names.items():
+        if plans_by_name[name].rows:
+            with open(os.path.join(payload_path, queue_file_names[voice]), "a", encoding="utf-8") as queue_file:
+                for row in plans_by_name[name].rows:
+                    queue_file.write(row.to_jsonl())
+
+    if not run:
+        return
+    for voice in voices:
+        queue_path = os.path.join(payload_path, queue_file_names[voice])
+        if not os.path.exists(queue_path):
+            continue
+        with open(queue_path, encoding="utf-8") as queue_file:
+            queue_length = sum(1 for _ in queue_file)
+        typer.echo(f"\n--- {voice.value} ---")
+        jsonl_to_audio(
+            input_file_name=queue_file_names[voice],
+            output_path=output_path,
+            voice_name=voice,
+            limit=queue_length,
+            audio_format=audio_format,
+            concurrency=concurrency,
+            audio_cache=True,
+            skip_synthesized=True,
+            reject_out_of_bounds=True,
+            manifest_path=manifest_path,
+            source_name=stem,
+        )
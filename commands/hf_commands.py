@@ -1,16 +1,41 @@
 import os
+from typing import Optional
 
 import typer
 from huggingface_hub import HfApi
 from typer import Typer
 from typing_extensions import Annotated
 
-from entrypoint.config import BASE_DIR, HF_TOKEN
-from utils import get_wav_duration, format_duration
+from entrypoint.config import BASE_DIR, HF_TOKEN, MANIFEST_DIR
+from services.duration_index import duration_breakdown, load_metadata, open_duration_cache, scan_durations
+from services.hub_upload import (
+    DEFAULT_EXCLUDE,
+    HfHubBackend,
+    HubBackend,
+    LocalHubBackend,
+    batch_items,
+    list_local_files,
+    open_upload_ledger,
+    plan_upload,
+)
+from services.shard_packer import (
+    DEFAULT_SHARD_BYTES,
+    SHARDS_DIR,
+    load_pack_state,
+    pack_shards,
+    save_pack_state,
+)
+from utils import format_duration
 
 app = Typer(help="Команды для загрузки аудио данных на hf.")
 
 
+def _hub_backend(hub_repository_id: str, local_hub: Optional[str]) -> HubBackend:
+    if local_hub:
+        return LocalHubBackend(local_hub)
+    return HfHubBackend(HfApi(token=HF_TOKEN), hub_repository_id)
+
+
 @app.command()
 def upload_folder(
         input_path: Annotated[
@@ -18,47 +43,151 @@ def upload_folder(
             BASE_DIR, "output_elevenlabs"),
         hub_repository_id: Annotated[
             str, typer.Option(prompt=True, show_default=True)] = "Sh1man/elevenlabs",
+        local_hub: Annotated[Optional[str], typer.Option(
+            help="Загружать в локальную папку вместо hub (для проверки без сети)")] = None,
+        against_remote: Annotated[bool, typer.Option(
+            "--against-remote", help="Сравнивать с листингом hub, а не с журналом загрузок")] = False,
+        delete_missing: Annotated[bool, typer.Option(
+            "--delete-missing", help="Удалять с hub файлы, которых больше нет локально")] = False,
+        workers: Annotated[int, typer.Option(min=1, show_default=True)] = 8,
+        commit_max_files: Annotated[int, typer.Option(min=1, show_default=True)] = 1000,
+        commit_max_mb: Annotated[int, typer.Option(min=1, show_default=True)] = 2048,
+        dry_run: Annotated[bool, typer.Option("--dry-run", help="Только показать план")] = False,
+):
+    """
+    Загружает на hf только новые и измененные файлы папки.
+    Загрузка идет коммитами ограниченного размера; прерванная загрузка продолжается с последнего коммита.
+    """
+    backend = _hub_backend(hub_repository_id, local_hub)
+    with open_upload_ledger() as ledger:
+        local_files = list_local_files(input_path, DEFAULT_EXCLUDE)
+        local_hashes = ledger.local_hashes(list(local_files.values()), workers)
+        if against_remote:
+            remote_files = backend.list_files()
+            ledger.replace_uploaded(backend.repo_id, remote_files)
+        else:
+            remote_files = ledger.uploaded(backend.repo_id)
+
+        plan = plan_upload(local_files, local_hashes, remote_files, delete_missing)
+        typer.echo(f"К загрузке: {len(plan.to_upload)}, к удалению: {len(plan.to_delete)}, "
+                   f"без изменений: {plan.unchanged}")
+        if dry_run:
+            return
+
+        for batch_number, batch in enumerate(
+                batch_items(plan.to_upload, commit_max_files, commit_max_mb * 1024 ** 2), start=1):
+            backend.push(batch, [], f"Upload {len(batch)} files", workers)
+            # Журнал обновляется после каждого коммита: это точка возобновления
+            ledger.record_uploaded(backend.repo_id, batch)
+            typer.echo(f"Коммит {batch_number}: загружено файлов {len(batch)}")
+        if plan.to_delete:
+            backend.push([], plan.to_delete, f"Delete {len(plan.to_delete)} files", workers)
+            ledger.record_deleted(backend.repo_id, plan.to_delete)
+            typer.echo(f"Удалено файлов: {len(plan.to_delete)}")
+
+
+@app.command()
+def pack(
+        manifest_path: Annotated[str, typer.Option(show_default=True)] = MANIFEST_DIR,
+        pack_path: Annotated[str, typer.Option(show_default=True)] = os.path.join(BASE_DIR, "packed"),
+        max_shard_mb: Annotated[int, typer.Option(min=1, show_default=True)] = DEFAULT_SHARD_BYTES // 1024 ** 2,
+):
+    """
+    Упаковывает новые и измененные строки манифеста в Parquet шарды с аудио внутри.
+    """
+    result = pack_shards(manifest_path, pack_path, max_shard_mb * 1024 ** 2)
+    typer.echo(f"Упаковано строк: {result.packed_rows}, новых шардов: {len(result.new_shards)}, "
+               f"переписано шардов: {len(result.removed_shards)}")
+
+
+@app.command()
+def upload_shards(
+        pack_path: Annotated[str, typer.Option(show_default=True)] = os.path.join(BASE_DIR, "packed"),
+        hub_repository_id: Annotated[
+            str, typer.Option(prompt=True, show_default=True)] = "Sh1man/elevenlabs",
+        local_hub: Annotated[Optional[str], typer.Option(
+            help="Загружать в локальную папку вместо hub (для проверки без сети)")] = None,
+        workers: Annotated[int, typer.Option(min=1, show_default=True)] = 8,
 ):
-    api = HfApi(token=HF_TOKEN)
-    api.upload_large_folder(
-        folder_path=input_path,
-        repo_id=hub_repository_id,
-        repo_type="dataset"
-    )
+    """
+    Загружает на hf только шарды, упакованные после прошлой загрузки, и удаляет замененные.
+    """
+    state = load_pack_state(pack_path)
+    if not state["pending_upload"] and not state["pending_delete"]:
+        typer.echo("Новых шардов нет")
+        return
+    backend = _hub_backend(hub_repository_id, local_hub)
+    with open_upload_ledger() as ledger:
+        shard_files = {
+            f"{SHARDS_DIR}/{shard_name}": os.path.join(pack_path, SHARDS_DIR, shard_name)
+            for shard_name in state["pending_upload"]
+        }
+        # Шарды, загруженные прерванным запуском до сохранения состояния, по журналу не загружаются повторно
+        plan = plan_upload(shard_files, ledger.local_hashes(list(shard_files.values()), workers),
+                           ledger.uploaded(backend.repo_id))
+        deletions = [f"{SHARDS_DIR}/{shard_name}" for shard_name in state["pending_delete"]]
+        # Один коммит: на hub не бывает состояния, где строка есть в двух шардах или ни в одном
+        backend.push(plan.to_upload, deletions,
+                     f"Add {len(plan.to_upload)} shards, remove {len(deletions)}", workers)
+        ledger.record_uploaded(backend.repo_id, plan.to_upload)
+        ledger.record_deleted(backend.repo_id, deletions)
+    typer.echo(f"Загружено шардов: {len(plan.to_upload)}, удалено: {len(deletions)}")
+    state["pending_upload"] = []
+    state["pending_delete"] = []
+    save_pack_state(pack_path, state)
+
 
 @app.command()
 def calculate_dataset_duration(
     input_path: Annotated[
-        str, typer.Option(exists=True, file_okay=False, dir_okay=True, readable=True, resolve_path=True, help="Путь к папке с WAV файлами.")]
+        str, typer.Option(exists=True, file_okay=False, dir_okay=True, readable=True, resolve_path=True, help="Путь к папке с WAV файлами.")],
+    workers: Annotated[int, typer.Option(min=1, show_default=True, help="Кол-во потоков чтения заголовков")] = 16,
+    report_path: Annotated[
+        Optional[str], typer.Option(help="Куда сохранить отчет по голосам в формате stata.txt")] = None,
 ):
     """
-    Рассчитывает и отображает общую продолжительность всех WAV файлов в указанной папке.
+    Рассчитывает общую продолжительность всех WAV файлов в указанной папке
+    и разбивку по голосам, источникам и стилям из metadata.jsonl.
+    Длительности кэшируются: повторный запуск читает только новые и измененные файлы.
     """
     if not os.path.isdir(input_path):
         typer.echo(f"Ошибка: Указанный путь '{input_path}' не является директорией или не существует.")
         raise typer.Exit(code=1)
 
-    total_duration_seconds = 0.0
-    wav_files_count = 0
-
     typer.echo(f"Сканирование директории: {input_path}")
 
-    for root, _, files in os.walk(input_path):
-        for filename in files:
-            if filename.lower().endswith(".wav"):
-                file_path = os.path.join(root, filename)
-                duration = get_wav_duration(file_path)
-                if duration > 0:
-                    total_duration_seconds += duration
-                    wav_files_count += 1
+    wav_file_paths = [
+        os.path.join(root, filename)
+        for root, _, files in os.walk(input_path)
+        for filename in files
+        if filename.lower().endswith(".wav")
+    ]
 
+    with open_duration_cache() as cache:
+        scan = scan_durations(wav_file_paths, cache, workers)
+    for file_path, error in scan.failed:
+        typer.echo(f"Не удалось прочитать {file_path}: {error}", err=True)
 
-    if wav_files_count == 0:
+    infos = {path: info for path, info in scan.infos.items() if info.duration > 0}
+    if not infos:
         typer.echo("WAV файлы не найдены в указанной директории.")
         raise typer.Exit()
 
-    formatted_total_duration = format_duration(total_duration_seconds)
+    total_duration_seconds = sum(info.duration for info in infos.values())
+    metadata = load_metadata(input_path)
 
     print(f"\n--- Отчет о продолжительности датасета ---")
-    print(f"Проанализировано WAV файлов: {wav_files_count}")
-    print(f"Общая продолжительность: {formatted_total_duration}")
+    print(f"Проанализировано WAV файлов: {len(infos)} (из кэша: {scan.cached_count})")
+    print(f"Общая продолжительность: {format_duration(total_duration_seconds)}")
+
+    for field, title in (("voice", "голосам"), ("source", "источникам"), ("style", "стилям")):
+        print(f"\n--- По {title} ---")
+        for name, seconds in duration_breakdown(infos, metadata, field).items():
+            print(f"{format_duration(seconds)} {name}")
+
+    if report_path:
+        with open(report_path, "w", encoding="utf-8") as report_file:
+            for name, seconds in duration_breakdown(infos, metadata, "voice").items():
+                report_file.write(f"{format_duration(seconds)} {name}\n")
+            report_file.write(f"total: {format_duration(total_duration_seconds)}\n")
+        typer.echo(f"Отчет сохранен: {report_path}")
@@ -0,0 +1,64 @@
+import glob
+import json
+import os
+
+import typer
+from typer import Typer
+from typing_extensions import Annotated
+
+from entrypoint.config import BASE_DIR
+from services.global_index import AUDIO_INDEX, DATASET_INDEX, GlobalTextIndex, dataset_source, open_global_index
+from utils import open_text_stream
+
+app = Typer(help="Команды для глобального индекса текстов.")
+
+
+def _index_texts(index: GlobalTextIndex, file_path: str, source: str, row_source: bool = False) -> tuple[int, int]:
+    """
+    Добавляет поле text всех строк файла в индекс. Возвращает (строк, новых).
+    При row_source источник берется из поля source строки, а source - только для строк без него.
+    """
+    rows_count = 0
+    added_count = 0
+    with open_text_stream(file_path) as (text_stream, _):
+        for line in text_stream:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            # Сырые пары запрос-ответ до постобработки в индекс не попадают
+            if "text" not in row:
+                continue
+            rows_count += 1
+            text_source = dataset_source(row["source"]) if row_source and row.get("source") else source
+            added_count += index.add(row["text"], text_source)
+    return rows_count, added_count
+
+
+@app.command()
+def rebuild(
+        datasets_path: Annotated[str, typer.Option(show_default=True)] = os.path.join(BASE_DIR, "datasets"),
+        output_path: Annotated[str, typer.Option(show_default=True)] = os.path.join(BASE_DIR, "output_elevenlabs"),
+):
+    """
+    Перестраивает глобальный индекс текстов по datasets/ и output_elevenlabs/*/metadata.jsonl.
+    """
+    sources = [
+        (DATASET_INDEX, sorted(
+            path for pattern in ("*.jsonl", "*.jsonl.gz", "*.jsonl.zst")
+            for path in glob.glob(os.path.join(datasets_path, "**", pattern), recursive=True)
+        )),
+        (AUDIO_INDEX, sorted(glob.glob(os.path.join(output_path, "*", "metadata.jsonl")))),
+    ]
+    for kind, file_paths in sources:
+        with open_global_index(kind) as index:
+            index.clear()
+            for file_path in file_paths:
+                if kind == DATASET_INDEX:
+                    rows_count, added_count = _index_texts(index, file_path, dataset_source(file_path))
+                else:
+                    # Строки metadata.jsonl хранят свой источник: повторно озвученные после QC строки
+                    # лежат в директории файла возврата, но принадлежат исходному датасету
+                    rows_count, added_count = _index_texts(
+                        index, file_path, dataset_source(os.path.dirname(file_path)), row_source=True)
+                typer.echo(f"[{kind}] {file_path}: строк {rows_count}, новых текстов {added_count}")
+            typer.echo(typer.style(f"Индекс '{kind}': {index.count} уникальных текстов", fg=typer.colors.GREEN))
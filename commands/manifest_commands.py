@@ -0,0 +1,52 @@
+import os
+
+import typer
+from typer import Typer
+from typing_extensions import Annotated
+
+from entrypoint.config import BASE_DIR, MANIFEST_DIR
+from services.duration_index import open_duration_cache
+from services.manifest import build_manifest, hours_by, load_manifest, out_of_bounds
+from utils import format_duration
+
+app = Typer(help="Команды для манифеста аудио датасета.")
+
+
+@app.command()
+def build(
+        input_path: Annotated[str, typer.Option(show_default=True)] = os.path.join(BASE_DIR, "output_elevenlabs"),
+        manifest_path: Annotated[str, typer.Option(show_default=True)] = MANIFEST_DIR,
+        workers: Annotated[int, typer.Option(min=1, show_default=True, help="Кол-во потоков чтения аудио")] = 16,
+        full: Annotated[bool, typer.Option("--full", help="Пересобрать манифест с нуля")] = False,
+):
+    """
+    Дописывает в Parquet манифест строки metadata.jsonl, появившиеся после прошлой сборки.
+    """
+    try:
+        with open_duration_cache() as duration_cache:
+            result = build_manifest(input_path, manifest_path, duration_cache, workers, full)
+    except ValueError as e:
+        typer.echo(typer.style(str(e), fg=typer.colors.RED), err=True)
+        raise typer.Exit(code=1)
+
+    for audio_path, error in result.failed:
+        typer.echo(f"Пропущен {audio_path}: {error}", err=True)
+    typer.echo(typer.style(
+        f"Добавлено строк: {result.added}, всего в манифесте: {result.total}", fg=typer.colors.GREEN
+    ))
+
+
+@app.command()
+def stats(
+        manifest_path: Annotated[str, typer.Option(show_default=True)] = MANIFEST_DIR,
+):
+    """
+    Показывает часы по голосам, источникам и стилям и число клипов вне требований.
+    """
+    manifest = load_manifest(manifest_path, columns=["source", "style", "voice", "duration", "phoneme_count"])
+    typer.echo(f"Клипов: {len(manifest)}, всего: {format_duration(manifest['duration'].sum())}")
+    for field in ("voice", "source", "style"):
+        typer.echo(f"\n--- {field} ---")
+        for name, hours in hours_by(manifest, field).items():
+            typer.echo(f"{format_duration(hours * 3600)} {name}")
+    typer.echo(f"\nКлипов вне требований (длительность, фонемы): {len(out_of_bounds(manifest))}")
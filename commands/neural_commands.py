@@ -1,17 +1,23 @@
 import json
 import os
+import time
 import traceback
 import uuid
+from contextlib import ExitStack
 from typing import Optional
 import typer
 from typer import Typer
+from tqdm import tqdm
 from typing_extensions import Annotated
 
 from entrypoint.config import BASE_DIR
 from models.device import Device
 from models.dialogue_pair import DialoguePair, DialogueResult
 from models.llm_provider import LLMProvider
-from services.llm_client import create_llm_client
+from services.global_index import AUDIO_INDEX, DATASET_INDEX, dataset_source, open_global_index
+from services.llm_client import client_stats_lines, create_llm_client
+from services.near_dedup import NearDuplicateIndex
+from services.runorm_service import load_normalizer, normalize_pairs, normalize_pairs_parallel
 from services.text_generator import generate_multiple_topics
 from services.text_postprocessing import process_jsonl_file, generate_text_hash
 from utils import get_available_gpus
@@ -30,11 +36,39 @@ def postprocess_file(
             help="Имя выходного файла (если не указано, генерируется автоматически)"
         ),
     ] = None,
-    batch_size: Annotated[int, typer.Option(prompt=True, show_default=True, help="Кол-во примеров в одном запросе")] = 50,
+    batch_size: Annotated[int, typer.Option(prompt=True, show_default=True, help="Максимальное кол-во примеров в одном запросе (дополнительно ограничено контекстом модели)")] = 50,
+    max_in_flight: Annotated[
+        int, typer.Option(min=1, show_default=True, help="Кол-во батчей, одновременно отправленных в LLM")
+    ] = 1,
+    rules: Annotated[
+        bool,
+        typer.Option(
+            "--rules/--no-rules",
+            help="Сначала нормализовать числа и символы правилами, в LLM отправлять только остаток",
+        ),
+    ] = True,
     provider: Annotated[
         LLMProvider, typer.Option(help="LLM провайдер")
     ] = LLMProvider.OLLAMA,
     model_name: Annotated[str, typer.Option(help="Название модели")] = "qwen3:30b-a3b",
+    cache: Annotated[
+        bool, typer.Option("--cache/--no-cache", help="Кэшировать ответы LLM на диске")
+    ] = True,
+    near_dup_threshold: Annotated[
+        float,
+        typer.Option(
+            min=0.0, max=1.0, show_default=True,
+            help="Порог сходства Жаккара для отбрасывания похожих текстов (0 - только точные дубли)",
+        ),
+    ] = 0.85,
+    global_index: Annotated[
+        bool,
+        typer.Option(
+            "--global-index/--no-global-index",
+            help="Пропускать тексты, уже встречавшиеся в других файлах и прошлых запусках. "
+                 "Тексты, попавшие в индекс из этого же файла, не пропускаются",
+        ),
+    ] = True,
     input_dir: Annotated[
         str, typer.Option(help="Директория с входными файлами")
     ] = "./datasets",
@@ -57,10 +91,13 @@ def postprocess_file(
 
     # Генерируем имя выходного файла если не указано
     if not output_file_name:
-        base_name = os.path.splitext(jsonl_file_name)[0]
+        base_name = jsonl_file_name.removesuffix(".gz").removesuffix(".zst")
+        base_name = os.path.splitext(base_name)[0]
         output_file_name = f"{base_name}_processed_{uuid.uuid4().hex[:8]}.jsonl"
 
     output_file_path = os.path.join(output_dir, output_file_name)
+    # Строки, которые LLM не смогла обработать даже поодиночке
+    reject_file_path = os.path.splitext(output_file_path)[0] + ".rejected.jsonl"
 
     # Создаем директорию для выходного файла
     os.makedirs(os.path.dirname(output_file_path), exist_ok=True)
@@ -69,7 +106,8 @@ def postprocess_file(
     client_kwargs = {"model_name": model_name}
 
     try:
-        llm_client = create_llm_client(provider, **client_kwargs)
+        # Параллельность задает пользователь, а не предел провайдера по умолчанию
+        llm_client = create_llm_client(provider, cache=cache, max_concurrency=max_in_flight, **client_kwargs)
     except Exception as e:
         typer.echo(
             typer.style(f"Ошибка создания клиента: {str(e)}", fg=typer.colors.RED)
@@ -81,8 +119,25 @@ def postprocess_file(
     # Обрабатываем файл
     try:
         seen_hashes = set()
-        with open(output_file_path, "w", encoding="utf-8") as output_file:
-            for batch in process_jsonl_file(jsonl_file_path, llm_client, batch_size):
+        near_index = NearDuplicateIndex(near_dup_threshold) if near_dup_threshold > 0 else None
+        near_duplicates_count = 0
+        global_duplicates_count = 0
+        with open(output_file_path, "w", encoding="utf-8") as output_file, ExitStack() as indexes:
+            known_indexes = []
+            dataset_index = None
+            source = dataset_source(jsonl_file_name)
+            if global_index:
+                dataset_index = indexes.enter_context(open_global_index(DATASET_INDEX))
+                known_indexes = [dataset_index, indexes.enter_context(open_global_index(AUDIO_INDEX))]
+
+            for batch in process_jsonl_file(
+                jsonl_file_path,
+                llm_client,
+                batch_size,
+                max_in_flight,
+                use_rules=rules,
+                reject_file_path=reject_file_path,
+            ):
                 for item in batch:
                     # Пропускаем, если в тексте есть цифры
                     if any(char.isdigit() for char in item.user_query):
@@ -93,14 +148,22 @@ def postprocess_file(
                     text1 = item.user_query.strip()
                     id2 = generate_text_hash(item.ai_response)
                     text2 = item.ai_response.strip()
-                    # Записываем только уникальные тексты
-                    if id1 not in seen_hashes:
-                        seen_hashes.add(id1)
-                        output_file.write(DialogueResult(id=id1, text=text1).to_jsonl())
-
-                    if id2 not in seen_hashes:
-                        seen_hashes.add(id2)
-                        output_file.write(DialogueResult(id=id2, text=text2).to_jsonl())
+                    for text_id, text in ((id1, text1), (id2, text2)):
+                        # Записываем только уникальные тексты
+                        if text_id in seen_hashes:
+                            continue
+                        seen_hashes.add(text_id)
+                        # Повторный запуск по тому же файлу не должен отбрасывать его же тексты
+                        if any(index.seen_elsewhere(text, source) for index in known_indexes):
+                            global_duplicates_count += 1
+                            continue
+                        # Отличия в пунктуации или одном слове не стоят повторного синтеза
+                        if near_index is not None and not near_index.add_if_unique(text):
+                            near_duplicates_count += 1
+                            continue
+                        output_file.write(DialogueResult(id=text_id, text=text).to_jsonl())
+                        if dataset_index is not None:
+                            dataset_index.add(text, source)
 
         typer.echo(
             typer.style(
@@ -110,6 +173,12 @@ def postprocess_file(
             )
         )
         typer.echo(f"Результаты сохранены в: {output_file_path}")
+        if near_index is not None:
+            typer.echo(f"Пропущено похожих текстов: {near_duplicates_count}")
+        if global_index:
+            typer.echo(f"Пропущено текстов из глобального индекса: {global_duplicates_count}")
+        for stats_line in client_stats_lines(llm_client):
+            typer.echo(stats_line)
 
     except Exception as e:
         typer.echo(
@@ -142,6 +211,23 @@ def generate_text(
         str, typer.Option(help="Base URL (для Ollama)")
     ] = "http://localhost:11434",
     temperature: Annotated[float, typer.Option(prompt=True, min=0.0, max=1.0, help="Температура генерации (0.0-1.0).", show_default=True)] = 0.7,
+    cache: Annotated[
+        bool,
+        typer.Option(
+            "--cache/--no-cache",
+            help="Кэшировать ответы LLM на диске (повторный запуск вернет те же диалоги)",
+        ),
+    ] = False,
+    parallel_topics: Annotated[
+        int, typer.Option(min=1, show_default=True, help="Кол-во тем, генерируемых одновременно")
+    ] = 1,
+    stream: Annotated[
+        bool,
+        typer.Option(
+            "--stream/--no-stream",
+            help="Читать ответ LLM потоком и записывать пары по мере генерации",
+        ),
+    ] = True,
 ):
     typer.echo(typer.style("Параметры генерации:", bold=True))
     typer.echo(f"  Провайдер: {provider.value}")
@@ -163,7 +249,7 @@ def generate_text(
         client_kwargs["base_url"] = base_url
 
     try:
-        llm_client = create_llm_client(provider, **client_kwargs)
+        llm_client = create_llm_client(provider, cache=cache, max_concurrency=parallel_topics, **client_kwargs)
     except Exception as e:
         typer.echo(
             typer.style(f"Ошибка создания клиента: {str(e)}", fg=typer.colors.RED)
@@ -214,12 +300,16 @@ def generate_text(
             batch_size,
             num_samples=samples,
             temperature=temperature,
+            parallel_topics=parallel_topics,
+            stream=stream,
         )
         typer.echo(
             typer.style(
                 "\n✅ Генерация успешно завершена!", fg=typer.colors.GREEN, bold=True
             )
         )
+        for stats_line in client_stats_lines(llm_client):
+            typer.echo(stats_line)
     except Exception as e:
         traceback.print_exc()
         typer.echo(
@@ -228,22 +318,84 @@ def generate_text(
         raise typer.Exit(code=1)
 
 
+def _read_pairs(jsonl_file_path: str) -> list[DialoguePair]:
+    with open(jsonl_file_path, "r", encoding='utf-8') as jsonl_file:
+        return [DialoguePair.model_validate(json.loads(line)) for line in jsonl_file if line.strip()]
+
+
 @app.command()
 def runorm_file(
         jsonl_file_name: Annotated[str, typer.Option(prompt=True, show_default=True)] = "Здоровое_питание.jsonl",
-        device: Annotated[Device, typer.Option(prompt=True, show_default=True)] = Device.cuda
+        device: Annotated[Device, typer.Option(prompt=True, show_default=True)] = Device.cuda,
+        batch_size: Annotated[int, typer.Option(min=1, show_default=True, help="Кол-во строк в одном батче")] = 64,
+        num_threads: Annotated[
+            int, typer.Option(min=0, show_default=True, help="Потоков torch на CPU (0 - по умолчанию)")] = 0,
+        normalize_user_query: Annotated[
+            bool, typer.Option("--normalize-user-query/--no-normalize-user-query",
+                               help="Нормализовать также user_query")] = True,
+        workers: Annotated[
+            int, typer.Option(min=1, show_default=True,
+                              help="Кол-во процессов, каждый со своей копией модели")] = 1,
 ):
-    from runorm import RUNorm
+    """
+    Нормализует пары RUNorm. При --workers > 1 файл делится на шарды между процессами,
+    --num-threads тогда задает потоки torch на один процесс (0 - ядра поровну).
+    """
     typer.echo(get_available_gpus())
-    normalizer = RUNorm()
-    normalizer.load(model_size="big", device=device)
     jsonl_file_path = os.path.join(BASE_DIR, "payload_datasets", jsonl_file_name)
-    dialogue_pairs = []
-    with open(jsonl_file_path, "r", encoding='utf-8') as jsonl_file:
-        for line in jsonl_file:
-            pair = DialoguePair.model_validate(json.loads(line))
-            pair.ai_response = normalizer.norm(pair.ai_response)
-            dialogue_pairs.append(pair)
-    with open(jsonl_file_path, "w", encoding='utf-8') as jsonl_file:
-        lines = [pair.to_jsonl() for pair in dialogue_pairs]
-        jsonl_file.writelines(lines)
+    dialogue_pairs = _read_pairs(jsonl_file_path)
+
+    started_at = time.perf_counter()
+    with tqdm(total=len(dialogue_pairs), desc="Нормализация", unit="строк") as pbar:
+        if workers > 1:
+            normalized_pairs = []
+            for shard in normalize_pairs_parallel(
+                    dialogue_pairs, device, workers, num_threads, batch_size, normalize_user_query):
+                normalized_pairs.extend(shard)
+                pbar.update(len(shard))
+            dialogue_pairs = normalized_pairs
+        else:
+            normalizer = load_normalizer(device, num_threads=num_threads)
+            for start in range(0, len(dialogue_pairs), batch_size):
+                chunk = dialogue_pairs[start:start + batch_size]
+                normalize_pairs(normalizer, chunk, batch_size, normalize_user_query)
+                pbar.update(len(chunk))
+    elapsed = time.perf_counter() - started_at
+
+    # Пишем во временный файл и подменяем, чтобы не потерять данные при сбое
+    temp_file_path = jsonl_file_path + ".runorm_temp"
+    with open(temp_file_path, "w", encoding='utf-8') as jsonl_file:
+        jsonl_file.writelines(pair.to_jsonl() for pair in dialogue_pairs)
+    os.replace(temp_file_path, jsonl_file_path)
+    typer.echo(f"Обработано {len(dialogue_pairs)} строк, {len(dialogue_pairs) / max(elapsed, 1e-9):.2f} строк/с")
+
+
+@app.command()
+def runorm_benchmark(
+        jsonl_file_name: Annotated[str, typer.Option(prompt=True, show_default=True)] = "Здоровое_питание.jsonl",
+        device: Annotated[Device, typer.Option(show_default=True)] = Device.cpu,
+        rows: Annotated[int, typer.Option(min=1, show_default=True, help="Кол-во строк для замера")] = 200,
+        batch_size: Annotated[int, typer.Option(min=1, show_default=True)] = 64,
+        num_threads: Annotated[int, typer.Option(min=0, show_default=True)] = 0,
+):
+    """
+    Сравнивает скорость построчной и батчевой нормализации RUNorm на первых строках файла.
+    Файл не изменяется.
+    """
+    normalizer = load_normalizer(device, num_threads=num_threads)
+    jsonl_file_path = os.path.join(BASE_DIR, "payload_datasets", jsonl_file_name)
+    sample = _read_pairs(jsonl_file_path)[:rows]
+
+    started_at = time.perf_counter()
+    for pair in sample:
+        normalizer.norm(pair.ai_response)
+        normalizer.norm(pair.user_query)
+    per_line_elapsed = time.perf_counter() - started_at
+
+    started_at = time.perf_counter()
+    normalize_pairs(normalizer, [pair.model_copy() for pair in sample], batch_size)
+    batched_elapsed = time.perf_counter() - started_at
+
+    typer.echo(f"Строк: {len(sample)}, устройство: {device.value}, потоков torch: {num_threads or 'по умолчанию'}")
+    typer.echo(f"Построчно: {len(sample) / max(per_line_elapsed, 1e-9):.2f} строк/с")
+    typer.echo(f"Батчами:   {len(sample) / max(batched_elapsed, 1e-9):.2f} строк/с")
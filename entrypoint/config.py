@@ -9,5 +9,11 @@ load_dotenv()
 
 HF_TOKEN = os.getenv("HF_TOKEN")
 ELEVENLABS_TOKEN = os.getenv("ELEVENLABS_TOKEN")
+# Позволяет направить клиент на локальный фейковый TTS сервер (для тестов)
+ELEVENLABS_BASE_URL = os.getenv("ELEVENLABS_BASE_URL")
 GEMINI_TOKEN = os.getenv("GEMINI_TOKEN")
-OPENROUTER_TOKEN = os.getenv("OPENROUTER_TOKEN")
\ No newline at end of file
+OPENROUTER_TOKEN = os.getenv("OPENROUTER_TOKEN")
+
+CACHE_DIR = os.getenv("CACHE_DIR", os.path.join(BASE_DIR, ".cache"))
+MANIFEST_DIR = os.getenv("MANIFEST_DIR", os.path.join(BASE_DIR, "manifest"))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", 1024 ** 3))
@@ -1,4 +1,4 @@
-from commands import neural_commands, elevenlabs_commands, hf_commands
+from commands import neural_commands, elevenlabs_commands, hf_commands, index_commands, manifest_commands, audio_commands
 from typer import Typer
 
 
@@ -11,3 +11,6 @@ def configure_app(app: Typer) -> None:
     app.add_typer(neural_commands.app, name="neural")
     app.add_typer(elevenlabs_commands.app, name="elevenlabs")
     app.add_typer(hf_commands.app, name="hf")
+    app.add_typer(index_commands.app, name="index")
+    app.add_typer(manifest_commands.app, name="manifest")
+    app.add_typer(audio_commands.app, name="audio")
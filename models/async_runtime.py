@@ -0,0 +1,86 @@
+import asyncio
+import threading
+import weakref
+from typing import Any, AsyncIterator, Callable, Coroutine, Hashable, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Лимиты пула соединений общего HTTP клиента провайдера
+MAX_CONNECTIONS = 100
+MAX_KEEPALIVE_CONNECTIONS = 20
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+_shared_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[Hashable, Any]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    """Фоновый event loop, на котором выполняются синхронные вызовы chat"""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="llm-event-loop", daemon=True).start()
+            _loop = loop
+    return _loop
+
+
+def run_sync(coroutine: Coroutine[Any, Any, T]) -> T:
+    """
+    Выполняет корутину на общем фоновом loop и ждет результат.
+    Все синхронные вызовы из любых потоков попадают в один loop,
+    поэтому делят между собой пулы соединений провайдеров.
+    """
+    loop = _background_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        coroutine.close()
+        raise RuntimeError("Синхронный chat нельзя вызывать из achat: используйте await achat")
+    return asyncio.run_coroutine_threadsafe(coroutine, loop).result()
+
+
+_END = object()
+
+
+async def _next_or_end(iterator: AsyncIterator[T]) -> Any:
+    try:
+        return await iterator.__anext__()
+    except StopAsyncIteration:
+        return _END
+
+
+def iterate_sync(iterator: AsyncIterator[T]) -> Iterator[T]:
+    """Синхронно читает асинхронный итератор, выполняя его на общем фоновом loop"""
+    try:
+        while True:
+            item = run_sync(_next_or_end(iterator))
+            if item is _END:
+                return
+            yield item
+    finally:
+        # Чтение брошено на середине: закрываем поток провайдера, чтобы освободить соединение
+        aclose = getattr(iterator, "aclose", None)
+        if aclose is not None:
+            run_sync(aclose())
+
+
+def shared_client(key: Hashable, factory: Callable[[], T]) -> T:
+    """
+    Возвращает общий для всех экземпляров клиентов асинхронный SDK клиент.
+    Соединения httpx привязаны к event loop, поэтому клиент свой у каждого loop.
+    """
+    clients = _shared_clients.setdefault(asyncio.get_running_loop(), {})
+    if key not in clients:
+        clients[key] = factory()
+    return clients[key]
+
+
+def http_limits():
+    import httpx
+
+    return httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS)
@@ -1,15 +1,39 @@
 from abc import ABC, abstractmethod
-from typing import Any
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Iterator
+
+from models.async_runtime import iterate_sync, run_sync
+
+
+# Оценка токенов без токенизатора: для русского текста ~2.5 символа на токен
+CHARS_PER_TOKEN = 2.5
+
+
+def estimate_tokens(text: str) -> int:
+    return int(len(text) / CHARS_PER_TOKEN) + 1
+
+
+def response_schema(response_format: Any) -> Any:
+    """Приводит response_format (pydantic модель или готовая схема) к JSON схеме"""
+    if response_format is None:
+        return None
+    if hasattr(response_format, "model_json_schema"):
+        return response_format.model_json_schema()
+    return response_format
 
 
 class BaseLLMClient(ABC):
     """Базовый класс для всех LLM клиентов"""
 
+    # Размер контекста и лимит ответа модели в токенах, по ним режутся батчи
+    context_window: int = 32768
+    max_output_tokens: int = 8192
+
     @abstractmethod
-    def chat(self,
-             messages: list[dict[str, str]],
-             temperature: float = 0.7,
-             response_format: Any = None) -> str:
+    async def achat(self,
+                    messages: list[dict[str, str]],
+                    temperature: float = 0.7,
+                    response_format: Any = None) -> str:
         """
         Отправляет сообщения в LLM и возвращает ответ
 
@@ -20,4 +44,57 @@ class BaseLLMClient(ABC):
 
         Returns:
             Строка с ответом модели
-        """
\ No newline at end of file
+        """
+
+    def chat(self,
+             messages: list[dict[str, str]],
+             temperature: float = 0.7,
+             response_format: Any = None) -> str:
+        """Синхронная обертка над achat; безопасна для вызова из нескольких потоков"""
+        return run_sync(self.achat(messages, temperature=temperature, response_format=response_format))
+
+    async def astream(self,
+                      messages: list[dict[str, str]],
+                      temperature: float = 0.7,
+                      response_format: Any = None) -> AsyncIterator[str]:
+        """
+        Отдает ответ частями по мере генерации.
+        По умолчанию - одной частью после achat; клиенты со стримингом переопределяют метод.
+        """
+        yield await self.achat(messages, temperature=temperature, response_format=response_format)
+
+    def stream(self,
+               messages: list[dict[str, str]],
+               temperature: float = 0.7,
+               response_format: Any = None) -> Iterator[str]:
+        """Синхронная обертка над astream"""
+        return iterate_sync(self.astream(messages, temperature=temperature, response_format=response_format))
+
+
+class LLMClientWrapper(BaseLLMClient, ABC):
+    """Базовый класс оберток над клиентом: параметры модели берутся у обернутого клиента"""
+
+    def __init__(self, client: BaseLLMClient):
+        self.client = client
+
+    async def astream(self,
+                      messages: list[dict[str, str]],
+                      temperature: float = 0.7,
+                      response_format: Any = None) -> AsyncIterator[str]:
+        # aclosing: брошенный читателем поток сразу закрывается по всей цепочке оберток
+        async with aclosing(self.client.astream(messages, temperature=temperature,
+                                                response_format=response_format)) as chunks:
+            async for chunk in chunks:
+                yield chunk
+
+    @property
+    def model_name(self) -> str:
+        return self.client.model_name
+
+    @property
+    def context_window(self) -> int:
+        return self.client.context_window
+
+    @property
+    def max_output_tokens(self) -> int:
+        return self.client.max_output_tokens
@@ -1,28 +1,62 @@
-import json
-from typing import Optional, Any
+from typing import AsyncIterator, Optional, Any
 
+from models.async_runtime import http_limits, shared_client
 from models.base_llm_client import BaseLLMClient
 
+DEEPSEEK_BASE_URL = "https://api.deepseek.com"
+
 
 class DeepSeekClient(BaseLLMClient):
+    context_window = 65536
+    max_output_tokens = 8192
+
     def __init__(self, api_key: str, model_name: str):
-        from openai import OpenAI
-        self.client = OpenAI(
-            api_key=api_key,
-            base_url="https://api.deepseek.com"
-        )
+        self.api_key = api_key
         self.model_name = model_name
 
-    def chat(self,
-             messages: list[dict[str, str]],
-             temperature: float = 0.7,
-             response_format: Optional[dict[str, Any]] = None) -> str:
+    def _client(self):
+        from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+        return shared_client(
+            ("deepseek", self.api_key),
+            lambda: AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=DEEPSEEK_BASE_URL,
+                http_client=DefaultAsyncHttpxClient(limits=http_limits()),
+            ),
+        )
+
+    def _request(self, messages: list[dict[str, str]], temperature: float, response_format: Any) -> dict[str, Any]:
+        # DeepSeek не принимает JSON схему, только режим JSON объекта
+        if response_format is not None and not isinstance(response_format, dict):
+            response_format = {"type": "json_object"}
+        return {
+            "model": self.model_name,
+            "messages": messages,
+            "temperature": temperature,
+            "response_format": response_format,
+        }
 
-        response = self.client.chat.completions.create(
-            model=self.model_name,
-            messages=messages,
-            temperature=temperature,
-            response_format=response_format,
+    async def achat(self,
+                    messages: list[dict[str, str]],
+                    temperature: float = 0.7,
+                    response_format: Optional[dict[str, Any]] = None) -> str:
+        response = await self._client().chat.completions.create(
+            **self._request(messages, temperature, response_format),
             stream=False
         )
-        return response.choices[0].message.content
\ No newline at end of file
+        return response.choices[0].message.content
+
+    async def astream(self,
+                      messages: list[dict[str, str]],
+                      temperature: float = 0.7,
+                      response_format: Optional[dict[str, Any]] = None) -> AsyncIterator[str]:
+        chunks = await self._client().chat.completions.create(
+            **self._request(messages, temperature, response_format),
+            stream=True
+        )
+        # Закрывает HTTP ответ, если читатель бросил поток до конца
+        async with chunks:
+            async for chunk in chunks:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
@@ -1,29 +1,44 @@
-from typing import Any
+from contextlib import aclosing
+from typing import Any, AsyncIterator
 from google import genai
-import outlines
 
+from models.async_runtime import shared_client
 from models.base_llm_client import BaseLLMClient
-
+from models.prompt import messages_to_prompt
 
 
 class GeminiClient(BaseLLMClient):
+    context_window = 1048576
+    max_output_tokens = 65000
+
     def __init__(self, api_key: str, model_name: str = "gemini-2.5-flash"):
-        client = genai.Client(api_key=api_key)
-        self.model = outlines.from_gemini(
-            client,
-            model_name
-        )
+        self.api_key = api_key
+        self.model_name = model_name
 
-    def chat(self,
-             messages: list[dict[str, str]],
-             temperature: float = 0.7,
-             response_format: Any = None) -> str:
-        # Конвертируем формат сообщений для Gemini
-        prompt = ""
-        for msg in messages:
-            if msg["role"] == "system":
-                prompt += f"Инструкции: {msg['content']}\n\n"
-            else:
-                prompt += f"{msg['content']}\n\n"
-        result = self.model(prompt, response_format, max_output_tokens=65000)
-        return result
\ No newline at end of file
+    def _request(self, messages: list[dict[str, str]], temperature: float, response_format: Any) -> dict[str, Any]:
+        config: dict[str, Any] = {"temperature": temperature, "max_output_tokens": self.max_output_tokens}
+        if response_format is not None:
+            config["response_mime_type"] = "application/json"
+            config["response_schema"] = response_format
+        return {"model": self.model_name, "contents": messages_to_prompt(messages), "config": config}
+
+    async def achat(self,
+                    messages: list[dict[str, str]],
+                    temperature: float = 0.7,
+                    response_format: Any = None) -> str:
+        client = shared_client(("gemini", self.api_key), lambda: genai.Client(api_key=self.api_key))
+        response = await client.aio.models.generate_content(**self._request(messages, temperature, response_format))
+        return response.text
+
+    async def astream(self,
+                      messages: list[dict[str, str]],
+                      temperature: float = 0.7,
+                      response_format: Any = None) -> AsyncIterator[str]:
+        client = shared_client(("gemini", self.api_key), lambda: genai.Client(api_key=self.api_key))
+        chunks = await client.aio.models.generate_content_stream(
+            **self._request(messages, temperature, response_format)
+        )
+        async with aclosing(chunks):
+            async for chunk in chunks:
+                if chunk.text:
+                    yield chunk.text
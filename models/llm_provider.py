@@ -5,4 +5,6 @@ class LLMProvider(str, Enum):
     OLLAMA = "ollama"
     DEEPSEEK = "deepseek"
     GEMINI = "gemini"
-    OPENROUTER = "openrouter"
\ No newline at end of file
+    OPENROUTER = "openrouter"
+    # Локальная заглушка без сети
+    MOCK = "mock"
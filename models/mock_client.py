@@ -0,0 +1,65 @@
+import asyncio
+import hashlib
+import json
+import re
+from typing import Any, AsyncIterator
+
+from models.base_llm_client import BaseLLMClient
+
+_BATCH_SIZE_PATTERN = re.compile(r"Сгенерируй (\d+) пар")
+# Размер части ответа в astream, символов
+_STREAM_CHUNK_SIZE = 64
+
+
+class MockLLMClient(BaseLLMClient):
+    """
+    Локальный клиент без сети для тестов пайплайнов и нагрузочных прогонов.
+    Для схемы с полем pairs возвращает переданные в промпте пары без изменений
+    (постобработка) или генерирует запрошенное число пар (генерация).
+    Ответ детерминирован: одинаковый запрос дает одинаковый ответ.
+    """
+
+    context_window = 32768
+    max_output_tokens = 8192
+
+    def __init__(self, model_name: str = "mock", latency: float = 0.05):
+        self.model_name = model_name
+        self.latency = latency
+
+    async def achat(self,
+                    messages: list[dict[str, str]],
+                    temperature: float = 0.7,
+                    response_format: Any = None) -> str:
+        await asyncio.sleep(self.latency)
+        user_content = messages[-1]["content"] if messages else ""
+        fields = getattr(response_format, "model_fields", {})
+        if "pairs" not in fields:
+            return json.dumps({"text": user_content}, ensure_ascii=False)
+
+        pairs = []
+        for line in user_content.splitlines():
+            line = line.strip()
+            if line.startswith("{"):
+                try:
+                    pairs.append(json.loads(line))
+                except json.JSONDecodeError:
+                    pass
+        batch_size = _BATCH_SIZE_PATTERN.search(user_content)
+        if batch_size is not None:
+            seed = hashlib.sha256(user_content.encode("utf-8")).hexdigest()[:8]
+            pairs = [
+                {"id": index + 1, "user_query": f"Вопрос {seed} номер {index + 1}",
+                 "ai_response": f"Ответ {seed} номер {index + 1}"}
+                for index in range(int(batch_size.group(1)))
+            ]
+        return json.dumps({"pairs": pairs}, ensure_ascii=False)
+
+    async def astream(self,
+                      messages: list[dict[str, str]],
+                      temperature: float = 0.7,
+                      response_format: Any = None) -> AsyncIterator[str]:
+        response = await self.achat(messages, temperature=temperature, response_format=response_format)
+        for start in range(0, len(response), _STREAM_CHUNK_SIZE):
+            # Отдаем управление loop между частями, как при настоящем стриминге
+            await asyncio.sleep(0)
+            yield response[start:start + _STREAM_CHUNK_SIZE]
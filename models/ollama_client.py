@@ -1,27 +1,55 @@
-from typing import Optional, Any
+from contextlib import aclosing
+from typing import AsyncIterator, Optional, Any
 
-from models.base_llm_client import BaseLLMClient
+from models.async_runtime import http_limits, shared_client
+from models.base_llm_client import BaseLLMClient, response_schema
+
+OLLAMA_HOST = "http://localhost:11434"
 
 
 class OllamaClient(BaseLLMClient):
+    context_window = 32768
+    max_output_tokens = 32768
+
     def __init__(self, model_name: str):
+        self.model_name = model_name
+
+    @staticmethod
+    def _client():
         import ollama
 
-        self.client = ollama.Client(host="http://localhost:11434")
-        self.model_name = model_name
+        # Один AsyncClient (и пул соединений) на все экземпляры клиента
+        return shared_client(
+            ("ollama", OLLAMA_HOST),
+            lambda: ollama.AsyncClient(host=OLLAMA_HOST, limits=http_limits()),
+        )
 
-    def chat(
+    def _request(self, messages: list[dict[str, str]], temperature: float, response_format: Any) -> dict[str, Any]:
+        return {
+            "model": self.model_name,
+            "messages": messages,
+            "options": {"temperature": temperature, "num_ctx": 32768},
+            "format": response_schema(response_format),
+        }
+
+    async def achat(
         self,
         messages: list[dict[str, str]],
         temperature: float = 0.7,
         response_format: Optional[dict[str, Any]] = None,
     ) -> str:
+        response = await self._client().chat(**self._request(messages, temperature, response_format))
 
-        response = self.client.chat(
-            model=self.model_name,
-            messages=messages,
-            options={"temperature": temperature, "num_ctx": 32768},
-            format=response_format,
-        )
+        return response["message"]["content"]
 
-        return response["message"]["content"]
\ No newline at end of file
+    async def astream(
+        self,
+        messages: list[dict[str, str]],
+        temperature: float = 0.7,
+        response_format: Optional[dict[str, Any]] = None,
+    ) -> AsyncIterator[str]:
+        parts = await self._client().chat(**self._request(messages, temperature, response_format), stream=True)
+        async with aclosing(parts):
+            async for part in parts:
+                if part["message"]["content"]:
+                    yield part["message"]["content"]
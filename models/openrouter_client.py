@@ -1,29 +1,78 @@
-from typing import Any
-import outlines
-from openai import OpenAI
+from typing import Any, AsyncIterator
 
-from models.base_llm_client import BaseLLMClient
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
 
+from models.async_runtime import http_limits, shared_client
+from models.base_llm_client import BaseLLMClient, response_schema
+from models.prompt import messages_to_prompt
+
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+
+
+def _strict_schema(schema: Any) -> Any:
+    """Strict режим OpenAI требует additionalProperties: false у каждого объекта схемы"""
+    if isinstance(schema, dict):
+        schema = {key: _strict_schema(value) for key, value in schema.items()}
+        if "properties" in schema:
+            schema["additionalProperties"] = False
+    elif isinstance(schema, list):
+        schema = [_strict_schema(item) for item in schema]
+    return schema
 
 
 class OpenRouterClient(BaseLLMClient):
+    context_window = 128000
+    max_output_tokens = 32000
+
     def __init__(self, api_key: str, model_name: str = "openai/gpt-4.1"):
-        client = OpenAI(base_url="https://openrouter.ai/api/v1", api_key=api_key)
-        self.model = outlines.from_openai(
-            client,
-            model_name
+        self.api_key = api_key
+        self.model_name = model_name
+
+    def _client(self) -> AsyncOpenAI:
+        return shared_client(
+            ("openrouter", self.api_key),
+            lambda: AsyncOpenAI(
+                base_url=OPENROUTER_BASE_URL,
+                api_key=self.api_key,
+                http_client=DefaultAsyncHttpxClient(limits=http_limits()),
+            ),
         )
 
-    def chat(self,
-             messages: list[dict[str, str]],
-             temperature: float = 0.7,
-             response_format: Any = None) -> str:
-        # Конвертируем формат сообщений для Gemini
-        prompt = ""
-        for msg in messages:
-            if msg["role"] == "system":
-                prompt += f"Инструкции: {msg['content']}\n\n"
-            else:
-                prompt += f"{msg['content']}\n\n"
-        result = self.model(prompt, response_format, max_tokens=32000)
-        return result
\ No newline at end of file
+    def _request(self, messages: list[dict[str, str]], temperature: float, response_format: Any) -> dict[str, Any]:
+        request: dict[str, Any] = {
+            "model": self.model_name,
+            "messages": [{"role": "user", "content": messages_to_prompt(messages)}],
+            "temperature": temperature,
+            "max_tokens": self.max_output_tokens,
+        }
+        if response_format is not None:
+            # Тот же строгий json_schema, который раньше формировал outlines
+            request["response_format"] = {
+                "type": "json_schema",
+                "json_schema": {
+                    "name": getattr(response_format, "__name__", "response"),
+                    "schema": _strict_schema(response_schema(response_format)),
+                    "strict": True,
+                },
+            }
+        return request
+
+    async def achat(self,
+                    messages: list[dict[str, str]],
+                    temperature: float = 0.7,
+                    response_format: Any = None) -> str:
+        response = await self._client().chat.completions.create(**self._request(messages, temperature, response_format))
+        return response.choices[0].message.content
+
+    async def astream(self,
+                      messages: list[dict[str, str]],
+                      temperature: float = 0.7,
+                      response_format: Any = None) -> AsyncIterator[str]:
+        chunks = await self._client().chat.completions.create(
+            **self._request(messages, temperature, response_format), stream=True
+        )
+        # Закрывает HTTP ответ, если читатель бросил поток до конца
+        async with chunks:
+            async for chunk in chunks:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
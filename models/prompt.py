@@ -0,0 +1,9 @@
+def messages_to_prompt(messages: list[dict[str, str]]) -> str:
+    """Склеивает сообщения в один промпт для провайдеров, которым он передается целиком"""
+    prompt = ""
+    for msg in messages:
+        if msg["role"] == "system":
+            prompt += f"Инструкции: {msg['content']}\n\n"
+        else:
+            prompt += f"{msg['content']}\n\n"
+    return prompt
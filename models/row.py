@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic import BaseModel
 
 
@@ -8,6 +10,13 @@ class BaseRow(BaseModel):
     def to_jsonl(self):
         return self.model_dump_json()+'\n'
 
+
+class RequeueRow(BaseRow):
+    """Строка payload для повторного синтеза: источник датасета и обход кэша аудио"""
+    source: Optional[str] = None
+    bypass_audio_cache: bool = False
+
+
 class HfRow(BaseRow):
     source: str
     file_name: str
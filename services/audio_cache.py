@@ -0,0 +1,53 @@
+import hashlib
+import json
+import os
+import shutil
+import uuid
+
+
+def make_audio_key(voice_id: str, model: str, voice_settings: str, output_format: str, text: str) -> str:
+    payload = json.dumps(
+        [voice_id, model, voice_settings, output_format, text], ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _link_or_copy(src: str, dst: str) -> None:
+    # Пишем во временный файл рядом с dst и атомарно подменяем
+    tmp_path = f"{dst}.{uuid.uuid4().hex[:8]}.tmp"
+    try:
+        os.link(src, tmp_path)
+    except OSError:
+        # Другая файловая система или нет поддержки жестких ссылок
+        shutil.copy2(src, tmp_path)
+    os.replace(tmp_path, dst)
+
+
+class AudioCache:
+    """
+    Контентно-адресуемое хранилище синтезированного аудио.
+    Файл хранится по хешу голоса, модели, настроек, формата и текста,
+    поэтому один и тот же текст одним голосом синтезируется только один раз.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def path_for(self, key: str, extension: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}{extension}")
+
+    def fetch(self, key: str, extension: str, destination: str) -> bool:
+        """Копирует аудио из кэша в destination. Возвращает False при промахе."""
+        cached_path = self.path_for(key, extension)
+        if not os.path.exists(cached_path):
+            return False
+        _link_or_copy(cached_path, destination)
+        return True
+
+    def store(self, key: str, extension: str, source: str, replace: bool = False) -> None:
+        """replace=True подменяет уже сохраненное аудио, например забракованное при QC"""
+        cached_path = self.path_for(key, extension)
+        if os.path.exists(cached_path) and not replace:
+            return
+        os.makedirs(os.path.dirname(cached_path), exist_ok=True)
+        _link_or_copy(source, cached_path)
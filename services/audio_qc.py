@@ -0,0 +1,165 @@
+import os
+import struct
+import wave
+from typing import NamedTuple
+
+import numpy as np
+
+from services.manifest import MAX_DURATION, MIN_DURATION
+
+# Окно анализа тишины
+FRAME_SECONDS = 0.01
+FULL_SCALE = 32768.0
+
+
+class QcThresholds(NamedTuple):
+    min_duration: float = MIN_DURATION
+    max_duration: float = MAX_DURATION
+    # Кадр тише этого уровня считается тишиной
+    silence_db: float = -40.0
+    max_edge_silence: float = 1.0
+    max_silence_ratio: float = 0.5
+    # Почти пустой клип
+    min_rms_db: float = -45.0
+    max_clipping_ratio: float = 0.001
+    # Сколько тишины оставлять по краям при обрезке
+    trim_padding: float = 0.1
+
+
+DEFAULT_QC_THRESHOLDS = QcThresholds()
+
+
+class QcResult(NamedTuple):
+    audio_path: str
+    duration: float
+    sample_rate: int
+    rms_db: float
+    peak: float
+    clipping_ratio: float
+    silence_ratio: float
+    leading_silence: float
+    trailing_silence: float
+    trimmed: bool
+    reasons: list[str]
+
+
+def _data_chunk(file_path: str) -> tuple[int, int, int, int]:
+    """
+    Находит PCM данные в RIFF файле.
+    Возвращает (смещение данных, размер в байтах, частота, ширина сэмпла).
+    """
+    with open(file_path, "rb") as f:
+        riff, _, wave_id = struct.unpack("<4sI4s", f.read(12))
+        if riff != b"RIFF" or wave_id != b"WAVE":
+            raise ValueError("не WAV файл")
+        sample_rate = sample_width = channels = None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise ValueError("нет блока data")
+            chunk_id, chunk_size = struct.unpack("<4sI", header)
+            if chunk_id == b"fmt ":
+                fmt = f.read(chunk_size)
+                _, channels, sample_rate, _, _, bits = struct.unpack("<HHIIHH", fmt[:16])
+                sample_width = bits // 8
+                f.seek(chunk_size % 2, os.SEEK_CUR)
+            elif chunk_id == b"data":
+                if sample_rate is None:
+                    raise ValueError("блок data до блока fmt")
+                if sample_width != 2 or channels != 1:
+                    raise ValueError(f"поддерживается только 16-бит моно, а не {sample_width * 8}-бит/{channels}")
+                # Недописанный файл: в заголовке размер больше реального
+                data_size = min(chunk_size, os.path.getsize(file_path) - f.tell())
+                return f.tell(), data_size - data_size % 2, sample_rate, sample_width
+            else:
+                f.seek(chunk_size + chunk_size % 2, os.SEEK_CUR)
+
+
+def read_samples(file_path: str) -> tuple[np.ndarray, int]:
+    """Отображает PCM данные WAV в память без чтения файла целиком"""
+    offset, size, sample_rate, _ = _data_chunk(file_path)
+    if size == 0:
+        return np.zeros(0, dtype="<i2"), sample_rate
+    return np.memmap(file_path, dtype="<i2", mode="r", offset=offset, shape=(size // 2,)), sample_rate
+
+
+def _frame_levels_db(samples: np.ndarray, frame_length: int) -> np.ndarray:
+    frame_count = len(samples) // frame_length
+    frames = samples[:frame_count * frame_length].reshape(frame_count, frame_length).astype(np.float32)
+    rms = np.sqrt(np.mean(frames ** 2, axis=1)) / FULL_SCALE
+    return 20 * np.log10(np.maximum(rms, 1e-10))
+
+
+def _write_wav(file_path: str, samples: np.ndarray, sample_rate: int) -> None:
+    # Файл может быть жесткой ссылкой в кэш аудио: пишем новый и подменяем, а не правим на месте
+    tmp_path = f"{file_path}.tmp"
+    with wave.open(tmp_path, "wb") as wavfile:
+        wavfile.setparams((1, 2, sample_rate, 0, "NONE", "NONE"))
+        wavfile.writeframes(np.ascontiguousarray(samples, dtype="<i2").tobytes())
+    os.replace(tmp_path, file_path)
+
+
+def check_audio(audio_path: str, thresholds: QcThresholds, trim: bool = False) -> QcResult:
+    """Считает метрики клипа, при trim обрезает тишину по краям, и проверяет требования"""
+    samples, sample_rate = read_samples(audio_path)
+    frame_length = max(1, int(sample_rate * FRAME_SECONDS))
+    levels = _frame_levels_db(samples, frame_length)
+    voiced = np.flatnonzero(levels > thresholds.silence_db)
+    frame_count = len(levels)
+
+    if len(voiced):
+        leading_frames = int(voiced[0])
+        trailing_frames = frame_count - int(voiced[-1]) - 1
+    else:
+        leading_frames = trailing_frames = frame_count
+
+    trimmed = False
+    padding_frames = int(thresholds.trim_padding / FRAME_SECONDS)
+    if trim and len(voiced) and (leading_frames > padding_frames or trailing_frames > padding_frames):
+        start_frame = max(0, leading_frames - padding_frames)
+        end_frame = min(frame_count, int(voiced[-1]) + 1 + padding_frames)
+        trimmed_samples = np.array(samples[start_frame * frame_length:end_frame * frame_length])
+        del samples
+        _write_wav(audio_path, trimmed_samples, sample_rate)
+        samples = trimmed_samples
+        levels = levels[start_frame:end_frame]
+        leading_frames = min(leading_frames, padding_frames)
+        trailing_frames = min(trailing_frames, padding_frames)
+        trimmed = True
+
+    duration = len(samples) / sample_rate
+    absolute = np.abs(samples.astype(np.int32))
+    peak = float(absolute.max()) / FULL_SCALE if len(samples) else 0.0
+    clipping_ratio = float(np.count_nonzero(absolute >= FULL_SCALE - 1)) / len(samples) if len(samples) else 0.0
+    rms = float(np.sqrt(np.mean(samples.astype(np.float64) ** 2))) / FULL_SCALE if len(samples) else 0.0
+    rms_db = 20 * np.log10(max(rms, 1e-10))
+    silence_ratio = float(np.count_nonzero(levels <= thresholds.silence_db)) / len(levels) if len(levels) else 1.0
+    leading_silence = leading_frames * FRAME_SECONDS
+    trailing_silence = trailing_frames * FRAME_SECONDS
+
+    reasons = []
+    if duration < thresholds.min_duration:
+        reasons.append(f"длительность {duration:.2f}с < {thresholds.min_duration}с")
+    if duration > thresholds.max_duration:
+        reasons.append(f"длительность {duration:.2f}с > {thresholds.max_duration}с")
+    if rms_db < thresholds.min_rms_db:
+        reasons.append(f"почти пустой клип, RMS {rms_db:.1f} дБ")
+    if clipping_ratio > thresholds.max_clipping_ratio:
+        reasons.append(f"клиппинг {clipping_ratio:.2%}")
+    if silence_ratio > thresholds.max_silence_ratio:
+        reasons.append(f"тишина {silence_ratio:.0%} клипа")
+    if leading_silence > thresholds.max_edge_silence:
+        reasons.append(f"тишина в начале {leading_silence:.2f}с")
+    if trailing_silence > thresholds.max_edge_silence:
+        reasons.append(f"тишина в конце {trailing_silence:.2f}с")
+
+    return QcResult(audio_path, duration, sample_rate, float(rms_db), peak, clipping_ratio, silence_ratio,
+                    leading_silence, trailing_silence, trimmed, reasons)
+
+
+def safe_check_audio(audio_path: str, thresholds: QcThresholds, trim: bool) -> QcResult:
+    # Нечитаемый файл - тоже брак, а не причина остановить проверку
+    try:
+        return check_audio(audio_path, thresholds, trim)
+    except Exception as e:
+        return QcResult(audio_path, 0.0, 0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, False, [f"ошибка чтения: {e}"])
@@ -0,0 +1,144 @@
+import contextlib
+import json
+import os
+import sqlite3
+import wave
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, NamedTuple, Optional
+
+from entrypoint.config import CACHE_DIR
+from models.row import HfRow
+
+UNKNOWN = "unknown"
+
+
+class AudioInfo(NamedTuple):
+    duration: float
+    sample_rate: int
+
+
+def read_wav_info(file_path: str) -> AudioInfo:
+    """Читает только заголовок WAV: длительность и частоту дискретизации"""
+    with contextlib.closing(wave.open(file_path, "r")) as f:
+        rate = f.getframerate()
+        return AudioInfo(f.getnframes() / float(rate), rate)
+
+
+class DurationCache:
+    """
+    Постоянный кэш длительностей WAV файлов в SQLite.
+    Запись действительна, пока у файла не изменились размер и mtime.
+    """
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._connection = sqlite3.connect(path)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS durations ("
+            "path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, "
+            "duration REAL NOT NULL, sample_rate INTEGER NOT NULL)"
+        )
+        self._connection.commit()
+
+    def lookup(self, paths: Iterable[str]) -> dict[str, tuple[int, int, AudioInfo]]:
+        """Возвращает сохраненные (size, mtime_ns, info) для переданных путей"""
+        found = {}
+        for path in paths:
+            row = self._connection.execute(
+                "SELECT size, mtime_ns, duration, sample_rate FROM durations WHERE path = ?", (path,)
+            ).fetchone()
+            if row is not None:
+                found[path] = (row[0], row[1], AudioInfo(row[2], row[3]))
+        return found
+
+    def store(self, entries: Iterable[tuple[str, int, int, AudioInfo]]) -> None:
+        self._connection.executemany(
+            "INSERT OR REPLACE INTO durations (path, size, mtime_ns, duration, sample_rate) VALUES (?, ?, ?, ?, ?)",
+            ((path, size, mtime_ns, info.duration, info.sample_rate) for path, size, mtime_ns, info in entries),
+        )
+        self._connection.commit()
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def __enter__(self) -> "DurationCache":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+
+def open_duration_cache() -> DurationCache:
+    return DurationCache(os.path.join(CACHE_DIR, "wav_durations.sqlite"))
+
+
+class ScanResult(NamedTuple):
+    infos: dict[str, AudioInfo]
+    cached_count: int
+    failed: list[tuple[str, Exception]]
+
+
+def _safe_read_wav_info(file_path: str) -> tuple[Optional[AudioInfo], Optional[Exception]]:
+    try:
+        return read_wav_info(file_path), None
+    except Exception as e:
+        return None, e
+
+
+def scan_durations(file_paths: list[str], cache: DurationCache, workers: int = 16) -> ScanResult:
+    """
+    Возвращает длительности файлов. Заголовки читаются параллельно
+    и только у файлов, которых нет в кэше или которые изменились с прошлого запуска.
+    """
+    stats = {path: os.stat(path) for path in file_paths}
+    cached = cache.lookup(file_paths)
+    infos: dict[str, AudioInfo] = {}
+    to_read = []
+    for path in file_paths:
+        stat = stats[path]
+        entry = cached.get(path)
+        if entry is not None and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns:
+            infos[path] = entry[2]
+        else:
+            to_read.append(path)
+    cached_count = len(infos)
+
+    failed = []
+    fresh = []
+    # Чтение заголовка - это ввод-вывод, поэтому хватает потоков
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for path, (info, error) in zip(to_read, executor.map(_safe_read_wav_info, to_read)):
+            if error is not None:
+                failed.append((path, error))
+                continue
+            infos[path] = info
+            fresh.append((path, stats[path].st_size, stats[path].st_mtime_ns, info))
+    cache.store(fresh)
+    return ScanResult(infos, cached_count, failed)
+
+
+def load_metadata(input_path: str) -> dict[str, HfRow]:
+    """Собирает строки всех metadata.jsonl в папке по абсолютному пути аудиофайла"""
+    rows = {}
+    for root, _, files in os.walk(input_path):
+        if "metadata.jsonl" not in files:
+            continue
+        with open(os.path.join(root, "metadata.jsonl"), encoding="utf-8") as metadata_file:
+            for line in metadata_file:
+                if not line.strip():
+                    continue
+                row = HfRow.model_validate_json(line)
+                rows[os.path.normpath(os.path.join(root, row.file_name))] = row
+    return rows
+
+
+def duration_breakdown(
+    infos: dict[str, AudioInfo], metadata: dict[str, HfRow], field: str
+) -> dict[str, float]:
+    """Суммарная длительность по полю HfRow (voice, source, style), по убыванию"""
+    totals: dict[str, float] = defaultdict(float)
+    for path, info in infos.items():
+        row = metadata.get(os.path.normpath(path))
+        totals[getattr(row, field) if row is not None else UNKNOWN] += info.duration
+    return dict(sorted(totals.items(), key=lambda item: item[1], reverse=True))
@@ -1,13 +1,37 @@
+import os
+import wave
+from typing import Iterable
+
 import typer
-from elevenlabs import ElevenLabs, Voice
+from elevenlabs import ElevenLabs, Voice, VoiceSettings
+from elevenlabs.environment import ElevenLabsEnvironment
+
+from entrypoint.config import ELEVENLABS_TOKEN, ELEVENLABS_BASE_URL
+
+ELEVENLABS_MODEL = "eleven_multilingual_v2"
 
-from entrypoint.config import ELEVENLABS_TOKEN
+VOICE_SETTINGS = VoiceSettings(
+    # Определяет, насколько стабилен голос и насколько случайным является каждое его поколение. Более низкие значения расширяют эмоциональный диапазон голоса. Более высокие значения могут привести к монотонному голосу с ограниченными эмоциями.
+    stability=0.8,
+    # Определяет, насколько точно ИИ должен придерживаться оригинального голоса при попытке его воспроизведения.
+    similarity_boost=0.8,
+    speed=1,
+    use_speaker_boost=True,
+    # Определяет преувеличение стиля голоса. Эта настройка пытается усилить стиль оригинального диктора. Она потребляет дополнительные вычислительные ресурсы и может увеличить задержку, если установить значение, отличное от 0.
+    style=0
+)
 
 
 def get_client() -> ElevenLabs:
     if not ELEVENLABS_TOKEN:
         typer.echo("Not found ELEVENLABS_TOKEN")
         raise typer.Exit(1)
+    if ELEVENLABS_BASE_URL:
+        # base_url клиента всегда подставляет https и теряет порт, поэтому окружение задается целиком
+        environment = ElevenLabsEnvironment(
+            base=ELEVENLABS_BASE_URL, wss=ELEVENLABS_BASE_URL.replace("http", "ws", 1)
+        )
+        return ElevenLabs(api_key=ELEVENLABS_TOKEN, environment=environment)
     return ElevenLabs(api_key=ELEVENLABS_TOKEN)
 
 
@@ -16,3 +40,61 @@ def get_voice(client: ElevenLabs, voice_name: str) -> Voice:
     if len(voices_result.voices) == 0:
         raise ValueError(f"Voice '{voice_name}' not found")
     return voices_result.voices[0]
+
+
+def get_output_format(audio_format: str) -> str:
+    return "pcm_48000" if audio_format == ".wav" else "mp3_44100_192"
+
+
+def synthesize_to_file(
+    client: ElevenLabs,
+    voice: Voice,
+    text: str,
+    full_audio_path: str,
+    audio_format: str,
+) -> None:
+    """
+    Синтезирует текст и сохраняет аудио в full_audio_path.
+    Функция не хранит состояния и может вызываться из нескольких потоков.
+    """
+    audio_chunks = client.generate(
+        text=text,
+        voice=voice,
+        model=ELEVENLABS_MODEL,
+        output_format=get_output_format(audio_format),
+        voice_settings=VOICE_SETTINGS,
+        stream=True,
+    )
+    if isinstance(audio_chunks, bytes):
+        audio_chunks = [audio_chunks]
+
+    # Пишем во временный файл рядом и подменяем целевой: недописанный клип не появится под итоговым именем
+    tmp_path = f"{full_audio_path}.tmp"
+    try:
+        if audio_format == ".wav":
+            _stream_to_wav(audio_chunks, tmp_path)
+        else:
+            with open(tmp_path, "wb") as audio_file:
+                for chunk in audio_chunks:
+                    audio_file.write(chunk)
+        os.replace(tmp_path, full_audio_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _stream_to_wav(audio_chunks: Iterable[bytes], wav_path: str) -> None:
+    """
+    Пишет PCM чанки в WAV по мере поступления; размер данных в заголовке
+    wave дописывает при закрытии. В памяти держится не больше одного чанка.
+    """
+    with wave.open(wav_path, 'wb') as wavfile:
+        # pcm_48000: моно, 16 бит, 48 кГц
+        wavfile.setparams((1, 2, 48000, 0, 'NONE', 'NONE'))
+        remainder = b""
+        for chunk in audio_chunks:
+            # Чанк может оборваться посреди 16-битного сэмпла
+            chunk = remainder + chunk
+            remainder = chunk[len(chunk) - len(chunk) % 2:]
+            wavfile.writeframesraw(chunk[:len(chunk) - len(remainder)])
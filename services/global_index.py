@@ -0,0 +1,142 @@
+import hashlib
+import math
+import os
+import re
+import sqlite3
+from typing import Iterable, Optional
+
+from entrypoint.config import CACHE_DIR
+
+# Тексты подготовленных датасетов (datasets/) и тексты, уже озвученные (metadata.jsonl)
+DATASET_INDEX = "dataset"
+AUDIO_INDEX = "audio"
+
+
+def text_digest(text: str) -> bytes:
+    """16 байт SHA-256 - тот же хеш, что generate_text_hash, но в бинарном виде"""
+    return hashlib.sha256(text.strip().encode("utf-8")).digest()[:16]
+
+
+class BloomFilter:
+    """Фильтр Блума поверх bytearray; позиции берутся из уже равномерного дайджеста"""
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        capacity = max(capacity, 1024)
+        self.size = int(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray(self.size // 8 + 1)
+
+    def _positions(self, digest: bytes) -> Iterable[int]:
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:16], "little") | 1
+        return ((first + i * second) % self.size for i in range(self.hash_count))
+
+    def add(self, digest: bytes) -> None:
+        for position in self._positions(digest):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, digest: bytes) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(digest))
+
+
+class GlobalTextIndex:
+    """
+    Постоянный индекс хешей текстов между файлами и запусками.
+    Точные дайджесты хранятся в SQLite на диске, в памяти - только фильтр Блума
+    (~2 байта на текст), который отсекает почти все обращения к диску для новых текстов.
+    Для каждого текста запоминается источник, из которого он попал в индекс первым,
+    чтобы повторная обработка того же файла не отбрасывала его собственные тексты.
+    Не потокобезопасен: используйте из одного потока.
+    """
+
+    def __init__(self, path: str, expected_items: int = 1_000_000, commit_every: int = 1000):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.commit_every = commit_every
+        self._pending = 0
+        self._connection = sqlite3.connect(path)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS digests (digest BLOB PRIMARY KEY, source TEXT) WITHOUT ROWID"
+        )
+        columns = [row[1] for row in self._connection.execute("PRAGMA table_info(digests)")]
+        if "source" not in columns:
+            # Индекс, созданный до появления источников: их тексты считаются чужими для любого файла
+            self._connection.execute("ALTER TABLE digests ADD COLUMN source TEXT")
+        self.count = self._connection.execute("SELECT COUNT(*) FROM digests").fetchone()[0]
+        # Фильтр строится заново при открытии, с запасом под рост индекса
+        self._capacity = max(expected_items, self.count * 2)
+        self._bloom = BloomFilter(self._capacity)
+        for (digest,) in self._connection.execute("SELECT digest FROM digests"):
+            self._bloom.add(digest)
+
+    def __contains__(self, text: str) -> bool:
+        digest = text_digest(text)
+        if digest not in self._bloom:
+            return False
+        return self._connection.execute(
+            "SELECT 1 FROM digests WHERE digest = ?", (digest,)
+        ).fetchone() is not None
+
+    def seen_elsewhere(self, text: str, source: str) -> bool:
+        """Текст есть в индексе и попал туда не из source"""
+        digest = text_digest(text)
+        if digest not in self._bloom:
+            return False
+        return self._connection.execute(
+            "SELECT 1 FROM digests WHERE digest = ? AND source IS NOT ?", (digest, source)
+        ).fetchone() is not None
+
+    def add(self, text: str, source: Optional[str] = None) -> bool:
+        """Добавляет текст. Возвращает False, если он уже был в индексе."""
+        digest = text_digest(text)
+        cursor = self._connection.execute(
+            "INSERT OR IGNORE INTO digests (digest, source) VALUES (?, ?)", (digest, source)
+        )
+        if cursor.rowcount == 0:
+            return False
+        self._bloom.add(digest)
+        self.count += 1
+        self._pending += 1
+        if self._pending >= self.commit_every:
+            self.commit()
+        return True
+
+    def discard(self, text: str) -> None:
+        """Удаляет текст из индекса. Бит фильтра Блума остается, но точная проверка по SQLite его отсечет."""
+        cursor = self._connection.execute("DELETE FROM digests WHERE digest = ?", (text_digest(text),))
+        self.count -= cursor.rowcount
+        self._pending += 1
+
+    def clear(self) -> None:
+        self._connection.execute("DELETE FROM digests")
+        self._connection.commit()
+        self.count = 0
+        self._bloom = BloomFilter(self._capacity)
+
+    def commit(self) -> None:
+        self._connection.commit()
+        self._pending = 0
+
+    def close(self) -> None:
+        self.commit()
+        self._connection.close()
+
+    def __enter__(self) -> "GlobalTextIndex":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+
+def dataset_source(file_name: str) -> str:
+    """
+    Источник текстов датасета - имя входного файла без расширений:
+    "Спорт.jsonl.gz" и "Спорт_processed_1a2b3c4d.jsonl" дают "Спорт".
+    """
+    base_name = os.path.basename(file_name).removesuffix(".gz").removesuffix(".zst")
+    base_name = os.path.splitext(base_name)[0]
+    return re.sub(r"_processed_[0-9a-f]{8}$", "", base_name)
+
+
+def open_global_index(kind: str) -> GlobalTextIndex:
+    return GlobalTextIndex(os.path.join(CACHE_DIR, "text_index", f"{kind}.sqlite"))
@@ -0,0 +1,266 @@
+import fnmatch
+import hashlib
+import os
+import shutil
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, NamedTuple, Optional
+
+from huggingface_hub import CommitOperationAdd, CommitOperationDelete, HfApi
+from huggingface_hub.hf_api import RepoFile
+
+from entrypoint.config import CACHE_DIR
+
+# Служебные файлы пайплайна, которые не нужны в датасете на hub:
+# журналы и временные файлы, строки, отклоненные до синтеза и при QC, отчет QC
+DEFAULT_EXCLUDE = [
+    "*.tmp", "*.progress", ".*", "_*.json",
+    "*.rejected.jsonl", "*_qc_rejected.jsonl", "qc_report.jsonl",
+]
+# Файлы, которые создает сам hub: --delete-missing их не трогает
+KEEP_ON_HUB = {".gitattributes", "README.md"}
+
+
+class UploadItem(NamedTuple):
+    local_path: str
+    path_in_repo: str
+    sha256: str
+
+
+class UploadPlan(NamedTuple):
+    to_upload: list[UploadItem]
+    to_delete: list[str]
+    unchanged: int
+
+
+def _file_sha256(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def git_blob_sha1(file_path: str) -> str:
+    """Хеш git blob: так hub идентифицирует файлы, не хранящиеся в LFS"""
+    digest = hashlib.sha1(f"blob {os.path.getsize(file_path)}\0".encode())
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class UploadLedger:
+    """
+    Журнал загрузок в SQLite: какие файлы с каким sha256 уже лежат в каждом репозитории.
+    Заодно кэширует sha256 локальных файлов по (путь, размер, mtime), чтобы не хешировать
+    десятки тысяч неизмененных клипов при каждом запуске.
+    """
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS uploaded ("
+            "repo_id TEXT NOT NULL, path_in_repo TEXT NOT NULL, sha256 TEXT NOT NULL, uploaded_at REAL NOT NULL, "
+            "PRIMARY KEY (repo_id, path_in_repo))"
+        )
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS file_hashes ("
+            "path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, sha256 TEXT NOT NULL)"
+        )
+        self._connection.commit()
+
+    def uploaded(self, repo_id: str) -> dict[str, str]:
+        return dict(self._connection.execute(
+            "SELECT path_in_repo, sha256 FROM uploaded WHERE repo_id = ?", (repo_id,)
+        ))
+
+    def record_uploaded(self, repo_id: str, items: Iterable[UploadItem]) -> None:
+        now = time.time()
+        self._connection.executemany(
+            "INSERT OR REPLACE INTO uploaded (repo_id, path_in_repo, sha256, uploaded_at) VALUES (?, ?, ?, ?)",
+            ((repo_id, item.path_in_repo, item.sha256, now) for item in items),
+        )
+        self._connection.commit()
+
+    def record_deleted(self, repo_id: str, paths_in_repo: Iterable[str]) -> None:
+        self._connection.executemany(
+            "DELETE FROM uploaded WHERE repo_id = ? AND path_in_repo = ?",
+            ((repo_id, path_in_repo) for path_in_repo in paths_in_repo),
+        )
+        self._connection.commit()
+
+    def replace_uploaded(self, repo_id: str, files: dict[str, str]) -> None:
+        """Заменяет записи репозитория фактическим списком файлов на hub"""
+        self._connection.execute("DELETE FROM uploaded WHERE repo_id = ?", (repo_id,))
+        self.record_uploaded(repo_id, (UploadItem("", path, sha256) for path, sha256 in files.items()))
+
+    def local_hashes(self, file_paths: list[str], workers: int) -> dict[str, str]:
+        """sha256 локальных файлов; пересчитываются только новые и измененные"""
+        stats = {path: os.stat(path) for path in file_paths}
+        hashes = {}
+        to_hash = []
+        for path in file_paths:
+            row = self._connection.execute(
+                "SELECT size, mtime_ns, sha256 FROM file_hashes WHERE path = ?", (path,)
+            ).fetchone()
+            if row is not None and row[0] == stats[path].st_size and row[1] == stats[path].st_mtime_ns:
+                hashes[path] = row[2]
+            else:
+                to_hash.append(path)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            fresh = dict(zip(to_hash, executor.map(_file_sha256, to_hash)))
+        self._connection.executemany(
+            "INSERT OR REPLACE INTO file_hashes (path, size, mtime_ns, sha256) VALUES (?, ?, ?, ?)",
+            ((path, stats[path].st_size, stats[path].st_mtime_ns, sha256) for path, sha256 in fresh.items()),
+        )
+        self._connection.commit()
+        return {**hashes, **fresh}
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def __enter__(self) -> "UploadLedger":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+
+def open_upload_ledger() -> UploadLedger:
+    return UploadLedger(os.path.join(CACHE_DIR, "upload_ledger.sqlite"))
+
+
+class HubBackend(ABC):
+    """Хранилище датасета: репозиторий на hub или его локальная замена"""
+
+    repo_id: str
+
+    @abstractmethod
+    def list_files(self) -> dict[str, str]:
+        """Файлы хранилища: путь -> sha256 (или git blob sha1, если sha256 неизвестен)"""
+        pass
+
+    @abstractmethod
+    def push(self, items: list[UploadItem], deletions: list[str], message: str, workers: int) -> None:
+        """Атомарно (одним коммитом, если хранилище это умеет) загружает и удаляет файлы"""
+        pass
+
+
+class HfHubBackend(HubBackend):
+    def __init__(self, api: HfApi, repo_id: str):
+        self.api = api
+        self.repo_id = repo_id
+
+    def list_files(self) -> dict[str, str]:
+        files = {}
+        for entry in self.api.list_repo_tree(self.repo_id, repo_type="dataset", recursive=True):
+            if isinstance(entry, RepoFile):
+                files[entry.path] = entry.lfs.sha256 if entry.lfs is not None else entry.blob_id
+        return files
+
+    def push(self, items: list[UploadItem], deletions: list[str], message: str, workers: int) -> None:
+        operations = [
+            CommitOperationAdd(path_in_repo=item.path_in_repo, path_or_fileobj=item.local_path) for item in items
+        ] + [CommitOperationDelete(path_in_repo=path_in_repo) for path_in_repo in deletions]
+        # Содержимое LFS файлов загружается параллельно в workers потоков, затем один коммит
+        self.api.create_commit(
+            repo_id=self.repo_id,
+            repo_type="dataset",
+            operations=operations,
+            commit_message=message,
+            num_threads=workers,
+        )
+
+
+class LocalHubBackend(HubBackend):
+    """Локальная папка вместо hub: для проверки загрузки без сети и токена"""
+
+    def __init__(self, root: str):
+        self.root = root
+        self.repo_id = f"local:{os.path.abspath(root)}"
+        os.makedirs(root, exist_ok=True)
+
+    def list_files(self) -> dict[str, str]:
+        files = {}
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                file_path = os.path.join(directory, name)
+                files[os.path.relpath(file_path, self.root).replace(os.sep, "/")] = _file_sha256(file_path)
+        return files
+
+    def _copy(self, item: UploadItem) -> None:
+        target_path = os.path.join(self.root, item.path_in_repo)
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        shutil.copyfile(item.local_path, f"{target_path}.tmp")
+        os.replace(f"{target_path}.tmp", target_path)
+
+    def push(self, items: list[UploadItem], deletions: list[str], message: str, workers: int) -> None:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(self._copy, items))
+        for path_in_repo in deletions:
+            target_path = os.path.join(self.root, path_in_repo)
+            if os.path.exists(target_path):
+                os.remove(target_path)
+
+
+def list_local_files(folder_path: str, exclude: list[str]) -> dict[str, str]:
+    """Файлы папки для загрузки: путь в репозитории -> локальный путь"""
+    files = {}
+    for directory, directory_names, names in os.walk(folder_path):
+        directory_names[:] = [name for name in directory_names if not name.startswith(".")]
+        for name in names:
+            if any(fnmatch.fnmatch(name, pattern) for pattern in exclude):
+                continue
+            local_path = os.path.join(directory, name)
+            files[os.path.relpath(local_path, folder_path).replace(os.sep, "/")] = local_path
+    return files
+
+
+def plan_upload(
+    local_files: dict[str, str],
+    local_hashes: dict[str, str],
+    remote_files: dict[str, str],
+    delete_missing: bool = False,
+) -> UploadPlan:
+    """
+    Сравнивает локальные файлы с загруженными: загружать нужно новые и измененные.
+    remote_files - последняя успешная загрузка из журнала или листинг hub;
+    если для файла на hub известен только git sha1, он считается локально.
+    """
+    to_upload = []
+    unchanged = 0
+    for path_in_repo, local_path in sorted(local_files.items()):
+        sha256 = local_hashes[local_path]
+        remote_hash: Optional[str] = remote_files.get(path_in_repo)
+        if remote_hash is not None and remote_hash in (sha256, _git_sha1_if_needed(local_path, remote_hash)):
+            unchanged += 1
+            continue
+        to_upload.append(UploadItem(local_path, path_in_repo, sha256))
+    to_delete = sorted(
+        path for path in set(remote_files) - set(local_files) if os.path.basename(path) not in KEEP_ON_HUB
+    ) if delete_missing else []
+    return UploadPlan(to_upload, to_delete, unchanged)
+
+
+def _git_sha1_if_needed(local_path: str, remote_hash: str) -> Optional[str]:
+    # sha1 - 40 символов, sha256 - 64: считаем git sha1 только для сравнения с ним
+    return git_blob_sha1(local_path) if len(remote_hash) == 40 else None
+
+
+def batch_items(items: list[UploadItem], max_files: int, max_bytes: int) -> Iterable[list[UploadItem]]:
+    """Делит загрузку на коммиты ограниченного размера: каждый коммит - точка возобновления"""
+    batch: list[UploadItem] = []
+    batch_bytes = 0
+    for item in items:
+        size = os.path.getsize(item.local_path)
+        if batch and (len(batch) >= max_files or batch_bytes + size > max_bytes):
+            yield batch
+            batch, batch_bytes = [], 0
+        batch.append(item)
+        batch_bytes += size
+    if batch:
+        yield batch
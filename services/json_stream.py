@@ -0,0 +1,55 @@
+from typing import Optional
+
+
+class JsonArrayItemParser:
+    """
+    Инкрементальный разбор JSON ответа LLM: отдает текст каждого объекта-элемента массива,
+    как только объект закрыт. Подходит и для {"pairs": [{...}, ...]}, и для [{...}, ...];
+    текст вокруг JSON (```json, пояснения модели) пропускается.
+    Незакрытый хвост обрезанного ответа не отдается, а все завершенные элементы до него сохраняются.
+    """
+
+    def __init__(self):
+        self._stack: list[str] = []
+        self._in_string = False
+        self._escaped = False
+        # Глубина стека, на которой открыт текущий элемент массива
+        self._item_depth: Optional[int] = None
+        self._item_parts: list[str] = []
+
+    @property
+    def truncated(self) -> bool:
+        """Ответ оборвался внутри JSON (например, на лимите токенов)"""
+        return bool(self._stack)
+
+    def feed(self, chunk: str) -> list[str]:
+        items = []
+        item_start = 0 if self._item_depth is not None else None
+        for index, char in enumerate(chunk):
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+            if char == '"':
+                # Кавычки в тексте до JSON не открывают строку
+                self._in_string = bool(self._stack)
+            elif char in "{[":
+                if char == "{" and self._item_depth is None and self._stack and self._stack[-1] == "[":
+                    self._item_depth = len(self._stack)
+                    item_start = index
+                self._stack.append(char)
+            elif char in "}]" and self._stack:
+                self._stack.pop()
+                if self._item_depth is not None and len(self._stack) == self._item_depth:
+                    self._item_parts.append(chunk[item_start:index + 1])
+                    items.append("".join(self._item_parts))
+                    self._item_parts = []
+                    self._item_depth = None
+                    item_start = None
+        if item_start is not None:
+            self._item_parts.append(chunk[item_start:])
+        return items
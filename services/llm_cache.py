@@ -0,0 +1,229 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Optional
+
+from pydantic import ValidationError
+
+from models.base_llm_client import BaseLLMClient, LLMClientWrapper, response_schema
+
+
+def make_cache_key(
+    provider: str,
+    model_name: str,
+    messages: list[dict[str, str]],
+    temperature: float,
+    response_format: Any,
+) -> str:
+    payload = json.dumps(
+        {
+            "provider": provider,
+            "model": model_name,
+            "messages": messages,
+            "temperature": temperature,
+            "schema": response_schema(response_format),
+        },
+        ensure_ascii=False,
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    Хранилище ответов LLM в SQLite с вытеснением по размеру (LRU).
+    Безопасно для использования из нескольких потоков.
+    Время последнего обращения при попаданиях копится в памяти и пишется пачкой
+    (каждые ACCESS_FLUSH_EVERY попаданий, при записи и при закрытии), чтобы чтение
+    из кэша на общем цикле событий не ждало коммита SQLite.
+    """
+
+    ACCESS_FLUSH_EVERY = 256
+
+    def __init__(self, path: str, max_size_bytes: int):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.max_size_bytes = max_size_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._pending_access: dict[str, float] = {}
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)"
+        )
+        self._connection.commit()
+        self._total_size = self._connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()[0]
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT value FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._pending_access[key] = time.time()
+            if len(self._pending_access) >= self.ACCESS_FLUSH_EVERY:
+                self._flush_access()
+                self._connection.commit()
+            self.hits += 1
+            return row[0]
+
+    def _flush_access(self) -> None:
+        if self._pending_access:
+            self._connection.executemany(
+                "UPDATE responses SET last_access = ? WHERE key = ?",
+                [(last_access, key) for key, last_access in self._pending_access.items()],
+            )
+            self._pending_access.clear()
+
+    def put(self, key: str, value: str) -> None:
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            previous = self._connection.execute(
+                "SELECT size FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if previous is not None:
+                self._total_size -= previous[0]
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, size, time.time()),
+            )
+            self._total_size += size
+            # Перед вытеснением порядок LRU должен учитывать все попадания
+            self._flush_access()
+            self._evict()
+            self._connection.commit()
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT size FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return
+            self._connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._pending_access.pop(key, None)
+            self._total_size -= row[0]
+            self._connection.commit()
+
+    def _evict(self) -> None:
+        # Удаляем самые давно использованные записи, пока не уложимся в лимит
+        while self._total_size > self.max_size_bytes:
+            oldest = self._connection.execute(
+                "SELECT key, size FROM responses ORDER BY last_access LIMIT 64"
+            ).fetchall()
+            if not oldest:
+                break
+            for key, size in oldest:
+                if self._total_size <= self.max_size_bytes:
+                    break
+                self._connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._total_size -= size
+                self.evictions += 1
+
+    def stats_line(self) -> str:
+        total = self.hits + self.misses
+        hit_rate = self.hits / total * 100 if total else 0.0
+        return (
+            f"Кэш LLM: попаданий {self.hits}, промахов {self.misses} ({hit_rate:.1f}%), "
+            f"вытеснено {self.evictions}, размер {self._total_size / 1024 ** 2:.1f} МБ"
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush_access()
+            self._connection.commit()
+            self._connection.close()
+
+
+def _is_valid(response: str, response_format: Any) -> bool:
+    """Ответ соответствует pydantic схеме запроса; ответы без схемы не проверяются"""
+    if not hasattr(response_format, "model_validate_json"):
+        return True
+    try:
+        response_format.model_validate_json(response)
+    except ValidationError:
+        return False
+    return True
+
+
+class CachedLLMClient(LLMClientWrapper):
+    """
+    Обертка над LLM клиентом, возвращающая сохраненный ответ на идентичный запрос.
+    Ответ, не прошедший проверку схемы, не сохраняется: иначе повторный запуск
+    получал бы тот же битый ответ вместо нового запроса к модели.
+    """
+
+    def __init__(self, client: BaseLLMClient, provider: str, cache: LLMResponseCache):
+        super().__init__(client)
+        self.provider = provider
+        self.cache = cache
+
+    async def achat(self,
+                    messages: list[dict[str, str]],
+                    temperature: float = 0.7,
+                    response_format: Any = None) -> str:
+        key = make_cache_key(self.provider, self.model_name, messages, temperature, response_format)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        response = await self.client.achat(messages, temperature=temperature, response_format=response_format)
+        if _is_valid(response, response_format):
+            self.cache.put(key, response)
+        return response
+
+    async def astream(self,
+                      messages: list[dict[str, str]],
+                      temperature: float = 0.7,
+                      response_format: Any = None) -> AsyncIterator[str]:
+        key = make_cache_key(self.provider, self.model_name, messages, temperature, response_format)
+        cached = self.cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+        parts = []
+        async with aclosing(self.client.astream(messages, temperature=temperature,
+                                                response_format=response_format)) as chunks:
+            async for chunk in chunks:
+                parts.append(chunk)
+                yield chunk
+        # Сюда доходит только дочитанный поток: оборванный ответ не кэшируется
+        response = "".join(parts)
+        if _is_valid(response, response_format):
+            self.cache.put(key, response)
+
+    def discard(self,
+                messages: list[dict[str, str]],
+                temperature: float = 0.7,
+                response_format: Any = None) -> None:
+        self.cache.discard(make_cache_key(self.provider, self.model_name, messages, temperature, response_format))
+
+
+def discard_cached_response(client: BaseLLMClient,
+                            messages: list[dict[str, str]],
+                            temperature: float = 0.7,
+                            response_format: Any = None) -> None:
+    """
+    Удаляет из кэша ответ, который прошел проверку схемы, но отвергнут вызывающим кодом
+    (например, модель вернула не то число строк). Клиент без кэша не меняется.
+    """
+    while isinstance(client, LLMClientWrapper):
+        if isinstance(client, CachedLLMClient):
+            client.discard(messages, temperature=temperature, response_format=response_format)
+        client = client.client
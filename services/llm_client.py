@@ -1,21 +1,107 @@
-from entrypoint.config import GEMINI_TOKEN, OPENROUTER_TOKEN
-from models.base_llm_client import BaseLLMClient
+import os
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Optional
+
+from entrypoint.config import GEMINI_TOKEN, OPENROUTER_TOKEN, CACHE_DIR, LLM_CACHE_MAX_BYTES
+from models.base_llm_client import BaseLLMClient, LLMClientWrapper, estimate_tokens
 from models.deep_seek_client import DeepSeekClient
 from models.gemini_client import GeminiClient
 from models.llm_provider import LLMProvider
+from models.mock_client import MockLLMClient
 from models.ollama_client import OllamaClient
 from models.openrouter_client import OpenRouterClient
+from services.llm_cache import CachedLLMClient, LLMResponseCache
+from services.rate_limiter import RateLimiter, RateLimits, get_rate_limiter
+
+# Квоты провайдеров и пределы адаптивной параллельности.
+# Локальная Ollama упирается в GPU, облачные API - в квоты.
+PROVIDER_RATE_LIMITS = {
+    LLMProvider.OLLAMA: RateLimits(initial_concurrency=2, max_concurrency=4),
+    LLMProvider.DEEPSEEK: RateLimits(requests_per_minute=600, initial_concurrency=8, max_concurrency=64),
+    LLMProvider.GEMINI: RateLimits(
+        requests_per_minute=1000, tokens_per_minute=1_000_000, initial_concurrency=8, max_concurrency=64
+    ),
+    LLMProvider.OPENROUTER: RateLimits(requests_per_minute=600, initial_concurrency=8, max_concurrency=64),
+    LLMProvider.MOCK: RateLimits(initial_concurrency=1000, max_concurrency=1000, max_retries=0),
+}
+
+
+class RateLimitedClient(LLMClientWrapper):
+    """Обертка, пропускающая запросы через общий лимитер провайдера: квоты, AIMD и повторы"""
+
+    def __init__(self, client: BaseLLMClient, limiter: RateLimiter):
+        super().__init__(client)
+        self.limiter = limiter
+
+    async def achat(self,
+                    messages: list[dict[str, str]],
+                    temperature: float = 0.7,
+                    response_format: Any = None) -> str:
+        tokens = sum(estimate_tokens(message["content"]) for message in messages)
+        return await self.limiter.run(
+            lambda: self.client.achat(messages, temperature=temperature, response_format=response_format),
+            tokens=tokens,
+        )
+
+    async def astream(self,
+                      messages: list[dict[str, str]],
+                      temperature: float = 0.7,
+                      response_format: Any = None) -> AsyncIterator[str]:
+        tokens = sum(estimate_tokens(message["content"]) for message in messages)
+        async with aclosing(self.limiter.stream(
+            lambda: self.client.astream(messages, temperature=temperature, response_format=response_format),
+            tokens=tokens,
+        )) as chunks:
+            async for chunk in chunks:
+                yield chunk
+
+
+def client_stats_lines(client: BaseLLMClient) -> list[str]:
+    """Статистика кэша и лимитера по всей цепочке оберток клиента"""
+    lines = []
+    while isinstance(client, LLMClientWrapper):
+        if isinstance(client, CachedLLMClient):
+            lines.append(client.cache.stats_line())
+        elif isinstance(client, RateLimitedClient):
+            lines.append(client.limiter.stats_line())
+        client = client.client
+    return lines
 
 
 # Фабрика для создания клиентов
-def create_llm_client(provider: LLMProvider, **kwargs) -> BaseLLMClient:
+def create_llm_client(
+    provider: LLMProvider, cache: bool = False, max_concurrency: Optional[int] = None, **kwargs
+) -> BaseLLMClient:
     """
-    Создает LLM клиент в зависимости от провайдера
+    Создает LLM клиент в зависимости от провайдера.
+    Запросы идут через общий лимитер провайдера (PROVIDER_RATE_LIMITS).
 
     Args:
         provider: Тип провайдера (ollama, deepseek, gemini, openai)
+        cache: Сохранять ответы на диск и переиспользовать их для идентичных запросов
+        max_concurrency: Предел одновременных запросов, заданный пользователем
+            (--max-in-flight, --parallel-topics); заменяет предел из PROVIDER_RATE_LIMITS
         **kwargs: Параметры для инициализации клиента
     """
+    provider_client = _create_provider_client(provider, **kwargs)
+    limits = PROVIDER_RATE_LIMITS[provider]
+    if max_concurrency is not None:
+        limits = limits._replace(
+            initial_concurrency=min(limits.initial_concurrency, max_concurrency), max_concurrency=max_concurrency
+        )
+    limiter = get_rate_limiter(f"llm:{provider.value}", limits)
+    client = RateLimitedClient(provider_client, limiter)
+    if cache:
+        # Попадания в кэш не тратят квоту провайдера
+        response_cache = LLMResponseCache(
+            os.path.join(CACHE_DIR, "llm_responses.sqlite"), LLM_CACHE_MAX_BYTES
+        )
+        client = CachedLLMClient(client, provider.value, response_cache)
+    return client
+
+
+def _create_provider_client(provider: LLMProvider, **kwargs) -> BaseLLMClient:
+    """Создает клиент конкретного провайдера без оберток"""
     if provider == LLMProvider.OLLAMA:
         return OllamaClient(
             model_name=kwargs.get("model_name", "qwen3:30b-a3b")
@@ -35,5 +121,10 @@ def create_llm_client(provider: LLMProvider, **kwargs) -> BaseLLMClient:
             api_key=OPENROUTER_TOKEN,
             model_name=kwargs.get("model_name", "openai/gpt-4.1")
         )
+    elif provider == LLMProvider.MOCK:
+        return MockLLMClient(
+            model_name=kwargs.get("model_name") or "mock",
+            latency=kwargs.get("latency", 0.05),
+        )
     else:
         raise ValueError(f"Неподдерживаемый провайдер: {provider}")
@@ -0,0 +1,221 @@
+import glob
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, NamedTuple, Optional
+
+import pandas as pd
+
+from models.row import HfRow
+from services.duration_index import DurationCache, scan_durations
+from services.phonemes import MAX_PHONEMES, estimate_phonemes
+
+MANIFEST_STATE_FILE = "_state.json"
+# После стольких частей build сливает их в одну, чтобы чтение не замедлялось
+COMPACT_AFTER_PARTS = 32
+
+MANIFEST_COLUMNS = [
+    "id", "text", "source", "file_name", "style", "voice",
+    "metadata_path", "audio_path", "audio_size",
+    "duration", "sample_rate", "char_count", "phoneme_count",
+    "text_hash", "audio_hash",
+]
+
+# Требования к аудио на выходе (см. README)
+MIN_DURATION = 0.8
+MAX_DURATION = 45.0
+
+
+class BuildResult(NamedTuple):
+    added: int
+    failed: list[tuple[str, str]]
+    total: int
+
+
+def _file_sha256(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _load_state(manifest_path: str) -> dict[str, Any]:
+    state_path = os.path.join(manifest_path, MANIFEST_STATE_FILE)
+    if not os.path.exists(state_path):
+        return {"offsets": {}, "tails": {}, "next_part": 0}
+    with open(state_path, encoding="utf-8") as state_file:
+        state = json.load(state_file)
+    state.setdefault("tails", {})
+    return state
+
+
+def _save_state(manifest_path: str, state: dict[str, Any]) -> None:
+    state_path = os.path.join(manifest_path, MANIFEST_STATE_FILE)
+    tmp_path = f"{state_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as state_file:
+        json.dump(state, state_file, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, state_path)
+
+
+def _part_paths(manifest_path: str) -> list[str]:
+    return sorted(glob.glob(os.path.join(manifest_path, "part-*.parquet")))
+
+
+def _write_part(manifest_path: str, state: dict[str, Any], frame: pd.DataFrame) -> None:
+    part_name = f"part-{state['next_part']:05d}.parquet"
+    # Файлы с точкой в начале pyarrow не читает, поэтому недописанная часть не видна
+    tmp_path = os.path.join(manifest_path, f".{part_name}.tmp")
+    frame.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, os.path.join(manifest_path, part_name))
+    state["next_part"] += 1
+
+
+def _tail_digest(metadata_path: str, offset: int) -> str:
+    """Хеш последних байт перед offset: меняется, если уже прочитанная часть файла переписана"""
+    with open(metadata_path, "rb") as metadata_file:
+        start = max(0, offset - 4096)
+        metadata_file.seek(start)
+        return hashlib.sha256(metadata_file.read(offset - start)).hexdigest()
+
+
+def _read_new_rows(metadata_path: str, offset: int) -> tuple[list[HfRow], int]:
+    """
+    Читает строки metadata.jsonl начиная с offset. Недописанная последняя строка
+    (файл прямо сейчас пополняется синтезом) остается до следующей сборки.
+    """
+    rows = []
+    with open(metadata_path, "rb") as metadata_file:
+        metadata_file.seek(offset)
+        for line in metadata_file:
+            if not line.endswith(b"\n"):
+                break
+            offset += len(line)
+            if line.strip():
+                rows.append(HfRow.model_validate_json(line))
+    return rows, offset
+
+
+def build_manifest(
+    input_path: str,
+    manifest_path: str,
+    duration_cache: DurationCache,
+    workers: int = 16,
+    full: bool = False,
+) -> BuildResult:
+    """
+    Дописывает в манифест строки metadata.jsonl, появившиеся после прошлой сборки.
+    Манифест - папка с частями part-NNNNN.parquet: каждая сборка добавляет одну часть.
+    """
+    os.makedirs(manifest_path, exist_ok=True)
+    if full:
+        for part_path in _part_paths(manifest_path):
+            os.remove(part_path)
+        state = {"offsets": {}, "tails": {}, "next_part": 0}
+    else:
+        state = _load_state(manifest_path)
+
+    new_rows: list[tuple[str, HfRow]] = []
+    new_offsets = {}
+    for metadata_path in sorted(glob.glob(os.path.join(input_path, "**", "metadata.jsonl"), recursive=True)):
+        metadata_path = os.path.abspath(metadata_path)
+        offset = state["offsets"].get(metadata_path, 0)
+        expected_tail = state["tails"].get(metadata_path)
+        if os.path.getsize(metadata_path) < offset or (
+                expected_tail is not None and _tail_digest(metadata_path, offset) != expected_tail):
+            raise ValueError(
+                f"{metadata_path} переписан после прошлой сборки манифеста: пересоберите его с --full"
+            )
+        rows, new_offsets[metadata_path] = _read_new_rows(metadata_path, offset)
+        new_rows.extend((metadata_path, row) for row in rows)
+
+    audio_paths = [
+        os.path.normpath(os.path.join(os.path.dirname(metadata_path), row.file_name))
+        for metadata_path, row in new_rows
+    ]
+    existing = [path for path in audio_paths if os.path.exists(path)]
+    scan = scan_durations(existing, duration_cache, workers)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        audio_hashes = dict(zip(existing, executor.map(_file_sha256, existing)))
+
+    records = []
+    failed = [(path, str(error)) for path, error in scan.failed]
+    for (metadata_path, row), audio_path in zip(new_rows, audio_paths):
+        info = scan.infos.get(audio_path)
+        if info is None:
+            if audio_path not in existing:
+                failed.append((audio_path, "файл не найден"))
+            continue
+        records.append({
+            **row.model_dump(),
+            "metadata_path": metadata_path,
+            "audio_path": audio_path,
+            "audio_size": os.path.getsize(audio_path),
+            "duration": info.duration,
+            "sample_rate": info.sample_rate,
+            "char_count": len(row.text),
+            "phoneme_count": estimate_phonemes(row.text),
+            "text_hash": hashlib.sha256(row.text.strip().encode("utf-8")).hexdigest(),
+            "audio_hash": audio_hashes[audio_path],
+        })
+
+    if records:
+        _write_part(manifest_path, state, pd.DataFrame.from_records(records, columns=MANIFEST_COLUMNS))
+    # Смещения сохраняются только после записи части: прерванная сборка просто повторится
+    state["offsets"].update(new_offsets)
+    state["tails"].update(
+        (metadata_path, _tail_digest(metadata_path, offset)) for metadata_path, offset in new_offsets.items()
+    )
+    _save_state(manifest_path, state)
+
+    if len(_part_paths(manifest_path)) > COMPACT_AFTER_PARTS:
+        compact_manifest(manifest_path)
+    return BuildResult(len(records), failed, len(load_manifest(manifest_path, columns=["id"])))
+
+
+def compact_manifest(manifest_path: str) -> None:
+    """Сливает все части манифеста в одну"""
+    part_paths = _part_paths(manifest_path)
+    if len(part_paths) <= 1:
+        return
+    state = _load_state(manifest_path)
+    _write_part(manifest_path, state, load_manifest(manifest_path))
+    _save_state(manifest_path, state)
+    for part_path in part_paths:
+        os.remove(part_path)
+
+
+def load_manifest(
+    manifest_path: str,
+    columns: Optional[list[str]] = None,
+    filters: Optional[list[tuple]] = None,
+) -> pd.DataFrame:
+    """
+    Читает манифест. columns и filters передаются в pyarrow,
+    например filters=[("voice", "==", "Ana"), ("duration", ">", 45)].
+    """
+    if not _part_paths(manifest_path):
+        return pd.DataFrame(columns=columns or MANIFEST_COLUMNS)
+    # Служебные _state.json и .tmp файлы pyarrow пропускает сам
+    return pd.read_parquet(manifest_path, columns=columns, filters=filters)
+
+
+def hours_by(manifest: pd.DataFrame, field: str) -> pd.Series:
+    """Часы аудио в разрезе поля (voice, source, style), по убыванию"""
+    return (manifest.groupby(field)["duration"].sum() / 3600).sort_values(ascending=False)
+
+
+def out_of_bounds(
+    manifest: pd.DataFrame,
+    min_duration: float = MIN_DURATION,
+    max_duration: float = MAX_DURATION,
+    max_phonemes: int = MAX_PHONEMES,
+) -> pd.DataFrame:
+    """Клипы, нарушающие требования к длительности или длине фонем"""
+    mask = (
+        (manifest["duration"] < min_duration)
+        | (manifest["duration"] > max_duration)
+        | (manifest["phoneme_count"] > max_phonemes)
+    )
+    return manifest[mask]
@@ -0,0 +1,92 @@
+import re
+import zlib
+from typing import Optional
+
+import numpy as np
+
+# Простое число Мерсенна 2^61 - 1 для универсального хеширования
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64(0xFFFFFFFF)
+
+
+def normalize_for_shingles(text: str) -> str:
+    """Убирает регистр, пунктуацию и лишние пробелы: такие различия не важны для озвучки"""
+    text = re.sub(r"[^\w\s]", " ", text.lower().replace("ё", "е"))
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _choose_bands(num_perm: int, threshold: float) -> tuple[int, int]:
+    """
+    Подбирает число полос b и строк в полосе r (b * r = num_perm).
+    Порог срабатывания LSH (1/b)^(1/r) берется наибольшим, но не выше threshold:
+    лишние кандидаты отсеет точная проверка по сигнатуре, а пропущенные дубли уже не найти.
+    """
+    options = [(num_perm // rows, rows) for rows in range(1, num_perm + 1) if num_perm % rows == 0]
+    below = [option for option in options if (1 / option[0]) ** (1 / option[1]) <= threshold]
+    if not below:
+        return options[0]
+    return max(below, key=lambda option: (1 / option[0]) ** (1 / option[1]))
+
+
+class NearDuplicateIndex:
+    """
+    Индекс near-дубликатов на MinHash + LSH.
+    Каждый текст сравнивается только с кандидатами из совпавших LSH-корзин,
+    поэтому стоимость проверки почти не зависит от размера индекса.
+    """
+
+    def __init__(self, threshold: float = 0.85, num_perm: int = 64, shingle_size: int = 5, seed: int = 1):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.bands, self.rows = _choose_bands(num_perm, threshold)
+        generator = np.random.RandomState(seed)
+        self._a = generator.randint(1, np.iinfo(np.int64).max, size=num_perm, dtype=np.int64).astype(np.uint64)
+        self._b = generator.randint(0, np.iinfo(np.int64).max, size=num_perm, dtype=np.int64).astype(np.uint64)
+        self._buckets: list[dict[bytes, list[int]]] = [{} for _ in range(self.bands)]
+        self._signatures: list[np.ndarray] = []
+
+    def _shingle_hashes(self, text: str) -> np.ndarray:
+        text = normalize_for_shingles(text)
+        if len(text) <= self.shingle_size:
+            shingles = {text}
+        else:
+            shingles = {text[i:i + self.shingle_size] for i in range(len(text) - self.shingle_size + 1)}
+        return np.fromiter(
+            (zlib.crc32(shingle.encode("utf-8")) for shingle in shingles), dtype=np.uint64, count=len(shingles)
+        )
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = self._shingle_hashes(text)
+        # (a * h + b) mod p для всех перестановок и шинглов сразу, затем минимум по шинглам
+        with np.errstate(over="ignore"):
+            permuted = (np.outer(hashes, self._a) + self._b) % _MERSENNE_PRIME & _MAX_HASH
+        return permuted.min(axis=0).astype(np.uint32)
+
+    def _band_keys(self, signature: np.ndarray) -> list[bytes]:
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+    def find_duplicate(self, signature: np.ndarray, band_keys: list[bytes]) -> Optional[int]:
+        """Возвращает номер похожего текста в индексе или None"""
+        checked = set()
+        for bucket, key in zip(self._buckets, band_keys):
+            for candidate in bucket.get(key, ()):
+                if candidate in checked:
+                    continue
+                checked.add(candidate)
+                similarity = np.count_nonzero(self._signatures[candidate] == signature) / self.num_perm
+                if similarity >= self.threshold:
+                    return candidate
+        return None
+
+    def add_if_unique(self, text: str) -> bool:
+        """Добавляет текст в индекс. Возвращает False, если похожий текст уже был."""
+        signature = self.signature(text)
+        band_keys = self._band_keys(signature)
+        if self.find_duplicate(signature, band_keys) is not None:
+            return False
+        index = len(self._signatures)
+        self._signatures.append(signature)
+        for bucket, key in zip(self._buckets, band_keys):
+            bucket.setdefault(key, []).append(index)
+        return True
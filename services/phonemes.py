@@ -0,0 +1,31 @@
+import re
+
+# Лимит длины фонемной последовательности модели: Assert Len(Phonemes) <= 510
+MAX_PHONEMES = 510
+
+_VOWELS = set("аеёиоуыэюя")
+_IOTATED = set("еёюя")
+_SILENT = set("ьъ")
+_PUNCTUATION = set(".,!?:;…—-\"«»()")
+_SPACES = re.compile(r"\s+")
+
+
+def estimate_phonemes(text: str) -> int:
+    """
+    Оценивает длину фонемной последовательности русского текста без фонемайзера.
+    Орфография почти фонетическая: буква дает фонему, ь/ъ не дают,
+    е/ё/ю/я в начале слова, после гласной или ь/ъ дают две (й + гласная).
+    Пробелы и знаки препинания фонемайзер тоже оставляет в последовательности.
+    """
+    text = _SPACES.sub(" ", text.lower()).strip()
+    count = 0
+    previous = " "
+    for char in text:
+        if char in _SILENT:
+            pass
+        elif char in _IOTATED and (previous in _VOWELS or previous in _SILENT or not previous.isalpha()):
+            count += 2
+        elif char.isalpha() or char == " " or char in _PUNCTUATION:
+            count += 1
+        previous = char
+    return count
@@ -0,0 +1,127 @@
+import json
+import os
+import zlib
+from typing import Iterator, Optional, IO
+
+
+class ProgressJournal:
+    """
+    Append-only журнал обработанных строк входного JSONL файла.
+
+    Каждая запись: "<начальное смещение>\\t<конечное смещение>\\t<id>\\t<crc32 строки>".
+    Входной файл при этом не переписывается: при возобновлении работы
+    чтение начинается со смещения, до которого все строки уже обработаны,
+    а остальные готовые строки пропускаются по своему смещению.
+    Дописывать строки в конец входного файла можно, менять уже записанные - нет.
+    """
+
+    def __init__(self, path: str, group_size: int = 32, sync_with: Optional[list[IO]] = None):
+        self.path = path
+        self.group_size = group_size
+        # Файлы, которые должны оказаться на диске раньше журнала (например, metadata.jsonl)
+        self.sync_with = sync_with or []
+        self.watermark = 0
+        self.done_offsets: set[int] = set()
+        self._pending = 0
+        self._file: Optional[IO] = None
+
+    def load(self, input_file_path: str) -> None:
+        """
+        Читает журнал и вычисляет смещение непрерывно обработанного префикса.
+        Каждая запись сверяется со строкой входного файла по ее смещению,
+        поэтому строки подмененного входного файла не будут молча пропущены.
+        """
+        self.watermark = 0
+        self.done_offsets = set()
+        if not os.path.exists(self.path):
+            return
+
+        spans: dict[int, int] = {}
+        checks: dict[int, tuple[str, Optional[str]]] = {}
+        with open(self.path, "r", encoding="utf-8") as journal_file:
+            for line in journal_file:
+                parts = line.rstrip("\n").split("\t")
+                # Недописанная запись после аварийного завершения.
+                # Записи старого формата (без crc32) сверяются только по id
+                if len(parts) not in (3, 4):
+                    continue
+                start, end = int(parts[0]), int(parts[1])
+                spans[start] = end
+                checks[start] = (parts[2], parts[3] if len(parts) == 4 else None)
+
+        if not _matches_input(input_file_path, spans, checks):
+            raise ValueError(
+                f"Журнал {self.path} не соответствует входному файлу: "
+                f"удалите его, чтобы начать обработку заново"
+            )
+
+        while self.watermark in spans:
+            self.watermark = spans.pop(self.watermark)
+        self.done_offsets = set(spans)
+
+    def iter_pending(self, input_file_path: str) -> Iterator[tuple[int, int, bytes]]:
+        """Лениво отдает (начало, конец, строка) для еще не обработанных строк."""
+        with open(input_file_path, "rb") as input_file:
+            input_file.seek(self.watermark)
+            offset = self.watermark
+            for line in input_file:
+                start, offset = offset, offset + len(line)
+                if start in self.done_offsets or not line.strip():
+                    continue
+                yield start, offset, line
+
+    def record(self, start: int, end: int, row_id: str, line: bytes) -> None:
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write(f"{start}\t{end}\t{row_id}\t{zlib.crc32(line):08x}\n")
+        self._pending += 1
+        if self._pending >= self.group_size:
+            self.sync()
+
+    def sync(self) -> None:
+        if self._file is None or self._pending == 0:
+            return
+        for companion in self.sync_with:
+            companion.flush()
+            os.fsync(companion.fileno())
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending = 0
+
+    def close(self) -> None:
+        self.sync()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self) -> "ProgressJournal":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+
+def _matches_input(
+    input_file_path: str, spans: dict[int, int], checks: dict[int, tuple[str, Optional[str]]]
+) -> bool:
+    """Строки входного файла по журнальным смещениям совпадают с записанными (crc32 или id)"""
+    input_file_size = os.path.getsize(input_file_path)
+    with open(input_file_path, "rb") as input_file:
+        # По возрастанию смещений чтение идет подряд, это один проход по обработанной части
+        for start in sorted(spans):
+            end = spans[start]
+            if end > input_file_size:
+                return False
+            input_file.seek(start)
+            line = input_file.read(end - start)
+            row_id, checksum = checks[start]
+            if checksum is not None:
+                if f"{zlib.crc32(line):08x}" != checksum:
+                    return False
+                continue
+            try:
+                if str(json.loads(line)["id"]) != row_id:
+                    return False
+            except (ValueError, KeyError, TypeError):
+                return False
+    return True
@@ -0,0 +1,309 @@
+import asyncio
+import random
+import threading
+import time
+import weakref
+from typing import AsyncIterator, Awaitable, Callable, NamedTuple, Optional, TypeVar
+
+T = TypeVar("T")
+
+THROTTLED = "throttled"
+TRANSIENT = "transient"
+FATAL = "fatal"
+
+_TRANSIENT_STATUS_CODES = {408, 409, 425, 500, 502, 503, 504, 529}
+_TRANSIENT_ERROR_NAMES = ("Timeout", "Connection", "RemoteProtocol", "ReadError", "ServiceUnavailable")
+
+
+class RateLimits(NamedTuple):
+    # None - без ограничения
+    requests_per_minute: Optional[float] = None
+    tokens_per_minute: Optional[float] = None
+    initial_concurrency: int = 4
+    max_concurrency: int = 16
+    max_retries: int = 6
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    # У SDK разных провайдеров код ответа лежит в разных полях
+    for attribute in ("status_code", "code", "status"):
+        value = getattr(error, attribute, None)
+        if isinstance(value, int):
+            return value
+    response = getattr(error, "response", None)
+    value = getattr(response, "status_code", None)
+    return value if isinstance(value, int) else None
+
+
+def classify_error(error: BaseException) -> str:
+    """Троттлинг (429), временная ошибка (5xx, таймауты, обрывы соединения) или окончательная"""
+    status_code = _status_code(error)
+    if status_code == 429:
+        return THROTTLED
+    if status_code in _TRANSIENT_STATUS_CODES:
+        return TRANSIENT
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return TRANSIENT
+    if status_code is None and any(name in type(error).__name__ for name in _TRANSIENT_ERROR_NAMES):
+        return TRANSIENT
+    return FATAL
+
+
+def _retry_after(error: BaseException) -> Optional[float]:
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_delay(attempt: int, base: float = 1.0, cap: float = 60.0) -> float:
+    """Экспоненциальная задержка с полным джиттером: повторы разных потоков не синхронизируются"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class TokenBucket:
+    """Корзина на capacity единиц в минуту. Резервирует сразу и возвращает, сколько ждать."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self._available = per_minute
+        self._updated = time.monotonic()
+
+    def reserve(self, amount: float) -> float:
+        now = time.monotonic()
+        self._available = min(self.capacity, self._available + (now - self._updated) * self.rate)
+        self._updated = now
+        # Запрос больше всей корзины не должен ждать вечно
+        amount = min(amount, self.capacity)
+        self._available -= amount
+        return max(0.0, -self._available / self.rate)
+
+
+class RateLimiter:
+    """
+    Общий для провайдера ограничитель: корзины запросов и токенов в минуту,
+    адаптивная параллельность (AIMD) и повторы с джиттером.
+    Параллельность растет на 1 за каждые limit успешных запросов и падает вдвое
+    при троттлинге, поэтому держится у максимума, который выдерживает провайдер.
+    Работает и из потоков (run_sync), и из корутин (run).
+    """
+
+    # Не чаще одного снижения за это время: один всплеск 429 дает много ошибок сразу
+    DECREASE_COOLDOWN = 5.0
+
+    def __init__(self, name: str, limits: RateLimits):
+        self.name = name
+        self.limits = limits
+        self._lock = threading.Lock()
+        # Потоки run_sync ждут свободного слота на условии, а не опрашивают счетчик
+        self._slot_freed = threading.Condition(self._lock)
+        # Корутины ждут на событии своего цикла; _leave будит его через call_soon_threadsafe
+        self._slot_events: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Event]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._requests = TokenBucket(limits.requests_per_minute) if limits.requests_per_minute else None
+        self._tokens = TokenBucket(limits.tokens_per_minute) if limits.tokens_per_minute else None
+        self.concurrency = float(limits.initial_concurrency)
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._started = time.monotonic()
+        self.succeeded = 0
+        self.throttled = 0
+        self.transient_errors = 0
+        self.retries = 0
+        self.failed = 0
+        self.waited_seconds = 0.0
+
+    def _has_free_slot(self) -> bool:
+        return self.in_flight < max(1, int(self.concurrency))
+
+    def _enter_blocking(self) -> None:
+        with self._slot_freed:
+            self._slot_freed.wait_for(self._has_free_slot)
+            self.in_flight += 1
+
+    async def _enter_async(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                if self._has_free_slot():
+                    self.in_flight += 1
+                    return
+                event = self._slot_events.get(loop)
+                if event is None:
+                    event = self._slot_events[loop] = asyncio.Event()
+                # Сброс под замком: слот, освобожденный после проверки, снова выставит событие
+                event.clear()
+            await event.wait()
+
+    def _notify_slot_freed(self) -> None:
+        """Вызывается под self._lock"""
+        self._slot_freed.notify_all()
+        for loop, event in list(self._slot_events.items()):
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # Цикл уже закрыт, ждать на нем некому
+                self._slot_events.pop(loop, None)
+
+    def update_limits(self, limits: RateLimits) -> None:
+        """Меняет пределы параллельности уже созданного лимитера; квоты в минуту остаются прежними"""
+        with self._slot_freed:
+            self.limits = self.limits._replace(
+                initial_concurrency=limits.initial_concurrency, max_concurrency=limits.max_concurrency
+            )
+            self.concurrency = min(max(self.concurrency, limits.initial_concurrency), limits.max_concurrency)
+            self._notify_slot_freed()
+
+    def _reserve(self, tokens: float) -> float:
+        with self._lock:
+            delay = self._requests.reserve(1) if self._requests else 0.0
+            if self._tokens and tokens:
+                delay = max(delay, self._tokens.reserve(tokens))
+            self.waited_seconds += delay
+            return delay
+
+    def _leave(self, outcome: Optional[str]) -> None:
+        with self._slot_freed:
+            self.in_flight -= 1
+            self._notify_slot_freed()
+            if outcome is None:
+                self.succeeded += 1
+                self.concurrency = min(self.limits.max_concurrency, self.concurrency + 1 / self.concurrency)
+            elif outcome == THROTTLED:
+                self.throttled += 1
+                now = time.monotonic()
+                if now - self._last_decrease > self.DECREASE_COOLDOWN:
+                    self.concurrency = max(1.0, self.concurrency / 2)
+                    self._last_decrease = now
+            elif outcome == TRANSIENT:
+                self.transient_errors += 1
+
+    def _next_delay(self, error: BaseException, attempt: int) -> Optional[float]:
+        """Задержка перед повтором или None, если повторять не нужно"""
+        outcome = classify_error(error)
+        self._leave(outcome)
+        if outcome == FATAL or attempt >= self.limits.max_retries:
+            with self._lock:
+                self.failed += 1
+            return None
+        with self._lock:
+            self.retries += 1
+        retry_after = _retry_after(error)
+        return retry_after if retry_after is not None else retry_delay(attempt)
+
+    def run_sync(self, call: Callable[[], T], tokens: float = 0) -> T:
+        attempt = 0
+        while True:
+            # Ждем квоту до занятия слота, чтобы ожидание корзины не держало слот
+            time.sleep(self._reserve(tokens))
+            self._enter_blocking()
+            try:
+                result = call()
+            except Exception as e:
+                delay = self._next_delay(e, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException:
+                self._leave(FATAL)
+                raise
+            self._leave(None)
+            return result
+
+    async def run(self, call: Callable[[], Awaitable[T]], tokens: float = 0) -> T:
+        attempt = 0
+        while True:
+            await asyncio.sleep(self._reserve(tokens))
+            await self._enter_async()
+            try:
+                result = await call()
+            except Exception as e:
+                delay = self._next_delay(e, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException:
+                self._leave(FATAL)
+                raise
+            self._leave(None)
+            return result
+
+    async def stream(self, open_stream: Callable[[], AsyncIterator[T]], tokens: float = 0) -> AsyncIterator[T]:
+        """
+        Как run, но для потокового ответа: слот занят до конца потока.
+        Повторяется только открытие потока до первой части: после нее часть ответа уже отдана.
+        """
+        attempt = 0
+        while True:
+            await asyncio.sleep(self._reserve(tokens))
+            await self._enter_async()
+            chunks = open_stream()
+            try:
+                first = await chunks.__anext__()
+            except StopAsyncIteration:
+                self._leave(None)
+                return
+            except Exception as e:
+                delay = self._next_delay(e, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException:
+                self._leave(FATAL)
+                raise
+            break
+
+        # Если читатель бросил поток сам, слот просто освобождается
+        outcome: Optional[str] = FATAL
+        try:
+            yield first
+            async for chunk in chunks:
+                yield chunk
+            outcome = None
+        except Exception as e:
+            outcome = classify_error(e)
+            with self._lock:
+                self.failed += 1
+            raise
+        finally:
+            self._leave(outcome)
+            aclose = getattr(chunks, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+    def stats_line(self) -> str:
+        elapsed_minutes = max(time.monotonic() - self._started, 1e-9) / 60
+        return (
+            f"Лимитер {self.name}: успешно {self.succeeded} ({self.succeeded / elapsed_minutes:.1f}/мин), "
+            f"троттлинг {self.throttled}, временных ошибок {self.transient_errors}, повторов {self.retries}, "
+            f"отказов {self.failed}, параллельность {self.concurrency:.1f}, ожидание {self.waited_seconds:.1f}с"
+        )
+
+
+_limiters: dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(name: str, limits: RateLimits) -> RateLimiter:
+    """
+    Один лимитер на провайдера на процесс: квоты у провайдера общие для всех клиентов.
+    Если лимитер уже создан с другой параллельностью, действуют последние переданные пределы.
+    """
+    with _limiters_lock:
+        if name not in _limiters:
+            _limiters[name] = RateLimiter(name, limits)
+        else:
+            current = _limiters[name].limits
+            if (current.initial_concurrency, current.max_concurrency) != (
+                    limits.initial_concurrency, limits.max_concurrency):
+                _limiters[name].update_limits(limits)
+        return _limiters[name]
@@ -0,0 +1,84 @@
+import math
+import os
+import wave
+from functools import lru_cache
+
+import numpy as np
+
+from services.audio_qc import read_samples
+
+# Ширина фильтра в отсчетах исходного сигнала по каждую сторону и параметр окна Кайзера (как в scipy)
+HALF_WIDTH = 10
+KAISER_BETA = 5.0
+
+
+@lru_cache(maxsize=8)
+def _polyphase_filter(up: int, down: int) -> np.ndarray:
+    """
+    ФНЧ с окном Кайзера для повышенной в up раз частоты, разложенный на up фаз.
+    Возвращает матрицу (taps, up): столбец p - коэффициенты фазы p.
+    """
+    max_rate = max(up, down)
+    cutoff = 1.0 / max_rate
+    length = 2 * HALF_WIDTH * max_rate + 1
+    center = (length - 1) / 2
+    taps = cutoff * np.sinc(cutoff * (np.arange(length) - center)) * np.kaiser(length, KAISER_BETA)
+    # Единичное усиление на постоянном токе, умноженное на up: вставка нулей ослабляет сигнал в up раз
+    taps *= up / taps.sum()
+    tap_count = -(-length // up)
+    padded = np.zeros(tap_count * up)
+    padded[:length] = taps
+    return padded.reshape(tap_count, up)
+
+
+def resample_poly(samples: np.ndarray, source_rate: int, target_rate: int) -> np.ndarray:
+    """
+    Полифазная передискретизация: эквивалент повышения частоты в up раз,
+    фильтрации и прореживания в down раз, но считаются только нужные выходные отсчеты.
+    Цикл идет по отводам фильтра (десятки), а не по отсчетам сигнала.
+    """
+    divisor = math.gcd(source_rate, target_rate)
+    up, down = target_rate // divisor, source_rate // divisor
+    if up == down:
+        return samples.astype(np.float32)
+    phases = _polyphase_filter(up, down)
+    tap_count = phases.shape[0]
+    delay = (2 * HALF_WIDTH * max(up, down)) // 2
+
+    output_length = -(-len(samples) * up // down)
+    positions = np.arange(output_length, dtype=np.int64) * down + delay
+    phase = positions % up
+    base = positions // up + tap_count
+
+    padded = np.concatenate([
+        np.zeros(tap_count, dtype=np.float32),
+        samples.astype(np.float32),
+        np.zeros(tap_count + delay // up + 1, dtype=np.float32),
+    ])
+    output = np.zeros(output_length, dtype=np.float32)
+    for tap in range(tap_count):
+        output += phases[tap, phase].astype(np.float32) * padded[base - tap]
+    return output
+
+
+def resample_wav(source_path: str, target_path: str, target_rate: int) -> None:
+    """Передискретизирует 16-бит моно WAV; результат появляется под target_path целиком или не появляется"""
+    samples, source_rate = read_samples(source_path)
+    resampled = resample_poly(samples, source_rate, target_rate)
+    del samples
+    pcm = np.clip(np.round(resampled), -32768, 32767).astype("<i2")
+    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+    tmp_path = f"{target_path}.tmp"
+    with wave.open(tmp_path, "wb") as wavfile:
+        wavfile.setparams((1, 2, target_rate, 0, "NONE", "NONE"))
+        wavfile.writeframes(pcm.tobytes())
+    os.replace(tmp_path, target_path)
+
+
+def safe_resample_wav(paths: tuple[str, str], target_rate: int) -> str:
+    """Для пула процессов: возвращает текст ошибки или пустую строку"""
+    try:
+        resample_wav(paths[0], paths[1], target_rate)
+        return ""
+    except Exception as e:
+        return str(e)
@@ -0,0 +1,184 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Iterable, List, Optional
+
+from models.device import Device
+from models.dialogue_pair import DialoguePair
+
+
+def load_normalizer(device: Device, model_size: str = "big", num_threads: int = 0) -> Any:
+    """
+    Загружает RUNorm. num_threads > 0 ограничивает число потоков torch на CPU.
+    """
+    import torch
+    from runorm import RUNorm
+
+    if num_threads > 0:
+        torch.set_num_threads(num_threads)
+    normalizer = RUNorm()
+    normalizer.load(model_size=model_size, device=device)
+    return normalizer
+
+
+def _generate(normalizer: Any, prompts: List[str], batch_size: int) -> List[str]:
+    """
+    То же, что RUNorm.predict_abbr, но для списка промптов: промпты близкой длины
+    собираются в padded-батч и генерируются одним вызовом model.generate.
+    """
+    tokenizer, model = normalizer.abbr_tokenizer, normalizer.abbr_model
+    if normalizer.model_size != "medium":
+        prompts = ["<SC1>" + prompt for prompt in prompts]
+    order = sorted(range(len(prompts)), key=lambda index: len(prompts[index]))
+    predictions: List[str] = [""] * len(prompts)
+    for start in range(0, len(order), batch_size):
+        indices = order[start:start + batch_size]
+        data = tokenizer([prompts[index] for index in indices], return_tensors="pt", padding=True)
+        data = {key: value.to(model.device) for key, value in data.items()}
+        output_ids = model.generate(**data, do_sample=False, max_new_tokens=512, repetition_penalty=1.0)
+        for index, ids in zip(indices, output_ids):
+            # Паддинг после </s> удаляется вместе с <pad>, как и в predict_abbr
+            predictions[index] = tokenizer.decode(ids.tolist()).replace("<s>", "").replace("<pad>", "")
+    return predictions
+
+
+def _abbr_prompt(normalizer: Any, text: str, tags: List[dict]) -> tuple[str, bool]:
+    """Промпт для раскрытия аббревиатур, как в RUNorm.proccess_abbr, по готовой разметке теггера"""
+    for tag in tags:
+        if tag["entity_group"] not in ("PLAIN", "TIME"):
+            tag["entity_group"] = "TAG"
+    prompt = ""
+    current_index = 0
+    extra_id = 0
+    for entity in normalizer.process_tags(tags):
+        prompt += text[current_index:entity["start"]]
+        if entity["entity_group"] == "TAG":
+            prompt += f"[{entity['word']}]<extra_id_{extra_id}>"
+            extra_id += 1
+        else:
+            prompt += entity["word"]
+        current_index = entity["end"]
+    return prompt + text[current_index:], extra_id > 0
+
+
+def _predict_answers(normalizer: Any, prompts: List[tuple[str, bool]], fallbacks: List[str],
+                     batch_size: int) -> List[str]:
+    """Прогоняет через модель только промпты с разметкой, остальные строки оставляет как есть"""
+    answers = list(fallbacks)
+    used = [index for index, (_, is_used) in enumerate(prompts) if is_used]
+    predictions = _generate(normalizer, [prompts[index][0] for index in used], batch_size)
+    for index, prediction in zip(used, predictions):
+        answers[index] = normalizer.construct_answer(prompts[index][0], prediction)
+    return answers
+
+
+def normalize_texts(normalizer: Any, texts: List[str], batch_size: int) -> List[str]:
+    """
+    Нормализует тексты батчами: повторяет RUNorm.norm по стадиям, но модель
+    чисел и аббревиатур вызывается на padded-батчах по batch_size предложений,
+    а теггер получает список предложений целиком.
+    Одинаковые тексты нормализуются один раз.
+    Этапы опираются на внутренние методы RUNorm 1.1, поэтому версия зафиксирована в pyproject.toml.
+    """
+    import torch
+
+    unique_texts = [text for text in dict.fromkeys(texts) if text.strip()]
+    # Предложения всех текстов подряд и номер текста для каждого предложения
+    sentences: List[str] = []
+    owners: List[int] = []
+    for text_index, text in enumerate(unique_texts):
+        for sentence in normalizer.split_by_sentences(text):
+            sentences.append(normalizer.rule_normalizer.normalize(sentence).capitalize())
+            owners.append(text_index)
+
+    with torch.inference_mode():
+        prompts = [normalizer.construct_prompt(sentence) for sentence in sentences]
+        answers = _predict_answers(normalizer, prompts, sentences, batch_size)
+
+        tags = normalizer.tagger(answers, batch_size=batch_size) if answers else []
+        prompts = [_abbr_prompt(normalizer, answer, answer_tags) for answer, answer_tags in zip(answers, tags)]
+        answers = _predict_answers(normalizer, prompts, answers, batch_size)
+
+        parts: List[List[str]] = [[] for _ in unique_texts]
+        for text_index, answer in zip(owners, answers):
+            parts[text_index].append(normalizer.construct_prompt(answer, angl_mode=True)[0])
+
+    normalized = {text: " ".join(text_parts).strip() for text, text_parts in zip(unique_texts, parts)}
+    # Пустые и пробельные тексты RUNorm.norm возвращает пустой строкой
+    return [normalized.get(text, "") for text in texts]
+
+
+def normalize_pairs(
+    normalizer: Any,
+    pairs: Iterable[DialoguePair],
+    batch_size: int,
+    normalize_user_query: bool = True,
+) -> List[DialoguePair]:
+    """Нормализует ai_response (и user_query) у пар, сохраняя их порядок"""
+    pairs = list(pairs)
+    texts = [pair.ai_response for pair in pairs]
+    if normalize_user_query:
+        texts += [pair.user_query for pair in pairs]
+
+    normalized = normalize_texts(normalizer, texts, batch_size)
+
+    for index, pair in enumerate(pairs):
+        pair.ai_response = normalized[index]
+        if normalize_user_query:
+            pair.user_query = normalized[len(pairs) + index]
+    return pairs
+
+
+# Модель, загруженная в процессе-воркере пула (один раз на процесс)
+_worker_normalizer: Optional[Any] = None
+
+
+def _init_worker(device: Device, model_size: str, num_threads: int) -> None:
+    global _worker_normalizer
+    _worker_normalizer = load_normalizer(device, model_size, num_threads)
+
+
+def _normalize_shard(shard: List[str], batch_size: int, normalize_user_query: bool) -> List[str]:
+    pairs = [DialoguePair.model_validate_json(line) for line in shard]
+    normalize_pairs(_worker_normalizer, pairs, batch_size, normalize_user_query)
+    return [pair.model_dump_json() for pair in pairs]
+
+
+def normalize_pairs_parallel(
+    pairs: List[DialoguePair],
+    device: Device,
+    workers: int,
+    threads_per_worker: int,
+    batch_size: int,
+    normalize_user_query: bool = True,
+    model_size: str = "big",
+    shards_per_worker: int = 4,
+) -> Iterable[List[DialoguePair]]:
+    """
+    Нормализует пары в пуле процессов: модель загружается один раз на воркер,
+    файл делится на непрерывные шарды, результаты отдаются по шардам в исходном порядке.
+    Несколько шардов на воркер выравнивают нагрузку при разной длине строк.
+    """
+    if threads_per_worker <= 0:
+        threads_per_worker = max(1, (os.cpu_count() or 1) // workers)
+
+    shard_count = max(1, min(len(pairs), workers * shards_per_worker))
+    shard_size = -(-len(pairs) // shard_count) if pairs else 1
+    shards = [
+        [pair.model_dump_json() for pair in pairs[start:start + shard_size]]
+        for start in range(0, len(pairs), shard_size)
+    ]
+
+    # spawn: torch и fork плохо совместимы
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(device, model_size, threads_per_worker),
+    ) as executor:
+        futures = [
+            executor.submit(_normalize_shard, shard, batch_size, normalize_user_query)
+            for shard in shards
+        ]
+        for future in futures:
+            yield [DialoguePair.model_validate_json(line) for line in future.result()]
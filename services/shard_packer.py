@@ -0,0 +1,153 @@
+import json
+import os
+from typing import Any, NamedTuple
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from services.manifest import load_manifest
+
+PACK_STATE_FILE = "_pack_state.json"
+SHARDS_DIR = "data"
+DEFAULT_SHARD_BYTES = 500 * 1024 ** 2
+ROW_GROUP_SIZE = 64
+
+ROW_COLUMNS = ["id", "text", "source", "style", "voice", "file_name"]
+SHARD_SCHEMA = pa.schema(
+    [(column, pa.string()) for column in ROW_COLUMNS]
+    + [("audio", pa.struct([("bytes", pa.binary()), ("path", pa.string())]))],
+    # По этим метаданным datasets распознает колонку audio как Audio
+    metadata={"huggingface": json.dumps({"info": {"features": {
+        **{column: {"dtype": "string", "_type": "Value"} for column in ROW_COLUMNS},
+        "audio": {"_type": "Audio"},
+    }}})},
+)
+
+
+class PackResult(NamedTuple):
+    new_shards: list[str]
+    removed_shards: list[str]
+    packed_rows: int
+
+
+def load_pack_state(pack_path: str) -> dict[str, Any]:
+    state_path = os.path.join(pack_path, PACK_STATE_FILE)
+    if not os.path.exists(state_path):
+        return {"rows": {}, "next_shard": 0, "pending_upload": [], "pending_delete": []}
+    with open(state_path, encoding="utf-8") as state_file:
+        return json.load(state_file)
+
+
+def save_pack_state(pack_path: str, state: dict[str, Any]) -> None:
+    state_path = os.path.join(pack_path, PACK_STATE_FILE)
+    tmp_path = f"{state_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as state_file:
+        json.dump(state, state_file, ensure_ascii=False)
+    os.replace(tmp_path, state_path)
+
+
+class _ShardWriter:
+    """Пишет строки в шарды по row group и начинает новый шард, когда текущий превысил лимит"""
+
+    def __init__(self, pack_path: str, state: dict[str, Any], max_shard_bytes: int):
+        self.shards_path = os.path.join(pack_path, SHARDS_DIR)
+        os.makedirs(self.shards_path, exist_ok=True)
+        self.state = state
+        self.max_shard_bytes = max_shard_bytes
+        self.written_shards: list[str] = []
+        self._writer = None
+        self._shard_name = ""
+        self._shard_bytes = 0
+        self._batch: list[dict[str, Any]] = []
+
+    def add(self, row: dict[str, Any], audio_path: str) -> str:
+        """Добавляет строку и возвращает имя шарда, в который она попадет"""
+        if self._writer is None:
+            self._open()
+        with open(audio_path, "rb") as audio_file:
+            audio_bytes = audio_file.read()
+        self._batch.append({
+            **{column: row[column] for column in ROW_COLUMNS},
+            "audio": {"bytes": audio_bytes, "path": os.path.basename(audio_path)},
+        })
+        self._shard_bytes += len(audio_bytes) + len(row["text"].encode("utf-8"))
+        shard_name = self._shard_name
+        if len(self._batch) >= ROW_GROUP_SIZE:
+            self._flush()
+        if self._shard_bytes >= self.max_shard_bytes:
+            self._close()
+        return shard_name
+
+    def _open(self) -> None:
+        self._shard_name = f"train-{self.state['next_shard']:05d}.parquet"
+        self.state["next_shard"] += 1
+        self._writer = pq.ParquetWriter(self._tmp_path(), SHARD_SCHEMA)
+        self._shard_bytes = 0
+
+    def _tmp_path(self) -> str:
+        return os.path.join(self.shards_path, f".{self._shard_name}.tmp")
+
+    def _flush(self) -> None:
+        if self._batch:
+            self._writer.write_table(pa.Table.from_pylist(self._batch, schema=SHARD_SCHEMA))
+            self._batch = []
+
+    def _close(self) -> None:
+        self._flush()
+        self._writer.close()
+        self._writer = None
+        # Шард появляется под своим именем только целиком
+        os.replace(self._tmp_path(), os.path.join(self.shards_path, self._shard_name))
+        self.written_shards.append(self._shard_name)
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._close()
+
+
+def pack_shards(manifest_path: str, pack_path: str, max_shard_bytes: int = DEFAULT_SHARD_BYTES) -> PackResult:
+    """
+    Упаковывает строки манифеста в Parquet шарды с аудио внутри.
+    Пакуются только новые строки и строки, у которых изменился текст или аудио.
+    Шарды со старыми версиями строк переписываются без них, а сами удаляются,
+    так что каждая строка лежит ровно в одном шарде.
+    """
+    os.makedirs(pack_path, exist_ok=True)
+    state = load_pack_state(pack_path)
+    manifest = load_manifest(manifest_path, columns=ROW_COLUMNS + ["audio_path", "text_hash", "audio_hash"])
+    manifest["key"] = manifest["source"] + "/" + manifest["id"]
+    manifest["content_hash"] = manifest["text_hash"] + manifest["audio_hash"]
+    manifest = manifest.drop_duplicates("key", keep="last")
+    current = dict(zip(manifest["key"], manifest["content_hash"]))
+
+    packed = state["rows"]
+    stale_keys = {key for key, (_, content_hash) in packed.items() if current.get(key) != content_hash}
+    removed_shards = sorted({packed[key][0] for key in stale_keys})
+    # Неизмененные строки из переписываемых шардов пакуются заново вместе с новыми
+    survivor_keys = {
+        key for key, (shard_name, _) in packed.items() if shard_name in removed_shards and key not in stale_keys
+    }
+    for key in stale_keys | survivor_keys:
+        del packed[key]
+    to_pack = manifest[~manifest["key"].isin(list(packed))]
+
+    writer = _ShardWriter(pack_path, state, max_shard_bytes)
+    for row in to_pack.to_dict("records"):
+        packed[row["key"]] = [writer.add(row, row["audio_path"]), row["content_hash"]]
+    writer.close()
+
+    pending_upload = set(state["pending_upload"])
+    for shard_name in removed_shards:
+        # Еще не загруженный шард достаточно просто забыть
+        if shard_name in pending_upload:
+            pending_upload.discard(shard_name)
+        else:
+            state["pending_delete"].append(shard_name)
+    state["pending_upload"] = sorted(pending_upload | set(writer.written_shards))
+    save_pack_state(pack_path, state)
+
+    for shard_name in removed_shards:
+        shard_path = os.path.join(pack_path, SHARDS_DIR, shard_name)
+        if os.path.exists(shard_path):
+            os.remove(shard_path)
+    return PackResult(writer.written_shards, removed_shards, len(to_pack))
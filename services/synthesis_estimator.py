@@ -0,0 +1,61 @@
+import json
+from typing import NamedTuple
+
+import pandas as pd
+
+from services.manifest import MAX_DURATION, MIN_DURATION, load_manifest
+from services.phonemes import MAX_PHONEMES, estimate_phonemes
+
+# Темп русской речи по умолчанию, пока для голоса нет синтезированных клипов
+DEFAULT_CHARS_PER_SECOND = 14.0
+# Меньше клипов дают слишком шумную оценку темпа
+MIN_CALIBRATION_CLIPS = 20
+
+
+class RowEstimate(NamedTuple):
+    phoneme_count: int
+    duration: float
+
+    def violation(self) -> str:
+        """Причина, по которой строку не стоит синтезировать, или пустая строка"""
+        if self.phoneme_count > MAX_PHONEMES:
+            return f"фонем {self.phoneme_count} > {MAX_PHONEMES}"
+        if self.duration < MIN_DURATION:
+            return f"ожидается {self.duration:.1f}с < {MIN_DURATION}с"
+        if self.duration > MAX_DURATION:
+            return f"ожидается {self.duration:.1f}с > {MAX_DURATION}с"
+        return ""
+
+
+def calibrate_chars_per_second(manifest_path: str) -> dict[str, float]:
+    """Темп каждого голоса (символов в секунду) по уже синтезированным клипам манифеста"""
+    manifest = load_manifest(manifest_path, columns=["voice", "char_count", "duration"])
+    grouped = manifest.groupby("voice").agg(
+        clips=("duration", "size"), chars=("char_count", "sum"), duration=("duration", "sum")
+    )
+    grouped = grouped[(grouped["clips"] >= MIN_CALIBRATION_CLIPS) & (grouped["duration"] > 0)]
+    return (grouped["chars"] / grouped["duration"]).to_dict()
+
+
+def estimate_row(text: str, chars_per_second: float) -> RowEstimate:
+    return RowEstimate(estimate_phonemes(text), len(text) / chars_per_second)
+
+
+def estimate_payload(payload_file_path: str, chars_per_second: dict[str, float]) -> pd.DataFrame:
+    """
+    Оценивает все строки payload файла: число фонем и ожидаемую длительность для каждого голоса
+    (колонки duration_<голос>) и признак выхода за требования (out_of_bounds_<голос>).
+    """
+    with open(payload_file_path, encoding="utf-8") as payload_file:
+        texts = [json.loads(line)["text"] for line in payload_file if line.strip()]
+    estimates = pd.DataFrame({"text": texts})
+    estimates["char_count"] = estimates["text"].str.len()
+    estimates["phoneme_count"] = estimates["text"].map(estimate_phonemes)
+    too_many_phonemes = estimates["phoneme_count"] > MAX_PHONEMES
+    for voice, rate in chars_per_second.items():
+        duration = estimates["char_count"] / rate
+        estimates[f"duration_{voice}"] = duration
+        estimates[f"out_of_bounds_{voice}"] = (
+            too_many_phonemes | (duration < MIN_DURATION) | (duration > MAX_DURATION)
+        )
+    return estimates
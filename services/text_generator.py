@@ -1,12 +1,19 @@
 # text_generator.py
+import hashlib
 import os
-from typing import List, Generator
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from queue import Queue
+from typing import List, Generator, Optional
 import typer
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, ValidationError
 from tqdm import tqdm
 
 from models.base_llm_client import BaseLLMClient
 from models.dialogue_pair import DialoguePair
+from services.json_stream import JsonArrayItemParser
+
+# Сколько ответов подряд без единой пары допустимо, прежде чем тема считается проваленной
+MAX_EMPTY_RESPONSES = 3
 
 GENERATION_PROMPT = """
 Ты - эксперт по генерации реалистичных диалогов между пользователем и ИИ-ассистентом на русском языке для тренировки систем Text-to-Speech (TTS).
@@ -88,20 +95,30 @@ def generate_dialogue(
     batch_size: int,
     num_samples: int = 5,
     temperature: float = 0.7,
+    position: Optional[int] = None,
+    stream: bool = False,
 ) -> Generator[List[DialoguePair], None, None]:
     """
     Генератор диалогов батчами с использованием контекста предыдущих пар.
-    Yield'ит батчи по мере генерации.
+    Yield'ит батчи по мере генерации; при stream=True ответ читается потоком
+    и каждая пара yield'ится, как только модель ее дописала.
+    Ответ разбирается по парам, поэтому обрезанный на лимите токенов ответ
+    не теряется целиком: завершенные пары сохраняются, недостающие запрашиваются снова.
     """
     if not topic or not topic.strip():
         raise ValueError("topic cannot be empty")
 
     last_pair = None
     generated_count = 0
+    empty_responses = 0
 
     # Прогресс бар для батчей
     with tqdm(
-        total=num_samples, desc=f"Генерация для '{topic[:30]}'", unit="пар"
+        total=num_samples,
+        desc=f"Генерация для '{topic[:30]}'",
+        unit="пар",
+        position=position,
+        leave=position is None,
     ) as pbar:
         while generated_count < num_samples:
             # Вычисляем размер текущего батча
@@ -124,18 +141,41 @@ def generate_dialogue(
             ]
 
             # Генерируем батч
-            response = llm_client.chat(
-                messages=messages,
-                temperature=temperature,
-                response_format=TextGeneratedLLMResult,
-            )
-
-            batch_pairs = TextGeneratedLLMResult.model_validate_json(response).pairs
+            if stream:
+                chunks = llm_client.stream(
+                    messages=messages,
+                    temperature=temperature,
+                    response_format=TextGeneratedLLMResult,
+                )
+            else:
+                chunks = [llm_client.chat(
+                    messages=messages,
+                    temperature=temperature,
+                    response_format=TextGeneratedLLMResult,
+                )]
+
+            parser = JsonArrayItemParser()
+            batch_count = 0
+            invalid_count = 0
+            batch_pairs = []
+            for chunk in chunks:
+                for item in parser.feed(chunk):
+                    try:
+                        batch_pairs.append(DialoguePair.model_validate_json(item))
+                    except ValidationError:
+                        invalid_count += 1
+                if stream and batch_pairs:
+                    last_pair = batch_pairs[-1]
+                    batch_count += len(batch_pairs)
+                    pbar.update(len(batch_pairs))
+                    # Yield'им пары сразу: они попадут в файл до конца ответа
+                    yield batch_pairs
+                    batch_pairs = []
 
             # Сохраняем последнюю пару для следующего батча
             if batch_pairs:
                 last_pair = batch_pairs[-1]
-                generated_count += len(batch_pairs)
+                batch_count += len(batch_pairs)
 
                 # Обновляем прогресс
                 pbar.update(len(batch_pairs))
@@ -143,6 +183,86 @@ def generate_dialogue(
                 # Yield'им батч для немедленной обработки
                 yield batch_pairs
 
+            generated_count += batch_count
+            if parser.truncated or invalid_count:
+                tqdm.write(typer.style(
+                    f"Ответ для '{topic[:30]}' {'обрезан' if parser.truncated else 'с ошибками'}: "
+                    f"сохранено {batch_count} из {current_batch_size} пар, пропущено битых {invalid_count}",
+                    fg=typer.colors.YELLOW,
+                ))
+            if batch_count:
+                empty_responses = 0
+            else:
+                empty_responses += 1
+                if empty_responses >= MAX_EMPTY_RESPONSES:
+                    raise ValueError(f"LLM {empty_responses} раза подряд не вернула ни одной пары")
+
+
+def topic_file_name(topic: str) -> str:
+    """Имя файла темы: читаемый префикс и хеш полной темы, чтобы темы с общим началом не делили файл"""
+    topic_hash = hashlib.sha1(topic.encode("utf-8")).hexdigest()[:8]
+    return f"{topic.replace(' ', '_')[:30]}_{topic_hash}.jsonl"
+
+
+def generate_topic(
+    topic: str,
+    output_path: str,
+    llm_client: BaseLLMClient,
+    batch_size: int,
+    num_samples: int = 5,
+    temperature: float = 0.7,
+    position: Optional[int] = None,
+    stream: bool = False,
+) -> int:
+    """
+    Генерирует диалоги для одной темы в собственный jsonl файл.
+    Возвращает количество записанных пар.
+    """
+    # Создаем имя файла для темы
+    topic_filename = topic_file_name(topic)
+    topic_filepath = os.path.join(output_path, topic_filename)
+    topic_filepath_mode = "w" if not os.path.exists(topic_filepath) else "a"
+
+    # Генерируем и сохраняем диалоги батчами
+    try:
+        pairs_count = 0
+        with open(topic_filepath, topic_filepath_mode) as topic_file:
+            for batch_pairs in generate_dialogue(
+                topic=topic,
+                llm_client=llm_client,
+                batch_size=batch_size,
+                num_samples=num_samples,
+                temperature=temperature,
+                position=position,
+                stream=stream,
+            ):
+                # Записываем каждую пару из батча
+                for pair in batch_pairs:
+                    topic_file.write(pair.to_jsonl())
+                    pairs_count += 1
+
+                # Принудительная запись в файл после каждого батча
+                topic_file.flush()
+
+        tqdm.write(
+            typer.style(
+                f"✓ Диалоги для темы '{topic}' сохранены в {topic_filepath} "
+                f"({pairs_count} пар)",
+                fg=typer.colors.GREEN,
+            )
+        )
+        return pairs_count
+
+    except Exception as e:
+        tqdm.write(
+            typer.style(
+                f"✗ Ошибка при обработке темы '{topic}': {str(e)}",
+                fg=typer.colors.RED,
+            )
+        )
+        return 0
+
+
 def generate_multiple_topics(
     topics_list: List[str],
     output_path: str,
@@ -150,64 +270,49 @@ def generate_multiple_topics(
     batch_size: int,
     num_samples: int = 5,
     temperature: float = 0.7,
+    parallel_topics: int = 1,
+    stream: bool = False,
 ):
     """
     Генерирует диалоги для нескольких тем и сохраняет результаты в jsonl файлы.
+    При parallel_topics > 1 темы обрабатываются одновременно, каждая в свой файл;
+    общее число запросов к провайдеру ограничивает сам llm_client.
     """
+    # Одинаковые темы писали бы одновременно в один файл
+    topics_list = list(dict.fromkeys(topic for topic in topics_list if topic.strip()))
     total_topics_count = len(topics_list)
     typer.echo(f"Начало генерации диалогов для {total_topics_count} тем...")
 
-    # Основной прогресс бар для тем
-    for index, current_topic in enumerate(
-        tqdm(topics_list, desc="Обработка тем", unit="тема")
-    ):
-        typer.echo(
-            f"\n\nОбработка темы {index + 1}/{total_topics_count}: '{current_topic}'..."
-        )
-
-        if not current_topic.strip():
-            typer.echo("Пропуск пустой темы.")
-            continue
-
-        # Создаем имя файла для темы
-        topic_filename = f"{current_topic.replace(' ', '_')[:30]}.jsonl"
-        topic_filepath = os.path.join(output_path, topic_filename)
-        topic_filepath_mode = "w" if not os.path.exists(topic_filepath) else "a"
-
-        # Генерируем и сохраняем диалоги батчами
-        try:
-            pairs_count = 0
-            with open(topic_filepath, topic_filepath_mode) as topic_file:
-                for batch_pairs in generate_dialogue(
-                    topic=current_topic,
-                    llm_client=llm_client,
-                    batch_size=batch_size,
-                    num_samples=num_samples,
-                    temperature=temperature,
-                ):
-                    # Записываем каждую пару из батча
-                    for pair in batch_pairs:
-                        topic_file.write(pair.to_jsonl())
-                        pairs_count += 1
-
-                    # Принудительная запись в файл после каждого батча
-                    topic_file.flush()
-
-            typer.echo(
-                typer.style(
-                    f"✓ Диалоги для темы '{current_topic}' сохранены в {topic_filepath} "
-                    f"({pairs_count} пар)",
-                    fg=typer.colors.GREEN,
-                )
+    if parallel_topics <= 1:
+        # Основной прогресс бар для тем
+        for index, current_topic in enumerate(
+            tqdm(topics_list, desc="Обработка тем", unit="тема")
+        ):
+            tqdm.write(
+                f"\n\nОбработка темы {index + 1}/{total_topics_count}: '{current_topic}'..."
             )
-
-        except Exception as e:
-            typer.echo(
-                typer.style(
-                    f"✗ Ошибка при обработке темы '{current_topic}': {str(e)}",
-                    fg=typer.colors.RED,
+            generate_topic(current_topic, output_path, llm_client, batch_size, num_samples, temperature,
+                           stream=stream)
+    else:
+        # Строки прогресса 1..N переиспользуются темами, строка 0 - общий прогресс
+        free_positions: Queue[int] = Queue()
+        for position in range(1, parallel_topics + 1):
+            free_positions.put(position)
+
+        def run_topic(topic: str) -> int:
+            position = free_positions.get()
+            try:
+                return generate_topic(
+                    topic, output_path, llm_client, batch_size, num_samples, temperature, position, stream
                 )
-            )
-            continue
+            finally:
+                free_positions.put(position)
+
+        with tqdm(total=total_topics_count, desc="Обработка тем", unit="тема", position=0) as pbar, \
+                ThreadPoolExecutor(max_workers=parallel_topics) as executor:
+            futures = [executor.submit(run_topic, topic) for topic in topics_list]
+            for future in as_completed(futures):
+                future.result()
+                pbar.update(1)
 
     typer.echo(typer.style("\n✓ Генерация завершена!", fg=typer.colors.GREEN, bold=True))
@@ -0,0 +1,611 @@
+"""
+Детерминированная нормализация русского текста для TTS: числа, даты, время,
+телефоны, единицы измерения и символы проговариваются словами.
+
+Нормализатор работает консервативно: если для строки нельзя уверенно
+подобрать форму (косвенный падеж, латиница, неизвестный символ),
+normalize_text возвращает None и строка уходит в LLM.
+"""
+import re
+from typing import Callable, Optional
+
+# Род: m - мужской, f - женский, n - средний
+UNITS = ["", "один", "два", "три", "четыре", "пять", "шесть", "семь", "восемь", "девять"]
+UNITS_FEMININE = {1: "одна", 2: "две"}
+UNITS_NEUTER = {1: "одно", 2: "два"}
+TEENS = ["десять", "одиннадцать", "двенадцать", "тринадцать", "четырнадцать", "пятнадцать",
+         "шестнадцать", "семнадцать", "восемнадцать", "девятнадцать"]
+TENS = ["", "", "двадцать", "тридцать", "сорок", "пятьдесят", "шестьдесят", "семьдесят",
+        "восемьдесят", "девяносто"]
+HUNDREDS = ["", "сто", "двести", "триста", "четыреста", "пятьсот", "шестьсот", "семьсот",
+            "восемьсот", "девятьсот"]
+# (род, формы для 1, 2-4, 5+)
+SCALES = [
+    ("f", ("тысяча", "тысячи", "тысяч")),
+    ("m", ("миллион", "миллиона", "миллионов")),
+    ("m", ("миллиард", "миллиарда", "миллиардов")),
+]
+
+# Порядковые: (основа, тип склонения)
+ORDINAL_UNITS = [None, ("перв", "ый"), ("втор", "ой"), ("трет", "ий"), ("четверт", "ый"), ("пят", "ый"),
+                 ("шест", "ой"), ("седьм", "ой"), ("восьм", "ой"), ("девят", "ый")]
+ORDINAL_TEENS = [("десят", "ый"), ("одиннадцат", "ый"), ("двенадцат", "ый"), ("тринадцат", "ый"),
+                 ("четырнадцат", "ый"), ("пятнадцат", "ый"), ("шестнадцат", "ый"), ("семнадцат", "ый"),
+                 ("восемнадцат", "ый"), ("девятнадцат", "ый")]
+ORDINAL_TENS = [None, None, ("двадцат", "ый"), ("тридцат", "ый"), ("сороков", "ой"), ("пятидесят", "ый"),
+                ("шестидесят", "ый"), ("семидесят", "ый"), ("восьмидесят", "ый"), ("девяност", "ый")]
+ORDINAL_HUNDREDS = [None, ("сот", "ый"), ("двухсот", "ый"), ("трехсот", "ый"), ("четырехсот", "ый"),
+                    ("пятисот", "ый"), ("шестисот", "ый"), ("семисот", "ый"), ("восьмисот", "ый"),
+                    ("девятисот", "ый")]
+
+# Окончания порядковых по типу склонения и форме
+ORDINAL_ENDINGS = {
+    "ый": {"m": "ый", "f": "ая", "n": "ое", "pl": "ые", "gen_m": "ого", "gen_f": "ой",
+           "prep_m": "ом", "acc_f": "ую", "gen_pl": "ых"},
+    "ой": {"m": "ой", "f": "ая", "n": "ое", "pl": "ые", "gen_m": "ого", "gen_f": "ой",
+           "prep_m": "ом", "acc_f": "ую", "gen_pl": "ых"},
+    "ий": {"m": "ий", "f": "ья", "n": "ье", "pl": "ьи", "gen_m": "ьего", "gen_f": "ьей",
+           "prep_m": "ьем", "acc_f": "ью", "gen_pl": "ьих"},
+}
+
+MONTHS_GENITIVE = ["", "января", "февраля", "марта", "апреля", "мая", "июня", "июля", "августа",
+                   "сентября", "октября", "ноября", "декабря"]
+
+# Косвенные падежи количественных числительных до 59 - только для часов и минут во времени
+UNITS_OBLIQUE = {
+    "gen": ["", "одного", "двух", "трех", "четырех", "пяти", "шести", "семи", "восьми", "девяти"],
+    "dat": ["", "одному", "двум", "трем", "четырем", "пяти", "шести", "семи", "восьми", "девяти"],
+}
+TENS_OBLIQUE = ["", "", "двадцати", "тридцати", "сорока", "пятидесяти"]
+# Предлог перед временем -> падеж: "с девяти", "к десяти"
+TIME_CASE_WORDS = {"с": "gen", "со": "gen", "до": "gen", "от": "gen", "после": "gen", "около": "gen",
+                   "к": "dat", "ко": "dat"}
+# "в 10:30", "на 18:00" - винительный падеж, совпадает с именительным
+TIME_ACCUSATIVE_WORDS = {"в", "во", "на"}
+
+# Единицы измерения: сокращение -> (род, формы для 1, 2-4, 5+)
+MEASURE_UNITS = {
+    "км²": ("m", ("квадратный километр", "квадратных километра", "квадратных километров")),
+    "м²": ("m", ("квадратный метр", "квадратных метра", "квадратных метров")),
+    "см²": ("m", ("квадратный сантиметр", "квадратных сантиметра", "квадратных сантиметров")),
+    "м³": ("m", ("кубический метр", "кубических метра", "кубических метров")),
+    "км/ч": ("m", ("километр в час", "километра в час", "километров в час")),
+    "км": ("m", ("километр", "километра", "километров")),
+    "м": ("m", ("метр", "метра", "метров")),
+    "см": ("m", ("сантиметр", "сантиметра", "сантиметров")),
+    "мм": ("m", ("миллиметр", "миллиметра", "миллиметров")),
+    "кг": ("m", ("килограмм", "килограмма", "килограммов")),
+    "г": ("m", ("грамм", "грамма", "граммов")),
+    "гр": ("m", ("грамм", "грамма", "граммов")),
+    "мг": ("m", ("миллиграмм", "миллиграмма", "миллиграммов")),
+    "мкг": ("m", ("микрограмм", "микрограмма", "микрограммов")),
+    "л": ("m", ("литр", "литра", "литров")),
+    "мл": ("m", ("миллилитр", "миллилитра", "миллилитров")),
+    "ч": ("m", ("час", "часа", "часов")),
+    "мин": ("f", ("минута", "минуты", "минут")),
+    "сек": ("f", ("секунда", "секунды", "секунд")),
+    "ккал": ("f", ("килокалория", "килокалории", "килокалорий")),
+    "шт": ("f", ("штука", "штуки", "штук")),
+    "руб": ("m", ("рубль", "рубля", "рублей")),
+    "тыс": ("f", ("тысяча", "тысячи", "тысяч")),
+    "млн": ("m", ("миллион", "миллиона", "миллионов")),
+    "млрд": ("m", ("миллиард", "миллиарда", "миллиардов")),
+    "%": ("m", ("процент", "процента", "процентов")),
+    "°C": ("m", ("градус цельсия", "градуса цельсия", "градусов цельсия")),
+    "°С": ("m", ("градус цельсия", "градуса цельсия", "градусов цельсия")),
+    "°": ("m", ("градус", "градуса", "градусов")),
+    "₽": ("m", ("рубль", "рубля", "рублей")),
+    "$": ("m", ("доллар", "доллара", "долларов")),
+    "€": ("n", ("евро", "евро", "евро")),
+}
+# Длинные сокращения проверяются раньше коротких ("км²" раньше "км", "мм" раньше "м")
+_UNIT_PATTERN = "|".join(
+    re.escape(unit) for unit in sorted(MEASURE_UNITS, key=len, reverse=True)
+)
+
+SYMBOLS = {
+    "=": "равно",
+    "+": "плюс",
+    "−": "минус",
+    "×": "умножить на",
+    "÷": "разделить на",
+    "≤": "меньше или равно",
+    "≥": "больше или равно",
+    "≈": "примерно",
+    "№": "номер",
+    "§": "параграф",
+    "@": "собака",
+    "#": "решетка",
+    "&": "и",
+    "$": "доллар",
+    "€": "евро",
+    "₽": "рубль",
+}
+
+# Предлоги и слова, после которых числительное стоит в косвенном падеже.
+# Склонение количественных числительных не поддерживается, такие строки уходят в LLM.
+OBLIQUE_CASE_WORDS = {
+    "в", "во", "на", "по",
+    "до", "от", "из", "с", "со", "без", "около", "для", "после", "кроме", "у", "более", "менее",
+    "свыше", "больше", "меньше", "к", "ко", "о", "об", "обо", "при", "над", "под", "между", "перед",
+    "среди", "вокруг", "против", "вместо", "старше", "младше", "моложе", "дольше", "выше", "ниже",
+    "чем", "порядка", "размером", "весом", "возрасте", "течение", "пределах", "районе",
+}
+# Род существительных, который не угадывается по окончанию
+KNOWN_GENDERS = {
+    "день": "m", "рубль": "m", "месяц": "m", "календарь": "m", "словарь": "m", "путь": "m",
+    "ночь": "f", "часть": "f", "вещь": "f", "дверь": "f", "роль": "f", "цель": "f",
+}
+# Несклоняемые существительные и существительные на -мя: род по окончанию не угадать
+INDECLINABLE_NOUNS = {
+    "такси", "кафе", "кофе", "метро", "пальто", "кино", "радио", "шоссе", "меню", "интервью",
+    "евро", "фото", "видео", "авто", "жюри", "пюре", "депо", "кашне", "эскимо", "какао",
+}
+NEUTER_MYA_ENDINGS = ("мя", "мени", "менем", "мена", "мён", "мен")
+# Окончания косвенных падежей множественного числа у следующего слова ("в 5 странах")
+OBLIQUE_PLURAL_ENDINGS = ("ах", "ях", "ами", "ями", "ам", "ям")
+# Окончания косвенных падежей единственного числа ("1 случае", "1 таблетке", "1 часу")
+OBLIQUE_SINGULAR_ENDINGS = ("е", "у", "ю")
+
+# Все, что останется после нормализации и не может быть прочитано диктором.
+# Латиница (англоязычные термины и аббревиатуры) тоже остается на LLM.
+UNRESOLVED_PATTERN = re.compile(r"[0-9A-Za-z%$€₽№§@#&=+−×÷≤≥≈√°/\\^*_<>|~{}\[\]²³]")
+# Числа через двоеточие, точку или " - ", оставшиеся после разбора времени и дат:
+# "счет 1:2", "версия 1.2", "5 - 3". После замены цифр словами их уже не отличить,
+# поэтому они отсекаются правилом в RULES до количественных числительных.
+UNRESOLVED_NUMBERS_PATTERN = re.compile(r"\d\s*[:.]\s*\d|\d\s[-−]\s\d")
+
+_WORD_BEFORE = re.compile(r"([А-Яа-яЁё]+)[\s(«\"]*$")
+_WORD_AFTER = re.compile(r"^[\s«\"]*([А-Яа-яЁё]+)")
+
+
+class UnresolvedText(Exception):
+    """Фрагмент текста нельзя нормализовать без риска ошибиться в форме"""
+
+
+def plural_form(number: int, forms: tuple[str, str, str]) -> str:
+    """Выбирает форму существительного для числа: (1, 2-4, 5+)"""
+    number = abs(number) % 100
+    if 11 <= number <= 19:
+        return forms[2]
+    last_digit = number % 10
+    if last_digit == 1:
+        return forms[0]
+    if 2 <= last_digit <= 4:
+        return forms[1]
+    return forms[2]
+
+
+def _triplet_to_words(number: int, gender: str) -> list[str]:
+    words = []
+    hundreds, rest = divmod(number, 100)
+    if hundreds:
+        words.append(HUNDREDS[hundreds])
+    if 10 <= rest <= 19:
+        words.append(TEENS[rest - 10])
+        return words
+    tens, units = divmod(rest, 10)
+    if tens:
+        words.append(TENS[tens])
+    if units:
+        if gender == "f" and units in UNITS_FEMININE:
+            words.append(UNITS_FEMININE[units])
+        elif gender == "n" and units in UNITS_NEUTER:
+            words.append(UNITS_NEUTER[units])
+        else:
+            words.append(UNITS[units])
+    return words
+
+
+def number_to_words(number: int, gender: str = "m") -> str:
+    """Количественное числительное в именительном падеже"""
+    if number == 0:
+        return "ноль"
+    if number < 0:
+        return "минус " + number_to_words(-number, gender)
+    if number >= 1000 ** (len(SCALES) + 1):
+        raise UnresolvedText(f"слишком большое число: {number}")
+
+    groups = []
+    while number:
+        number, group = divmod(number, 1000)
+        groups.append(group)
+
+    words = []
+    for scale_index in range(len(groups) - 1, -1, -1):
+        group = groups[scale_index]
+        if not group:
+            continue
+        if scale_index == 0:
+            words.extend(_triplet_to_words(group, gender))
+        elif scale_index == 1 and group == 1 and not words:
+            # "тысяча девятьсот", а не "одна тысяча девятьсот"
+            words.append(SCALES[0][1][0])
+        else:
+            scale_gender, scale_forms = SCALES[scale_index - 1]
+            words.extend(_triplet_to_words(group, scale_gender))
+            words.append(plural_form(group, scale_forms))
+    return " ".join(words)
+
+
+def digits_to_words(digits: str) -> str:
+    """Читает группу цифр как в телефонах и времени: "05" -> "ноль пять" """
+    if len(digits) > 1 and digits.startswith("0"):
+        return "ноль " + digits_to_words(digits[1:])
+    return number_to_words(int(digits))
+
+
+def ordinal_to_words(number: int, form: str = "m") -> str:
+    """
+    Порядковое числительное: изменяется только последнее слово.
+    form - ключ ORDINAL_ENDINGS (m, f, n, pl, gen_m, gen_f, prep_m, acc_f, gen_pl).
+    """
+    if number <= 0:
+        raise UnresolvedText(f"порядковое числительное для {number}")
+    head, last = divmod(number, 1000)
+    if last == 0:
+        # "двухтысячный", "трехмиллионный" - сложные формы отдаем LLM
+        raise UnresolvedText(f"сложное порядковое числительное: {number}")
+
+    hundreds, rest = divmod(last, 100)
+    if rest == 0:
+        stem, declension = ORDINAL_HUNDREDS[hundreds]
+        prefix_number = head * 1000
+    elif 10 <= rest <= 19:
+        stem, declension = ORDINAL_TEENS[rest - 10]
+        prefix_number = head * 1000 + hundreds * 100
+    elif rest % 10 == 0:
+        stem, declension = ORDINAL_TENS[rest // 10]
+        prefix_number = head * 1000 + hundreds * 100
+    else:
+        stem, declension = ORDINAL_UNITS[rest % 10]
+        prefix_number = number - rest % 10
+
+    word = stem + ORDINAL_ENDINGS[declension][form]
+    if prefix_number:
+        return f"{number_to_words(prefix_number)} {word}"
+    return word
+
+
+def _word_before(match: re.Match) -> Optional[str]:
+    found = _WORD_BEFORE.search(match.string[:match.start()])
+    return found.group(1).lower() if found else None
+
+
+def _word_after(match: re.Match) -> Optional[str]:
+    found = _WORD_AFTER.search(match.string[match.end():])
+    return found.group(1).lower() if found else None
+
+
+def _is_oblique_noun(word: str, number: Optional[int]) -> bool:
+    """Слово после числа стоит в косвенном падеже. number нужен, чтобы отличить "две ложки" от "одной ложки" """
+    if len(word) > 3 and word.endswith(OBLIQUE_PLURAL_ENDINGS):
+        return True
+    # Короткие слова - предлоги, союзы и частицы
+    if len(word) <= 2:
+        return False
+    if word.endswith(OBLIQUE_SINGULAR_ENDINGS):
+        return True
+    if number is not None and word.endswith(("и", "ы")):
+        # После 2-4 это родительный падеж единственного числа: "две ложки", "три книги"
+        return not (2 <= number % 10 <= 4 and not 11 <= number % 100 <= 19)
+    return False
+
+
+def _ensure_direct_case(match: re.Match, number: Optional[int] = None, check_noun: bool = True) -> None:
+    """
+    Пропускает только числительные в именительном (или совпадающем с ним винительном) падеже.
+    check_noun=False - существительным служит единица измерения, следующее слово не проверяется.
+    """
+    if _word_before(match) in OBLIQUE_CASE_WORDS:
+        raise UnresolvedText(f"числительное в косвенном падеже: {match.group(0)!r}")
+    next_word = _word_after(match)
+    if check_noun and next_word and _is_oblique_noun(next_word, number):
+        raise UnresolvedText(f"числительное в косвенном падеже: {match.group(0)!r}")
+
+
+def _guess_gender(number: int, next_word: Optional[str]) -> str:
+    """
+    Подбирает род числительного по следующему слову.
+    Важен только для чисел, оканчивающихся на 1 и 2.
+    """
+    last_two = number % 100
+    last_digit = number % 10
+    if last_digit not in (1, 2) or 11 <= last_two <= 19:
+        return "m"
+    if next_word is None:
+        return "m"
+    if next_word in KNOWN_GENDERS:
+        return KNOWN_GENDERS[next_word]
+    if next_word in INDECLINABLE_NOUNS or next_word.endswith(NEUTER_MYA_ENDINGS):
+        # "одно такси", "два имени" - род не следует из окончания
+        raise UnresolvedText(f"не удалось определить род: {number} {next_word}")
+    if last_digit == 2:
+        # "две ложки", "два часа", "два окна"
+        if next_word.endswith(("и", "ы")):
+            return "f"
+        if next_word.endswith(("а", "я")):
+            return "m"
+        raise UnresolvedText(f"не удалось определить род: {number} {next_word}")
+    # "одна ложка", "одно окно", "один стакан". Слова на -е/-у/-ю отсекает _ensure_direct_case
+    if next_word.endswith(("а", "я")):
+        return "f"
+    if next_word.endswith("о"):
+        return "n"
+    if next_word[-1] not in "аеёиоуыэюяь":
+        return "m"
+    raise UnresolvedText(f"не удалось определить род: {number} {next_word}")
+
+
+def _parse_number(text: str) -> int:
+    return int(re.sub(r"\s", "", text))
+
+
+def _cardinal_with_gender(number: int, gender: str) -> str:
+    if gender == "acc_f":
+        words = number_to_words(number, "f")
+        return words[:-len("одна")] + "одну" if words.endswith("одна") else words
+    return number_to_words(number, gender)
+
+
+def _replace_phone(match: re.Match) -> str:
+    prefix = "плюс семь" if match.group(0).startswith("+") else "восемь"
+    return " ".join([prefix] + [digits_to_words(group) for group in match.groups()])
+
+
+def _date_words(day: int, month: int, year: Optional[int]) -> str:
+    if not (1 <= day <= 31 and 1 <= month <= 12):
+        raise UnresolvedText(f"некорректная дата: {day}.{month}")
+    words = f"{ordinal_to_words(day, 'n')} {MONTHS_GENITIVE[month]}"
+    if year is not None:
+        words += f" {ordinal_to_words(year, 'gen_m')} года"
+    return words
+
+
+def _replace_date(match: re.Match) -> str:
+    _ensure_direct_case(match)
+    year = int(match.group(3)) if match.group(3) else None
+    return _date_words(int(match.group(1)), int(match.group(2)), year)
+
+
+def _replace_day_month(match: re.Match) -> str:
+    # "1 мая" -> "первое мая": день перед месяцем в родительном падеже - порядковое среднего рода
+    _ensure_direct_case(match)
+    year = int(match.group(3)) if match.group(3) else None
+    return _date_words(int(match.group(1)), MONTHS_GENITIVE.index(match.group(2).lower()), year)
+
+
+def _oblique_cardinal(number: int, case: str) -> str:
+    """Количественное числительное от 1 до 59 в родительном (gen) или дательном (dat) падеже"""
+    if not 1 <= number <= 59:
+        raise UnresolvedText(f"склонение числительного: {number}")
+    if 10 <= number <= 19:
+        # "десяти", "одиннадцати": одинаково в обоих падежах
+        return TEENS[number - 10][:-1] + "и"
+    tens, units = divmod(number, 10)
+    words = [TENS_OBLIQUE[tens]] if tens else []
+    if units:
+        words.append(UNITS_OBLIQUE[case][units])
+    return " ".join(words)
+
+
+def _replace_time(match: re.Match) -> str:
+    hours, minutes = int(match.group(1)), int(match.group(2))
+    if hours > 24 or minutes > 59:
+        raise UnresolvedText(f"некорректное время: {match.group(0)}")
+    word_before = _word_before(match)
+    case = TIME_CASE_WORDS.get(word_before)
+    if case is None:
+        if word_before not in TIME_ACCUSATIVE_WORDS:
+            _ensure_direct_case(match)
+        return f"{number_to_words(hours)} {digits_to_words(match.group(2))}"
+    # "с девяти ноль-ноль до восемнадцати тридцати", "к десяти ноль пяти"
+    if minutes == 0:
+        minute_words = "ноль-ноль"
+    elif minutes < 10:
+        minute_words = f"ноль {_oblique_cardinal(minutes, case)}"
+    else:
+        minute_words = _oblique_cardinal(minutes, case)
+    return f"{_oblique_cardinal(hours, case)} {minute_words}"
+
+
+def _roman_to_int(roman: str) -> int:
+    values = {"I": 1, "V": 5, "X": 10, "L": 50, "C": 100}
+    total = 0
+    for current, following in zip(roman, roman[1:] + " "):
+        value = values[current]
+        total += -value if values.get(following, 0) > value else value
+    return total
+
+
+CENTURY_FORMS = {"век": "m", "века": "gen_m", "веке": "prep_m", "веков": "gen_pl", "веках": "gen_pl"}
+
+
+def _replace_century(match: re.Match) -> str:
+    return f"{ordinal_to_words(_roman_to_int(match.group(1)), CENTURY_FORMS[match.group(2).lower()])} {match.group(2)}"
+
+
+YEAR_FORMS = {"год": "m", "года": "gen_m", "году": "prep_m", "годом": None}
+
+
+def _replace_year(match: re.Match) -> str:
+    form = YEAR_FORMS.get(match.group(2).lower())
+    if form is None:
+        raise UnresolvedText(f"форма года: {match.group(0)}")
+    return f"{ordinal_to_words(int(match.group(1)), form)} {match.group(2)}"
+
+
+# Предлог перед "2024 г." -> (форма порядкового, слово "год"): "в 2024 г." - "в ... четвертом году"
+YEAR_ABBREVIATION_FORMS = {
+    "в": ("prep_m", "году"), "во": ("prep_m", "году"), "на": ("prep_m", "году"),
+    "с": ("gen_m", "года"), "со": ("gen_m", "года"), "до": ("gen_m", "года"), "от": ("gen_m", "года"),
+    "после": ("gen_m", "года"), "около": ("gen_m", "года"), "для": ("gen_m", "года"),
+    "за": ("m", "год"), "про": ("m", "год"), "через": ("m", "год"),
+}
+
+
+def _replace_year_abbreviation(match: re.Match) -> str:
+    # Трехзначные числа с "г." - это граммы ("150 г."), их читает _replace_cardinal.
+    # Падеж "г." определяется по предлогу; без известного предлога строку разбирает LLM
+    forms = YEAR_ABBREVIATION_FORMS.get(_word_before(match))
+    if forms is None:
+        raise UnresolvedText(f"падеж года: {match.group(0)!r}")
+    form, noun = forms
+    return f"{ordinal_to_words(int(match.group(1)), form)} {noun}"
+
+
+def _reject_ambiguous(match: re.Match) -> str:
+    raise UnresolvedText(f"неоднозначная запись чисел: {match.group(0)!r}")
+
+
+ORDINAL_SUFFIXES = {
+    "ый": "m", "ой": "m", "ий": "m",
+    "я": "f", "ая": "f",
+    "ое": "n",
+    "го": "gen_m", "ого": "gen_m",
+    "ом": "prep_m",
+    "х": "gen_pl", "ых": "gen_pl",
+    "ю": "acc_f", "ую": "acc_f",
+}
+# "1-м" - "первом" или "первым", "1-й" - "первый" или "первой": падеж знает только LLM
+AMBIGUOUS_ORDINAL_SUFFIXES = {"м", "й"}
+
+
+def _replace_ordinal(match: re.Match) -> str:
+    number, suffix = int(match.group(1)), match.group(2).lower()
+    if suffix in AMBIGUOUS_ORDINAL_SUFFIXES:
+        raise UnresolvedText(f"неоднозначное порядковое числительное: {match.group(0)!r}")
+    if suffix == "е":
+        # "3-е место", но "90-е годы"
+        next_word = _word_after(match)
+        form = "pl" if next_word in ("годы", "гг") else "n"
+    else:
+        form = ORDINAL_SUFFIXES[suffix]
+    return ordinal_to_words(number, form)
+
+
+def _replace_decimal(match: re.Match) -> str:
+    whole, fraction, unit = match.group(1), match.group(2), match.group(3)
+    _ensure_direct_case(match, check_noun=not unit)
+    denominators = {1: ("десятая", "десятых"), 2: ("сотая", "сотых"), 3: ("тысячная", "тысячных")}
+    if len(fraction) not in denominators:
+        raise UnresolvedText(f"длинная дробная часть: {match.group(0)}")
+    whole_number = _parse_number(whole)
+    fraction_number = int(fraction)
+    whole_words = number_to_words(whole_number, "f")
+    whole_noun = plural_form(whole_number, ("целая", "целых", "целых"))
+    denominator = denominators[len(fraction)]
+    fraction_noun = denominator[0] if plural_form(fraction_number, ("1", "2", "5")) == "1" else denominator[1]
+    words = f"{whole_words} {whole_noun} {number_to_words(fraction_number, 'f')} {fraction_noun}"
+    if unit:
+        # После дробного числа существительное стоит в родительном падеже единственного числа
+        words += " " + MEASURE_UNITS[unit][1][1]
+    return words
+
+
+def _replace_slash(match: re.Match) -> str:
+    left, right = int(match.group(1)), int(match.group(2))
+    if (left, right) == (24, 7):
+        return "двадцать четыре на семь"
+    if 0 < left < right <= 10:
+        _ensure_direct_case(match)
+        numerator = number_to_words(left, "f")
+        denominator = ordinal_to_words(right, "f" if left % 10 == 1 and left % 100 != 11 else "gen_pl")
+        return f"{numerator} {denominator}"
+    if len(match.group(2)) == 2 and 1 <= right <= 12:
+        _ensure_direct_case(match)
+        return _date_words(left, right, None)
+    raise UnresolvedText(f"неоднозначная дробь: {match.group(0)}")
+
+
+def _replace_range(match: re.Match) -> str:
+    first, second, unit = _parse_number(match.group(1)), _parse_number(match.group(2)), match.group(3)
+    _ensure_direct_case(match, second, check_noun=not unit)
+    if first >= 1000 and second >= 1000:
+        # Диапазоны лет требуют перестройки фразы ("с ... по ...")
+        raise UnresolvedText(f"диапазон лет: {match.group(0)}")
+    if unit:
+        gender, forms = MEASURE_UNITS[unit]
+        return (f"{_cardinal_with_gender(first, gender)}-{_cardinal_with_gender(second, gender)} "
+                f"{plural_form(second, forms)}")
+    gender = _guess_gender(second, _word_after(match))
+    return f"{_cardinal_with_gender(first, gender)}-{_cardinal_with_gender(second, gender)}"
+
+
+def _replace_currency_prefix(match: re.Match) -> str:
+    _ensure_direct_case(match, check_noun=False)
+    number = _parse_number(match.group(2))
+    gender, forms = MEASURE_UNITS[match.group(1)]
+    return f"{_cardinal_with_gender(number, gender)} {plural_form(number, forms)}"
+
+
+def _replace_cardinal(match: re.Match) -> str:
+    number, unit = _parse_number(match.group(1)), match.group(2)
+    _ensure_direct_case(match, number, check_noun=not unit)
+    if unit:
+        gender, forms = MEASURE_UNITS[unit]
+        return f"{_cardinal_with_gender(number, gender)} {plural_form(number, forms)}"
+    return _cardinal_with_gender(number, _guess_gender(number, _word_after(match)))
+
+
+_NUMBER = r"\d{1,3}(?:[ \u00a0]\d{3})+(?!\d)|\d+"
+# Точка сокращения ("тыс.", "руб.") поглощается, если дальше предложение продолжается;
+# перед заглавной буквой и в конце текста она остается концом предложения
+_UNIT_SUFFIX = rf"(?:\s?({_UNIT_PATTERN})(?![А-Яа-яЁёA-Za-z])(?:\.(?=\s*[а-яё,;:)]))?)?"
+# Число не должно быть приклеено к слову: "2х", "т34"
+_NOT_GLUED = r"(?![А-Яа-яЁё])"
+
+# Порядок важен: сначала самые специфичные шаблоны
+RULES: list[tuple[re.Pattern, Callable[[re.Match], str]]] = [
+    (re.compile(r"(?<!\d)(?:\+7|8)[\s-]?\(?(\d{3})\)?[\s-]?(\d{3})[\s-]?(\d{2})[\s-]?(\d{2})(?!\d)"),
+     _replace_phone),
+    # Точка после даты может быть концом предложения: "12.05.2023."
+    (re.compile(r"(?<![\d.])(\d{1,2})\.(\d{1,2})\.(\d{4})(?:\s?г\.)?(?!\d|\.\d)"), _replace_date),
+    (re.compile(rf"(?<![\d.])(\d{{1,2}})\s({'|'.join(MONTHS_GENITIVE[1:])})"
+                rf"(?:\s(\d{{4}})(?:\s?г\.|\sгода)?)?(?![А-Яа-яЁё\d])", re.IGNORECASE),
+     _replace_day_month),
+    (re.compile(r"(?<![\d:])(\d{1,2}):(\d{2})(?![\d:])"), _replace_time),
+    (re.compile(r"\b([IVXLC]+)\s+(век|века|веке|веков|веках)\b"), _replace_century),
+    (re.compile(r"(?<!\d)(\d{3,4})\s?(год|года|году|годом)(?![А-Яа-яЁё])", re.IGNORECASE), _replace_year),
+    # Точку после "г." оставляем, если она же заканчивает предложение
+    (re.compile(r"(?<!\d)(\d{4})\s?г(?:\.(?=\s*[а-яё,;:)])|(?=\.))"), _replace_year_abbreviation),
+    (re.compile(r"(?<![\d,])(\d+)-(ый|ой|ий|й|ая|я|ое|е|ого|го|ом|м|ых|х|ую|ю)(?![А-Яа-яЁё])"), _replace_ordinal),
+    (re.compile(rf"(?<![\d,])({_NUMBER}),(\d+)(?![\d,]){_UNIT_SUFFIX}{_NOT_GLUED}"), _replace_decimal),
+    (re.compile(r"(?<![\d/])(\d{1,2})/(\d{1,2})(?![\d/])"), _replace_slash),
+    (UNRESOLVED_NUMBERS_PATTERN, _reject_ambiguous),
+    # Дефис без пробелов или тире: "1-2 часа", "10 – 15 минут". "5 - 3" остается вычитанием
+    (re.compile(rf"(?<![\d-])({_NUMBER})(?:[-–—]|\s[–—]\s)({_NUMBER})(?![\d-]){_UNIT_SUFFIX}{_NOT_GLUED}"),
+     _replace_range),
+    # Отрицательные числа: "-5°"
+    (re.compile(r"(?<![\w-])[-−](?=\d)"), lambda match: "минус "),
+    (re.compile(rf"([$€₽])\s?({_NUMBER})(?!\d)"), _replace_currency_prefix),
+    (re.compile(rf"(?<!\d)({_NUMBER})(?!\d){_UNIT_SUFFIX}{_NOT_GLUED}"), _replace_cardinal),
+]
+
+_SYMBOL_PATTERN = re.compile("|".join(re.escape(symbol) for symbol in SYMBOLS))
+
+
+def _replace_symbol(match: re.Match) -> str:
+    return f" {SYMBOLS[match.group(0)]} "
+
+
+def normalize_text(text: str) -> Optional[str]:
+    """
+    Проговаривает числа и символы словами.
+    Возвращает None, если текст нельзя уверенно нормализовать без LLM.
+    """
+    if not UNRESOLVED_PATTERN.search(text):
+        return text
+
+    try:
+        for pattern, handler in RULES:
+            text = pattern.sub(handler, text)
+        text = _SYMBOL_PATTERN.sub(_replace_symbol, text)
+    except UnresolvedText:
+        return None
+
+    text = re.sub(r"[ \t]{2,}", " ", text).strip()
+    text = re.sub(r"\s+([,.!?;:])", r"\1", text)
+    if UNRESOLVED_PATTERN.search(text):
+        return None
+    return text
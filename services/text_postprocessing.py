@@ -1,12 +1,21 @@
+import contextlib
 import hashlib
-from typing import Generator, List
+import json
+import os
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Generator, Iterable, List, NamedTuple, Optional
 
 import typer
+from pydantic import ValidationError
 from tqdm import tqdm
 
-from models.base_llm_client import BaseLLMClient
+from models.base_llm_client import BaseLLMClient, estimate_tokens
 from models.dialogue_pair import DialoguePair
+from services.llm_cache import discard_cached_response
 from services.text_generator import TextGeneratedLLMResult
+from services.text_normalizer import normalize_text
+from utils import open_text_stream
 
 
 
@@ -124,10 +133,38 @@ NUMBERS_TO_WORDS_PROMPT = """
 """
 
 
+# Во сколько раз ответ длиннее входа: числа и символы раскрываются в слова
+OUTPUT_EXPANSION = 1.5
+# Запас на неточность оценки
+TOKEN_BUDGET_SAFETY = 0.8
+
+
+class RowCountMismatch(ValueError):
+    """Модель потеряла или склеила строки батча"""
+
+
+class BatchResult(NamedTuple):
+    pairs: List[DialoguePair]
+    llm_rows: int
+    rejected_rows: List[str]
+
+
+def batch_token_budget(llm_client: BaseLLMClient) -> int:
+    """
+    Сколько токенов входных строк помещается в один запрос с учетом
+    контекста модели и лимита длины ответа.
+    """
+    prompt_tokens = estimate_tokens(NUMBERS_TO_WORDS_PROMPT)
+    by_context = (llm_client.context_window - prompt_tokens) / (1 + OUTPUT_EXPANSION)
+    by_output = llm_client.max_output_tokens / OUTPUT_EXPANSION
+    return max(1, int(min(by_context, by_output) * TOKEN_BUDGET_SAFETY))
+
+
 def convert_numbers_to_words(
-    data: str, llm_client: BaseLLMClient, temperature: float = 0.3
+    data: List[str], llm_client: BaseLLMClient, temperature: float = 0.3
 ) -> List[DialoguePair]:
-    user_prompt = f"Преобразуй все числа и цифры в следующем тексте в их словесное представление:\n\n{data}"
+    rows = "\n".join(data)
+    user_prompt = f"Преобразуй все числа и цифры в следующем тексте в их словесное представление:\n\n{rows}"
     messages = [
         {"role": "system", "content": NUMBERS_TO_WORDS_PROMPT},
         {"role": "user", "content": user_prompt},
@@ -139,7 +176,34 @@ def convert_numbers_to_words(
         response_format=TextGeneratedLLMResult,
     )
 
-    return TextGeneratedLLMResult.model_validate_json(response).pairs
+    pairs = TextGeneratedLLMResult.model_validate_json(response).pairs
+    if len(pairs) != len(data):
+        # Модель потеряла или склеила строки - считаем батч неудачным
+        discard_cached_response(llm_client, messages, temperature=temperature,
+                                response_format=TextGeneratedLLMResult)
+        raise RowCountMismatch(f"ожидалось {len(data)} записей, получено {len(pairs)}")
+    return pairs
+
+
+def convert_with_bisection(
+    rows: List[str], llm_client: BaseLLMClient, rejected_rows: List[str]
+) -> List[DialoguePair]:
+    """
+    Обрабатывает строки в LLM; при ошибке рекурсивно делит батч пополам,
+    пока не найдет строку, которую модель обработать не может.
+    Такие строки складываются в rejected_rows.
+    Делятся только батчи с некорректным ответом модели; сетевые и прочие ошибки пробрасываются.
+    """
+    try:
+        return convert_numbers_to_words(rows, llm_client, temperature=0)
+    except (json.JSONDecodeError, ValidationError, RowCountMismatch) as e:
+        if len(rows) == 1:
+            typer.echo(f"\nСтрока отклонена: {e}")
+            rejected_rows.append(rows[0])
+            return []
+        middle = len(rows) // 2
+        return (convert_with_bisection(rows[:middle], llm_client, rejected_rows)
+                + convert_with_bisection(rows[middle:], llm_client, rejected_rows))
 
 
 def generate_text_hash(text: str) -> str:
@@ -158,45 +222,140 @@ def generate_text_hash(text: str) -> str:
     return hash_object.hexdigest()[:32]
 
 
-def process_jsonl_file(
-    jsonl_file_path: str,
-    llm_client: BaseLLMClient,
-    batch_size: int,
-) -> Generator[List[DialoguePair], None, None]:
-    with open(jsonl_file_path, "r", encoding="utf-8") as jsonl_file:
-        lines = jsonl_file.readlines()
-        total_rows = len(lines)
-
-        typer.echo(f"Начало обработки {total_rows} строк из файла {jsonl_file_path}...")
-        typer.echo(f"Размер батча: {batch_size}")
-
-        # Создаем прогресс-бар
-        with tqdm(total=total_rows, desc="Обработка строк", unit="строк") as pbar:
+def iter_jsonl_batches(
+    text_stream: Iterable[str], batch_size: int, token_budget: Optional[int] = None
+) -> Generator[List[str], None, None]:
+    """
+    Лениво собирает строки потока в батчи не более batch_size строк
+    и не более token_budget оценочных токенов.
+    В памяти одновременно находится только один батч.
+    """
+    batch = []
+    batch_tokens = 0
+    for row in text_stream:
+        row = row.strip()
+        if not row:
+            continue
+        row_tokens = estimate_tokens(row)
+        if batch and token_budget is not None and batch_tokens + row_tokens > token_budget:
+            yield batch
             batch = []
+            batch_tokens = 0
+        batch.append(row)
+        batch_tokens += row_tokens
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+            batch_tokens = 0
+    if batch:
+        yield batch
 
-            for index, row in enumerate(lines):
-                # Добавляем строку в батч как есть (уже в JSON формате)
-                batch.append(row.strip())
-
-                # Если батч заполнен или это последняя строка
-                if len(batch) == batch_size or index == total_rows - 1:
-                    if batch:  # Проверяем, что батч не пустой
-                        try:
-                            result = convert_numbers_to_words(
-                                batch, llm_client, temperature=0
-                            )
-
-                            # Обновляем прогресс-бар
-                            pbar.update(len(batch))
-
-                            yield result
 
-                        except Exception as e:
-                            typer.echo(f"\nОшибка при обработке батча: {e}")
-                            # Все равно обновляем прогресс
-                            pbar.update(len(batch))
+def split_by_rules(batch: List[str]) -> tuple[List[DialoguePair], List[str]]:
+    """
+    Нормализует строки батча правилами без LLM.
+    Возвращает готовые пары и строки, которые нужно отправить в LLM.
+    """
+    resolved = []
+    unresolved = []
+    for row in batch:
+        try:
+            pair = DialoguePair.model_validate_json(row)
+        except ValueError:
+            unresolved.append(row)
+            continue
+        user_query = normalize_text(pair.user_query)
+        ai_response = normalize_text(pair.ai_response)
+        if user_query is None or ai_response is None:
+            unresolved.append(row)
+            continue
+        resolved.append(DialoguePair(id=pair.id, user_query=user_query, ai_response=ai_response))
+    return resolved, unresolved
+
+
+def _convert_batch(
+    batch: List[str], llm_client: BaseLLMClient, use_rules: bool
+) -> BatchResult:
+    if use_rules:
+        resolved, unresolved = split_by_rules(batch)
+    else:
+        resolved, unresolved = [], batch
+    rejected_rows = []
+    if unresolved:
+        try:
+            resolved += convert_with_bisection(unresolved, llm_client, rejected_rows)
+        except Exception as e:
+            # Сеть или провайдер отказали после всех повторов: батч уходит в отклоненные,
+            # остальной файл обрабатывается дальше
+            tqdm.write(typer.style(f"✗ Ошибка при обработке батча из {len(unresolved)} строк: {e}",
+                                   fg=typer.colors.RED))
+            rejected_rows = list(unresolved)
+    return BatchResult(resolved, len(unresolved), rejected_rows)
 
-                        # Очищаем батч для следующей итерации
-                        batch = []
 
-        typer.echo(f"\nОбработка завершена. Всего обработано: {total_rows} строк")
\ No newline at end of file
+def process_jsonl_file(
+    jsonl_file_path: str,
+    llm_client: BaseLLMClient,
+    batch_size: int,
+    max_in_flight: int = 1,
+    use_rules: bool = True,
+    reject_file_path: Optional[str] = None,
+) -> Generator[List[DialoguePair], None, None]:
+    """
+    Обрабатывает JSONL файл батчами, держа в работе до max_in_flight батчей одновременно.
+    Результаты отдаются строго в порядке входных батчей, поэтому вывод
+    совпадает с последовательной обработкой.
+    При use_rules строки сначала нормализуются правилами, в LLM уходит только остаток.
+    Батч ограничен и числом строк, и оценкой токенов под контекст модели.
+    Строки, которые LLM так и не смогла обработать, пишутся в reject_file_path.
+    """
+    total_bytes = os.path.getsize(jsonl_file_path)
+    total_rows = 0
+    llm_rows = 0
+    rejected_count = 0
+    token_budget = batch_token_budget(llm_client)
+
+    typer.echo(f"Начало обработки файла {jsonl_file_path}...")
+    typer.echo(f"Размер батча: до {batch_size} строк и до {token_budget} токенов, "
+               f"батчей в работе: {max_in_flight}")
+
+    with open_text_stream(jsonl_file_path) as (text_stream, raw_file), \
+            ThreadPoolExecutor(max_workers=max_in_flight) as executor, \
+            (open(reject_file_path, "a", encoding="utf-8") if reject_file_path
+             else contextlib.nullcontext()) as reject_file:
+        # Прогресс считается по позиции в файле на диске, а не по числу строк,
+        # чтобы не читать файл целиком заранее
+        with tqdm(total=total_bytes, desc="Обработка строк", unit="B", unit_scale=True) as pbar:
+            # Очередь (future, позиция в файле после батча) в порядке отправки
+            in_flight: deque[tuple[Future, int]] = deque()
+
+            def complete_oldest() -> List[DialoguePair]:
+                nonlocal llm_rows, rejected_count
+                future, position = in_flight.popleft()
+                result: BatchResult = future.result()
+                llm_rows += result.llm_rows
+                rejected_count += len(result.rejected_rows)
+                if reject_file is not None:
+                    reject_file.writelines(row + "\n" for row in result.rejected_rows)
+                # Обновляем прогресс в любом случае
+                pbar.update(position - pbar.n)
+                return result.pairs
+
+            for batch in iter_jsonl_batches(text_stream, batch_size, token_budget):
+                total_rows += len(batch)
+                in_flight.append((executor.submit(_convert_batch, batch, llm_client, use_rules), raw_file.tell()))
+
+                if len(in_flight) >= max_in_flight:
+                    pairs = complete_oldest()
+                    if pairs:
+                        yield pairs
+
+            while in_flight:
+                pairs = complete_oldest()
+                if pairs:
+                    yield pairs
+
+    typer.echo(f"\nОбработка завершена. Всего обработано: {total_rows} строк, "
+               f"из них отправлено в LLM: {llm_rows}, отклонено: {rejected_count}")
+    if rejected_count and reject_file_path:
+        typer.echo(f"Отклоненные строки сохранены в: {reject_file_path}")
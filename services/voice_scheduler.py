@@ -0,0 +1,74 @@
+import heapq
+from typing import NamedTuple
+
+from models.row import BaseRow
+from services.synthesis_estimator import estimate_row
+
+
+class VoicePlan(NamedTuple):
+    voice: str
+    current_seconds: float
+    queued_seconds: float
+    target_seconds: float
+    rows: list[BaseRow]
+    assigned_seconds: float
+    assigned_chars: int
+
+
+def schedule_rows(
+    rows: list[BaseRow],
+    deficits: dict[str, float],
+    chars_per_second: dict[str, float],
+) -> dict[str, tuple[list[BaseRow], float, int]]:
+    """
+    Распределяет строки между голосами, пока каждый голос не доберет свой дефицит (в секундах).
+    Следующая строка достается голосу с наибольшим оставшимся дефицитом; голос, добравший
+    дефицит, больше строк не получает, поэтому синтезируется лишь столько символов,
+    сколько нужно до целей. Строки, которые по оценке нарушат требования, пропускаются.
+    Возвращает для каждого голоса (строки, ожидаемые секунды, символы).
+    """
+    assigned: dict[str, tuple[list[BaseRow], float, int]] = {voice: ([], 0.0, 0) for voice in deficits}
+    # Max-heap по оставшемуся дефициту
+    heap = [(-deficit, voice) for voice, deficit in deficits.items() if deficit > 0]
+    heapq.heapify(heap)
+    for row in rows:
+        if not heap:
+            break
+        skipped = []
+        while heap:
+            remaining, voice = heapq.heappop(heap)
+            estimate = estimate_row(row.text, chars_per_second[voice])
+            if estimate.violation():
+                # Темп у голосов разный: строка может подойти другому голосу
+                skipped.append((remaining, voice))
+                continue
+            voice_rows, seconds, chars = assigned[voice]
+            voice_rows.append(row)
+            assigned[voice] = (voice_rows, seconds + estimate.duration, chars + len(row.text))
+            remaining += estimate.duration
+            if remaining < 0:
+                heapq.heappush(heap, (remaining, voice))
+            break
+        for item in skipped:
+            heapq.heappush(heap, item)
+    return assigned
+
+
+def plan_voices(
+    rows: list[BaseRow],
+    current_seconds: dict[str, float],
+    queued_seconds: dict[str, float],
+    target_seconds: dict[str, float],
+    chars_per_second: dict[str, float],
+) -> list[VoicePlan]:
+    """План по голосам: дефицит = цель - уже синтезировано - уже стоит в очереди"""
+    deficits = {
+        voice: target - current_seconds.get(voice, 0.0) - queued_seconds.get(voice, 0.0)
+        for voice, target in target_seconds.items()
+    }
+    assigned = schedule_rows(rows, deficits, chars_per_second)
+    return [
+        VoicePlan(voice, current_seconds.get(voice, 0.0), queued_seconds.get(voice, 0.0), target,
+                  *assigned[voice])
+        for voice, target in target_seconds.items()
+    ]
@@ -0,0 +1,9 @@
+import os
+import tempfile
+
+# Кэши и манифест тестов не должны попадать в рабочие каталоги проекта.
+# Переменные задаются до импорта entrypoint.config.
+_TEST_DATA_DIR = tempfile.mkdtemp(prefix="tts-prep-tests-")
+os.environ["CACHE_DIR"] = os.path.join(_TEST_DATA_DIR, "cache")
+os.environ["MANIFEST_DIR"] = os.path.join(_TEST_DATA_DIR, "manifest")
+os.environ.setdefault("ELEVENLABS_TOKEN", "test-token")
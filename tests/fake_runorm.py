@@ -0,0 +1,147 @@
+import re
+
+NUMBERS = {
+    "1": "один", "2": "два", "3": "три", "9": "девять", "15": "пятнадцать", "2024": "две тысячи двадцать четыре",
+}
+
+
+class FakeTensor(list):
+    def to(self, device):
+        return self
+
+
+class FakeIds(str):
+    def tolist(self):
+        return str(self)
+
+
+class FakeTokenizer:
+    """Токенизатор, который не токенизирует: "id" - сам текст промпта"""
+
+    def __call__(self, prompts, return_tensors=None, padding=False):
+        if isinstance(prompts, str):
+            return {"input_ids": FakeTensor([prompts])}
+        return {"input_ids": FakeTensor(prompts), "attention_mask": FakeTensor(prompts)}
+
+    def decode(self, ids):
+        return ids
+
+
+class FakeSeq2Seq:
+    """Отвечает на каждый <extra_id_N> словом "норм(...)" с паддингом, как T5 в батче"""
+
+    device = "cpu"
+
+    def __init__(self):
+        self.calls = 0
+
+    def generate(self, input_ids, attention_mask=None, **kwargs):
+        self.calls += 1
+        return [
+            FakeIds("<pad>" + "".join(f"<extra_id_{match[2]}> норм({match[1]})"
+                                      for match in re.finditer(r"\[([^\]]+)\]<extra_id_(\d+)>", prompt))
+                    + "</s><pad><pad>")
+            for prompt in input_ids
+        ]
+
+
+class FakeRuleNormalizer:
+    def normalize(self, text):
+        return text.replace("№", "номер")
+
+
+class FakeRUNorm:
+    """
+    Повторяет стадии RUNorm 1.1, на которые опирается normalize_texts, с моделями-заглушками.
+    norm, predict_abbr, proccess_abbr и construct_answer повторяют логику RUNorm.
+    """
+
+    model_size = "small"
+
+    def __init__(self):
+        self.rule_normalizer = FakeRuleNormalizer()
+        self.abbr_tokenizer = FakeTokenizer()
+        self.abbr_model = FakeSeq2Seq()
+
+    def split_by_sentences(self, text):
+        return [sentence for sentence in re.split(r"(?<=[.!?])\s+", text) if sentence]
+
+    def tagger(self, texts, batch_size=None):
+        # После capitalize аббревиатур в верхнем регистре не остается, поэтому теггер
+        # размечает числа, раскрытые на первой стадии: так работает и вторая стадия
+        def tag(text):
+            return [
+                {"entity_group": "CARDINAL" if word.group().startswith("норм(") else "PLAIN",
+                 "word": word.group(), "start": word.start(), "end": word.end()}
+                for word in re.finditer(r"\S+", text)
+            ]
+        return [tag(text) for text in texts] if isinstance(texts, list) else tag(texts)
+
+    def process_tags(self, tags):
+        return tags
+
+    def construct_prompt(self, text, angl_mode=False):
+        if angl_mode:
+            return re.sub(r"[A-Za-z]+", lambda match: f"англ({match[0].lower()})", text), False
+        extra_id = 0
+        used = False
+
+        def replace(match):
+            nonlocal extra_id, used
+            used = True
+            extra_id += 1
+            return f"[{NUMBERS.get(match[0], match[0])}]<extra_id_{extra_id - 1}>"
+        return re.sub(r"\d+", replace, text), used
+
+    def construct_answer(self, prompt, prediction):
+        re_prompt = re.compile(r"\[([^\]]+)\]<extra_id_(\d+)>")
+        re_pred = re.compile(r"\<extra_id_(\d+)\>(.+?)(?=\<extra_id_\d+\>|</s>)")
+        pred_data = {}
+        for match in re.finditer(re_pred, prediction.replace("\n", " ")):
+            pred_data[match[1]] = match[2].strip()
+        while True:
+            match = re.search(re_prompt, prompt)
+            if not match:
+                break
+            replace = pred_data.get(match[2], match[1])
+            prompt = prompt[:match.span()[0]] + replace + prompt[match.span()[1]:]
+        return prompt
+
+    def predict_abbr(self, prompt):
+        if self.model_size != "medium":
+            prompt = "<SC1>" + prompt
+        data = self.abbr_tokenizer(prompt, return_tensors="pt")
+        data = {key: value.to(self.abbr_model.device) for key, value in data.items()}
+        output_ids = self.abbr_model.generate(**data, do_sample=False, max_new_tokens=512)[0]
+        return self.abbr_tokenizer.decode(output_ids.tolist()).replace("<s>", "").replace("<pad>", "")
+
+    def proccess_abbr(self, text):
+        tags = self.tagger(text)
+        for tag in tags:
+            if tag["entity_group"] not in ("PLAIN", "TIME"):
+                tag["entity_group"] = "TAG"
+        prompt = ""
+        current_index = 0
+        extra_id = 0
+        for entity in self.process_tags(tags):
+            prompt += text[current_index:entity["start"]]
+            if entity["entity_group"] == "TAG":
+                prompt += f"[{entity['word']}]<extra_id_{extra_id}>"
+                extra_id += 1
+            else:
+                prompt += entity["word"]
+            current_index = entity["end"]
+        prompt += text[current_index:]
+        if extra_id:
+            return self.construct_answer(prompt, self.predict_abbr(prompt))
+        return text
+
+    def norm(self, message):
+        out = ""
+        for sentence in self.split_by_sentences(message):
+            sentence = self.rule_normalizer.normalize(sentence).capitalize()
+            prompt, used = self.construct_prompt(sentence)
+            answer = self.construct_answer(prompt, self.predict_abbr(prompt)) if used else sentence
+            final_answer, _ = self.construct_prompt(self.proccess_abbr(answer), angl_mode=True)
+            out = out + " " + final_answer
+        return out.strip()
@@ -0,0 +1,97 @@
+import json
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+VOICE_ID = "fake-voice"
+# pcm_48000: 2 байта на сэмпл, 0.1с аудио на каждый символ текста
+BYTES_PER_CHAR = 9600
+CHUNK_SIZE = 4097
+
+
+class FakeTtsServer:
+    """
+    Локальная замена API ElevenLabs: поиск голоса и потоковый синтез в PCM.
+    errors[text] - очередь HTTP статусов, которыми отвечают на запросы этого текста
+    до первого успешного ответа.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.errors: dict[str, list[int]] = {}
+        self.requests: dict[str, int] = defaultdict(int)
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def __enter__(self) -> "FakeTtsServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status: int, payload: dict) -> None:
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path.startswith("/v2/voices"):
+                    self._send_json(200, {
+                        "voices": [{"voice_id": VOICE_ID, "name": "Soft Female Russian voice"}],
+                        "has_more": False,
+                        "total_count": 1,
+                    })
+                else:
+                    self._send_json(404, {"detail": "not found"})
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                text = body["text"]
+                with server._lock:
+                    server.requests[text] += 1
+                    pending_errors = server.errors.get(text)
+                    status = pending_errors.pop(0) if pending_errors else 200
+                    server.in_flight += 1
+                    server.max_in_flight = max(server.max_in_flight, server.in_flight)
+                try:
+                    time.sleep(server.latency)
+                    if status != 200:
+                        self._send_json(status, {"detail": "fake error"})
+                        return
+                    audio = bytes(len(text) * BYTES_PER_CHAR)
+                    self.send_response(200)
+                    self.send_header("Content-Type", "audio/pcm")
+                    self.send_header("Transfer-Encoding", "chunked")
+                    self.end_headers()
+                    # Нечетный размер чанка: сэмплы рвутся на границах чанков
+                    for start in range(0, len(audio), CHUNK_SIZE):
+                        chunk = audio[start:start + CHUNK_SIZE]
+                        self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+                    self.wfile.write(b"0\r\n\r\n")
+                finally:
+                    with server._lock:
+                        server.in_flight -= 1
+
+        return Handler
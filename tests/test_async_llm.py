@@ -0,0 +1,100 @@
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from models.llm_provider import LLMProvider
+from models.mock_client import MockLLMClient
+from services import rate_limiter
+from services.llm_client import create_llm_client
+from services.text_generator import TextGeneratedLLMResult
+from services.text_postprocessing import process_jsonl_file
+
+LATENCY = 0.05
+
+
+class CountingClient(MockLLMClient):
+    """Мок, запоминающий наибольшее число одновременных запросов"""
+
+    def __init__(self):
+        super().__init__(latency=LATENCY)
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def achat(self, messages, temperature=0.7, response_format=None):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            return await super().achat(messages, temperature=temperature, response_format=response_format)
+        finally:
+            self.in_flight -= 1
+
+
+def messages(index: int) -> list[dict[str, str]]:
+    return [{"role": "user", "content": f"Сгенерируй 1 пар запрос-ответ, запрос {index}"}]
+
+
+@pytest.fixture(autouse=True)
+def fresh_limiters(monkeypatch):
+    monkeypatch.setattr(rate_limiter, "_limiters", {})
+
+
+def test_achat_fan_out_runs_concurrently(tmp_path, monkeypatch):
+    monkeypatch.setattr("services.llm_client.CACHE_DIR", str(tmp_path))
+    client = create_llm_client(LLMProvider.MOCK, cache=True, latency=LATENCY)
+
+    async def fan_out():
+        return await asyncio.gather(*(
+            client.achat(messages(index), temperature=0, response_format=TextGeneratedLLMResult)
+            for index in range(500)
+        ))
+
+    started_at = time.perf_counter()
+    responses = asyncio.run(fan_out())
+    # Последовательно это заняло бы 500 * LATENCY = 25 с
+    assert time.perf_counter() - started_at < 5
+    assert len(set(responses)) == 500
+    for response in responses:
+        assert len(TextGeneratedLLMResult.model_validate_json(response).pairs) == 1
+
+    # Повторная волна целиком обслуживается кэшем
+    assert asyncio.run(fan_out()) == responses
+
+
+def test_sync_chat_from_threads_shares_one_loop():
+    client = CountingClient()
+    started_at = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=32) as executor:
+        responses = list(executor.map(
+            lambda index: client.chat(messages(index), response_format=TextGeneratedLLMResult), range(64)))
+    assert time.perf_counter() - started_at < 64 * LATENCY / 4
+    assert client.max_in_flight > 1
+    assert len(set(responses)) == 64
+
+
+def test_sync_chat_inside_achat_is_rejected():
+    client = MockLLMClient(latency=0)
+
+    class NestedClient(MockLLMClient):
+        async def achat(self, messages, temperature=0.7, response_format=None):
+            return client.chat(messages)
+
+    with pytest.raises(RuntimeError):
+        NestedClient(latency=0).chat(messages(0))
+
+
+def test_batches_in_flight_keep_input_order(tmp_path):
+    input_path = tmp_path / "input.jsonl"
+    rows = [{"id": index, "user_query": f"Вопрос {index} без чисел?", "ai_response": f"Ответ номер {index}"}
+            for index in range(40)]
+    input_path.write_text("".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows), encoding="utf-8")
+    client = CountingClient()
+
+    pairs = [pair for batch in process_jsonl_file(str(input_path), client, batch_size=4, max_in_flight=5,
+                                                  use_rules=False)
+             for pair in batch]
+
+    assert [pair.id for pair in pairs] == list(range(40))
+    assert client.max_in_flight > 1
@@ -0,0 +1,53 @@
+import json
+import os
+import sqlite3
+
+from typer.testing import CliRunner
+
+from commands import index_commands
+from services import global_index
+from services.global_index import AUDIO_INDEX, GlobalTextIndex, dataset_source, open_global_index
+
+
+def test_same_source_is_not_a_duplicate(tmp_path):
+    with GlobalTextIndex(str(tmp_path / "dataset.sqlite")) as index:
+        index.add("Привет", dataset_source("Спорт.jsonl"))
+        assert not index.seen_elsewhere("Привет", dataset_source("Спорт.jsonl.gz"))
+        assert not index.seen_elsewhere("Привет", dataset_source("Спорт_processed_1a2b3c4d.jsonl"))
+        assert index.seen_elsewhere("Привет", dataset_source("Кино.jsonl"))
+        assert not index.seen_elsewhere("Пока", dataset_source("Кино.jsonl"))
+
+
+def test_index_without_sources_is_migrated(tmp_path):
+    path = str(tmp_path / "dataset.sqlite")
+    with GlobalTextIndex(path) as index:
+        index.add("Привет")
+    connection = sqlite3.connect(path)
+    connection.execute("DROP TABLE digests")
+    connection.execute("CREATE TABLE digests (digest BLOB PRIMARY KEY) WITHOUT ROWID")
+    connection.commit()
+    connection.close()
+
+    with GlobalTextIndex(path) as index:
+        index.add("Привет")
+        assert index.seen_elsewhere("Привет", "Спорт")
+
+
+def test_rebuild_takes_audio_source_from_metadata_rows(tmp_path, monkeypatch):
+    monkeypatch.setattr(global_index, "CACHE_DIR", str(tmp_path / "cache"))
+    output_path = tmp_path / "output"
+    # Строка, повторно озвученная после QC, лежит в директории файла возврата
+    os.makedirs(output_path / "Спорт_qc_rejected")
+    (output_path / "Спорт_qc_rejected" / "metadata.jsonl").write_text(
+        json.dumps({"id": "1", "text": "Привет", "source": "Спорт"}, ensure_ascii=False) + "\n"
+        + json.dumps({"id": "2", "text": "Пока"}, ensure_ascii=False) + "\n",
+        encoding="utf-8")
+
+    result = CliRunner().invoke(index_commands.app, [
+        "--datasets-path", str(tmp_path / "datasets"), "--output-path", str(output_path)])
+    assert result.exit_code == 0, result.output
+
+    with open_global_index(AUDIO_INDEX) as index:
+        assert not index.seen_elsewhere("Привет", "Спорт")
+        assert index.seen_elsewhere("Привет", "Спорт_qc_rejected")
+        assert not index.seen_elsewhere("Пока", "Спорт_qc_rejected")
@@ -0,0 +1,122 @@
+import os
+
+import pytest
+from typer.testing import CliRunner
+
+from commands import hf_commands
+from services.shard_packer import load_pack_state, save_pack_state
+
+runner = CliRunner()
+
+
+def write(path, content: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(content)
+
+
+def upload(dataset_path, hub_path, *args):
+    result = runner.invoke(hf_commands.app, [
+        "upload-folder",
+        "--input-path", str(dataset_path),
+        "--hub-repository-id", "unused",
+        "--local-hub", str(hub_path),
+        *args,
+    ])
+    assert result.exit_code == 0, result.output
+    return result.output
+
+
+def hub_files(hub_path) -> dict[str, bytes]:
+    files = {}
+    for directory, _, names in os.walk(hub_path):
+        for name in names:
+            with open(os.path.join(directory, name), "rb") as f:
+                files[os.path.relpath(os.path.join(directory, name), hub_path)] = f.read()
+    return files
+
+
+@pytest.fixture
+def dataset_path(tmp_path):
+    path = tmp_path / "output"
+    write(path / "den4ikai" / "metadata.jsonl", b'{"id": "1"}\n')
+    write(path / "den4ikai" / "audio" / "1.wav", b"RIFF1")
+    write(path / "den4ikai" / "audio" / "2.wav", b"RIFF2")
+    # Служебные файлы пайплайна на hub не попадают
+    write(path / "den4ikai" / "den4ikai.progress", b"0\t10\t1\n")
+    write(path / "den4ikai" / "den4ikai.rejected.jsonl", b"{}\n")
+    write(path / "den4ikai" / "qc_report.jsonl", b"{}\n")
+    return path
+
+
+@pytest.mark.parametrize("against_remote", [False, True])
+def test_only_new_and_changed_files_are_uploaded(dataset_path, tmp_path, against_remote):
+    hub_path = tmp_path / "hub"
+    extra_args = ["--against-remote"] if against_remote else []
+
+    output = upload(dataset_path, hub_path, *extra_args)
+    assert "К загрузке: 3, к удалению: 0, без изменений: 0" in output
+    assert sorted(hub_files(hub_path)) == [
+        "den4ikai/audio/1.wav", "den4ikai/audio/2.wav", "den4ikai/metadata.jsonl"]
+
+    output = upload(dataset_path, hub_path, *extra_args)
+    assert "К загрузке: 0, к удалению: 0, без изменений: 3" in output
+
+    write(dataset_path / "den4ikai" / "audio" / "1.wav", b"RIFF1-trimmed")
+    write(dataset_path / "den4ikai" / "audio" / "3.wav", b"RIFF3")
+    os.remove(dataset_path / "den4ikai" / "audio" / "2.wav")
+    output = upload(dataset_path, hub_path, "--delete-missing", *extra_args)
+    assert "К загрузке: 2, к удалению: 1, без изменений: 1" in output
+    assert hub_files(hub_path) == {
+        "den4ikai/audio/1.wav": b"RIFF1-trimmed",
+        "den4ikai/audio/3.wav": b"RIFF3",
+        "den4ikai/metadata.jsonl": b'{"id": "1"}\n',
+    }
+
+
+def test_dry_run_does_not_upload(dataset_path, tmp_path):
+    hub_path = tmp_path / "hub"
+    output = upload(dataset_path, hub_path, "--dry-run")
+    assert "К загрузке: 3" in output
+    assert hub_files(hub_path) == {}
+
+
+def upload_shards(pack_path, hub_path):
+    result = runner.invoke(hf_commands.app, [
+        "upload-shards",
+        "--pack-path", str(pack_path),
+        "--hub-repository-id", "unused",
+        "--local-hub", str(hub_path),
+    ])
+    assert result.exit_code == 0, result.output
+    return result.output
+
+
+def test_upload_shards_to_local_hub(tmp_path):
+    pack_path = tmp_path / "packed"
+    hub_path = tmp_path / "hub"
+    write(pack_path / "data" / "train-00000.parquet", b"PAR1-0")
+    save_pack_state(str(pack_path), {"rows": {}, "next_shard": 1,
+                                     "pending_upload": ["train-00000.parquet"], "pending_delete": []})
+
+    output = upload_shards(pack_path, hub_path)
+    assert "Загружено шардов: 1, удалено: 0" in output
+    assert hub_files(hub_path) == {"data/train-00000.parquet": b"PAR1-0"}
+    assert load_pack_state(str(pack_path))["pending_upload"] == []
+    assert "Новых шардов нет" in upload_shards(pack_path, hub_path)
+
+    # Строки шарда 0 переупакованы в шард 1: одним коммитом добавляется новый и удаляется старый
+    write(pack_path / "data" / "train-00001.parquet", b"PAR1-1")
+    os.remove(pack_path / "data" / "train-00000.parquet")
+    save_pack_state(str(pack_path), {"rows": {}, "next_shard": 2,
+                                     "pending_upload": ["train-00001.parquet"],
+                                     "pending_delete": ["train-00000.parquet"]})
+    output = upload_shards(pack_path, hub_path)
+    assert "Загружено шардов: 1, удалено: 1" in output
+    assert hub_files(hub_path) == {"data/train-00001.parquet": b"PAR1-1"}
+
+    # Запуск прервался после коммита, но до сохранения состояния: журнал не дает загрузить шард повторно
+    save_pack_state(str(pack_path), {"rows": {}, "next_shard": 2,
+                                     "pending_upload": ["train-00001.parquet"], "pending_delete": []})
+    output = upload_shards(pack_path, hub_path)
+    assert "Загружено шардов: 0, удалено: 0" in output
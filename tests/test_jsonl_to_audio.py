@@ -0,0 +1,134 @@
+import json
+import os
+import wave
+
+import pytest
+from typer.testing import CliRunner
+
+from commands import elevenlabs_commands
+from models.row import RequeueRow
+from services import elevenlabs_service, global_index, rate_limiter
+from tests.fake_tts_server import BYTES_PER_CHAR, FakeTtsServer
+
+runner = CliRunner()
+
+TEXTS = [f"Тестовая строка номер {index}." for index in range(12)]
+
+
+@pytest.fixture
+def tts_server(monkeypatch):
+    with FakeTtsServer(latency=0.05) as server:
+        monkeypatch.setattr(elevenlabs_service, "ELEVENLABS_BASE_URL", server.base_url)
+        monkeypatch.setattr(rate_limiter, "_limiters", {})
+        monkeypatch.setattr(rate_limiter, "retry_delay", lambda attempt, base=1.0, cap=60.0: 0.0)
+        yield server
+
+
+@pytest.fixture
+def payload_path(tmp_path):
+    path = tmp_path / "fake_source.jsonl"
+    with open(path, "w", encoding="utf-8") as payload_file:
+        for index, text in enumerate(TEXTS):
+            payload_file.write(json.dumps({"id": str(index), "text": text}, ensure_ascii=False) + "\n")
+    return str(path)
+
+
+def run_jsonl_to_audio(payload_path: str, output_path: str, concurrency: int, limit: int = 100,
+                       audio_cache: bool = False, skip_synthesized: bool = False):
+    return runner.invoke(elevenlabs_commands.app, [
+        "jsonl-to-audio",
+        "--input-file-name", payload_path,
+        "--output-path", output_path,
+        "--voice-name", "Soft Female Russian voice",
+        "--limit", str(limit),
+        "--concurrency", str(concurrency),
+        "--audio-cache" if audio_cache else "--no-audio-cache",
+        "--skip-synthesized" if skip_synthesized else "--no-skip-synthesized",
+        "--manifest-path", os.path.join(output_path, "manifest"),
+    ])
+
+
+def read_metadata(output_path: str, source: str = "fake_source") -> list[dict]:
+    with open(os.path.join(output_path, source, "metadata.jsonl"), encoding="utf-8") as metadata_file:
+        return [json.loads(line) for line in metadata_file]
+
+
+def test_concurrent_synthesis_keeps_input_order(tts_server, payload_path, tmp_path):
+    output_path = str(tmp_path / "out")
+    result = run_jsonl_to_audio(payload_path, output_path, concurrency=4)
+
+    assert result.exit_code == 0, result.output
+    assert tts_server.max_in_flight > 1
+    rows = read_metadata(output_path)
+    assert [row["text"] for row in rows] == TEXTS
+    for row in rows:
+        with wave.open(os.path.join(output_path, "fake_source", row["file_name"])) as wav_file:
+            assert wav_file.getframerate() == 48000
+            assert wav_file.getnframes() * 2 == len(row["text"]) * BYTES_PER_CHAR
+
+
+def test_throttled_rows_are_retried(tts_server, payload_path, tmp_path):
+    tts_server.errors[TEXTS[3]] = [429, 503]
+    output_path = str(tmp_path / "out")
+    result = run_jsonl_to_audio(payload_path, output_path, concurrency=3)
+
+    assert result.exit_code == 0, result.output
+    assert tts_server.requests[TEXTS[3]] == 3
+    assert [row["text"] for row in read_metadata(output_path)] == TEXTS
+
+
+def test_failed_row_does_not_stop_run_and_is_resumed(tts_server, payload_path, tmp_path):
+    tts_server.errors[TEXTS[5]] = [400]
+    output_path = str(tmp_path / "out")
+    result = run_jsonl_to_audio(payload_path, output_path, concurrency=4)
+
+    assert result.exit_code == 0, result.output
+    assert "ошибок: 1" in result.output
+    assert [row["text"] for row in read_metadata(output_path)] == TEXTS[:5] + TEXTS[6:]
+
+    # Строка с ошибкой не попала в журнал: следующий запуск синтезирует только ее
+    result = run_jsonl_to_audio(payload_path, output_path, concurrency=4)
+    assert result.exit_code == 0, result.output
+    assert tts_server.requests[TEXTS[5]] == 2
+    assert tts_server.requests[TEXTS[0]] == 1
+    assert [row["text"] for row in read_metadata(output_path)][-1] == TEXTS[5]
+
+
+def test_qc_requeue_bypasses_audio_cache_and_keeps_source(tts_server, tmp_path):
+    texts = ["Строка для кэша.", "Строка, забракованная при проверке."]
+    output_path = str(tmp_path / "out")
+    payload_path = tmp_path / "fake_source.jsonl"
+    payload_path.write_text("".join(
+        RequeueRow(id=str(index), text=text).to_jsonl() for index, text in enumerate(texts)), encoding="utf-8")
+    result = run_jsonl_to_audio(str(payload_path), output_path, concurrency=2, audio_cache=True)
+    assert result.exit_code == 0, result.output
+
+    # Файл в формате, который пишет audio qc
+    requeue_path = tmp_path / "fake_source_qc_rejected.jsonl"
+    requeue_path.write_text(
+        RequeueRow(id="0", text=texts[0]).to_jsonl()
+        + RequeueRow(id="1", text=texts[1], source="fake_source", bypass_audio_cache=True).to_jsonl(),
+        encoding="utf-8")
+    result = run_jsonl_to_audio(str(requeue_path), output_path, concurrency=2, audio_cache=True)
+    assert result.exit_code == 0, result.output
+
+    assert tts_server.requests[texts[0]] == 1
+    assert tts_server.requests[texts[1]] == 2
+    rows = read_metadata(output_path, "fake_source_qc_rejected")
+    assert [row["source"] for row in rows] == ["fake_source_qc_rejected", "fake_source"]
+
+
+def test_duplicate_texts_in_one_run_are_synthesized_once(tts_server, tmp_path, monkeypatch):
+    monkeypatch.setattr(global_index, "CACHE_DIR", str(tmp_path / "cache"))
+    texts = [TEXTS[0], TEXTS[1], TEXTS[2], TEXTS[1]]
+    payload_path = tmp_path / "fake_source.jsonl"
+    payload_path.write_text("".join(
+        json.dumps({"id": str(index), "text": text}, ensure_ascii=False) + "\n" for index, text in enumerate(texts)),
+        encoding="utf-8")
+    output_path = str(tmp_path / "out")
+    result = run_jsonl_to_audio(str(payload_path), output_path, concurrency=4, skip_synthesized=True)
+
+    assert result.exit_code == 0, result.output
+    assert tts_server.requests[TEXTS[1]] == 1
+    assert [row["text"] for row in read_metadata(output_path)] == texts[:3]
+    assert "Пропущено уже озвученных текстов: 1" in result.output
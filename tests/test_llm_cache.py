@@ -0,0 +1,91 @@
+import sqlite3
+
+from models.mock_client import MockLLMClient
+from services.llm_cache import CachedLLMClient, LLMResponseCache, discard_cached_response
+from services.text_generator import TextGeneratedLLMResult
+
+MESSAGES = [{"role": "user", "content": "Сгенерируй 2 пар запрос-ответ"}]
+
+
+class FlakyClient(MockLLMClient):
+    """Первый ответ - битый JSON, дальше - нормальные ответы мока"""
+
+    def __init__(self):
+        super().__init__(latency=0)
+        self.calls = 0
+
+    async def achat(self, messages, temperature=0.7, response_format=None):
+        self.calls += 1
+        if self.calls == 1:
+            return '{"pairs": [{"id": 1, "user_query": "обрыв'
+        return await super().achat(messages, temperature=temperature, response_format=response_format)
+
+
+def make_client(tmp_path, inner):
+    return CachedLLMClient(inner, "mock", LLMResponseCache(str(tmp_path / "llm.sqlite"), 1024 ** 2))
+
+
+def test_invalid_response_is_not_cached(tmp_path):
+    inner = FlakyClient()
+    client = make_client(tmp_path, inner)
+
+    client.chat(MESSAGES, temperature=0, response_format=TextGeneratedLLMResult)
+    response = client.chat(MESSAGES, temperature=0, response_format=TextGeneratedLLMResult)
+    assert client.chat(MESSAGES, temperature=0, response_format=TextGeneratedLLMResult) == response
+    assert inner.calls == 2
+    assert (client.cache.hits, client.cache.misses) == (1, 2)
+
+
+def test_rejected_response_is_discarded(tmp_path):
+    inner = FlakyClient()
+    inner.calls = 1
+    client = make_client(tmp_path, inner)
+
+    client.chat(MESSAGES, temperature=0, response_format=TextGeneratedLLMResult)
+    discard_cached_response(client, MESSAGES, temperature=0, response_format=TextGeneratedLLMResult)
+    client.chat(MESSAGES, temperature=0, response_format=TextGeneratedLLMResult)
+    assert inner.calls == 3
+
+
+def test_lru_eviction_keeps_size_under_limit(tmp_path):
+    cache = LLMResponseCache(str(tmp_path / "llm.sqlite"), max_size_bytes=100)
+    for index in range(5):
+        cache.put(f"key{index}", "x" * 40)
+    assert cache.get("key0") is None
+    assert cache.get("key4") == "x" * 40
+    assert cache.evictions == 3
+
+
+def test_hits_are_recorded_in_batches(tmp_path, monkeypatch):
+    monkeypatch.setattr(LLMResponseCache, "ACCESS_FLUSH_EVERY", 2)
+    path = str(tmp_path / "llm.sqlite")
+    cache = LLMResponseCache(path, max_size_bytes=1024)
+    for index in range(3):
+        cache.put(f"key{index}", "x")
+
+    def last_access():
+        with sqlite3.connect(path) as connection:
+            return dict(connection.execute("SELECT key, last_access FROM responses"))
+
+    before = last_access()
+    cache.get("key0")
+    # Одно попадание еще не записано
+    assert last_access() == before
+    cache.get("key1")
+    after = last_access()
+    assert after["key0"] > before["key0"] and after["key1"] > before["key1"]
+
+    cache.get("key2")
+    cache.close()
+    assert last_access()["key2"] > before["key2"]
+
+
+def test_pending_hits_protect_from_eviction(tmp_path):
+    cache = LLMResponseCache(str(tmp_path / "llm.sqlite"), max_size_bytes=100)
+    cache.put("key0", "x" * 40)
+    cache.put("key1", "x" * 40)
+    # Попадание еще в памяти, но вытеснение должно его учесть
+    assert cache.get("key0") is not None
+    cache.put("key2", "x" * 40)
+    assert cache.get("key0") is not None
+    assert cache.get("key1") is None
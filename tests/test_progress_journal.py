@@ -0,0 +1,59 @@
+import json
+
+import pytest
+
+from services.progress_journal import ProgressJournal
+
+
+def write_rows(path, rows):
+    with open(path, "w", encoding="utf-8") as payload_file:
+        for row_id, text in rows:
+            payload_file.write(json.dumps({"id": row_id, "text": text}, ensure_ascii=False) + "\n")
+
+
+def process(journal_path, payload_path, count):
+    with ProgressJournal(str(journal_path)) as journal:
+        journal.load(str(payload_path))
+        for index, (start, end, line) in enumerate(journal.iter_pending(str(payload_path))):
+            if index == count:
+                break
+            journal.record(start, end, json.loads(line)["id"], line)
+
+
+def pending_ids(journal_path, payload_path):
+    journal = ProgressJournal(str(journal_path))
+    journal.load(str(payload_path))
+    return [json.loads(line)["id"] for _, _, line in journal.iter_pending(str(payload_path))]
+
+
+def test_resume_skips_done_rows_and_sees_appended(tmp_path):
+    payload_path, journal_path = tmp_path / "payload.jsonl", tmp_path / "payload.progress"
+    write_rows(payload_path, [(str(i), f"текст {i}") for i in range(5)])
+    process(journal_path, payload_path, 3)
+
+    with open(payload_path, "a", encoding="utf-8") as payload_file:
+        payload_file.write(json.dumps({"id": "5", "text": "текст 5"}, ensure_ascii=False) + "\n")
+    assert pending_ids(journal_path, payload_path) == ["3", "4", "5"]
+
+
+def test_replaced_payload_of_same_size_is_refused(tmp_path):
+    payload_path, journal_path = tmp_path / "payload.jsonl", tmp_path / "payload.progress"
+    write_rows(payload_path, [(str(i), f"текст {i}") for i in range(5)])
+    process(journal_path, payload_path, 3)
+
+    # Те же id и та же длина строк, другой текст
+    write_rows(payload_path, [(str(i), f"текст {i + 5}") for i in range(5)])
+    with pytest.raises(ValueError, match="не соответствует"):
+        pending_ids(journal_path, payload_path)
+
+
+def test_old_format_records_are_checked_by_id(tmp_path):
+    payload_path, journal_path = tmp_path / "payload.jsonl", tmp_path / "payload.progress"
+    write_rows(payload_path, [("a", "один"), ("b", "два")])
+    first_line_size = len(payload_path.read_bytes().split(b"\n")[0]) + 1
+    journal_path.write_text(f"0\t{first_line_size}\ta\n", encoding="utf-8")
+    assert pending_ids(journal_path, payload_path) == ["b"]
+
+    write_rows(payload_path, [("x", "один"), ("b", "два")])
+    with pytest.raises(ValueError):
+        pending_ids(journal_path, payload_path)
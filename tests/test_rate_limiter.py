@@ -0,0 +1,79 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from models.llm_provider import LLMProvider
+from services import rate_limiter
+from services.llm_client import PROVIDER_RATE_LIMITS, create_llm_client
+from services.rate_limiter import RateLimiter, RateLimits
+
+
+@pytest.fixture(autouse=True)
+def fresh_limiters(monkeypatch):
+    monkeypatch.setattr(rate_limiter, "_limiters", {})
+
+
+def test_cli_concurrency_overrides_provider_cap():
+    assert PROVIDER_RATE_LIMITS[LLMProvider.OLLAMA].max_concurrency < 8
+
+    client = create_llm_client(LLMProvider.OLLAMA, max_concurrency=8)
+    assert client.limiter.limits.max_concurrency == 8
+
+    # Лимитер общий на процесс: следующий клиент с другим значением его перенастраивает
+    client = create_llm_client(LLMProvider.OLLAMA, max_concurrency=1)
+    assert client.limiter.limits.max_concurrency == 1
+    assert client.limiter.concurrency == 1
+
+
+def test_run_sync_hands_slots_over_without_polling():
+    limiter = RateLimiter("test", RateLimits(initial_concurrency=1, max_concurrency=1))
+    lock = threading.Lock()
+    in_flight = []
+
+    def call():
+        with lock:
+            in_flight.append(limiter.in_flight)
+        time.sleep(0.005)
+
+    started_at = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        # По одному вызову на поток: каждый следующий ждет, пока освободится слот
+        list(executor.map(lambda _: limiter.run_sync(call), range(8)))
+
+    assert in_flight == [1] * 8
+    # Опрос раз в 50 мс дал бы около 7 * 0.05 = 0.35 с
+    assert time.perf_counter() - started_at < 0.2
+    assert limiter.in_flight == 0
+
+
+def test_run_hands_slots_over_without_polling():
+    limiter = RateLimiter("test", RateLimits(initial_concurrency=1, max_concurrency=1))
+    in_flight = []
+
+    async def call():
+        in_flight.append(limiter.in_flight)
+        await asyncio.sleep(0.005)
+
+    async def fan_out():
+        await asyncio.gather(*(limiter.run(call) for _ in range(8)))
+
+    started_at = time.perf_counter()
+    asyncio.run(fan_out())
+    assert in_flight == [1] * 8
+    assert time.perf_counter() - started_at < 0.2
+    assert limiter.in_flight == 0
+
+
+def test_slot_is_free_while_waiting_for_quota():
+    limiter = RateLimiter("test", RateLimits(tokens_per_minute=600, initial_concurrency=1, max_concurrency=1))
+    # Опустошаем корзину: следующий запрос на 3 токена ждет 0.3 с
+    limiter._reserve(600)
+    thread = threading.Thread(target=limiter.run_sync, args=(lambda: None, 3))
+    thread.start()
+    time.sleep(0.1)
+    assert limiter.in_flight == 0
+    thread.join()
+    assert limiter.succeeded == 1
@@ -0,0 +1,27 @@
+from services.runorm_service import normalize_texts
+from tests.fake_runorm import FakeRUNorm
+
+TEXTS = [
+    "В 2024 году было 15 КГ. Привет мир!",
+    "МГУ открыт с 9 утра",
+    "",
+    "   ",
+    "Нет чисел тут",
+    "В 2024 году было 15 КГ. Привет мир!",
+    "Test word и 3 ТВ.",
+    "Дом № 1 и 2 ГБ. Второе предложение с 3.",
+]
+
+
+def test_batched_normalization_matches_norm():
+    normalizer = FakeRUNorm()
+    expected = [normalizer.norm(text) for text in TEXTS]
+
+    normalizer.abbr_model.calls = 0
+    assert normalize_texts(normalizer, TEXTS, batch_size=2) == expected
+    # Повторяющийся текст нормализуется один раз, модель вызывается батчами
+    assert normalizer.abbr_model.calls < sum(len(normalizer.split_by_sentences(text)) for text in TEXTS)
+
+
+def test_whitespace_only_text_is_normalized_to_empty():
+    assert normalize_texts(FakeRUNorm(), ["", "  \n"], batch_size=4) == ["", ""]
@@ -0,0 +1,22 @@
+import json
+import os
+
+from models.mock_client import MockLLMClient
+from services.text_generator import generate_multiple_topics, topic_file_name
+
+
+def read_pairs(path):
+    with open(path, encoding="utf-8") as topic_file:
+        return [json.loads(line) for line in topic_file]
+
+
+def test_topics_with_common_prefix_get_own_files(tmp_path):
+    prefix = "Очень длинная тема про путешествия по"
+    topics = [f"{prefix} Италии", f"{prefix} Испании", f"{prefix} Италии"]
+    generate_multiple_topics(topics, str(tmp_path), MockLLMClient(latency=0.01), batch_size=4,
+                             num_samples=8, parallel_topics=3)
+
+    assert topic_file_name(topics[0]) != topic_file_name(topics[1])
+    assert sorted(os.listdir(tmp_path)) == sorted({topic_file_name(topic) for topic in topics})
+    for topic in topics[:2]:
+        assert len(read_pairs(tmp_path / topic_file_name(topic))) == 8
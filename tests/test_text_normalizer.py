@@ -0,0 +1,49 @@
+import pytest
+
+from services.text_normalizer import normalize_text
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("1 мая", "первое мая"),
+    ("31 декабря 1999 года", "тридцать первое декабря тысяча девятьсот девяносто девятого года"),
+    ("Встреча 12.05.2023.", "Встреча двенадцатое мая две тысячи двадцать третьего года."),
+    ("В 2024 г. было", "В две тысячи двадцать четвертом году было"),
+    ("с 2020 г. цены", "с две тысячи двадцатого года цены"),
+    ("Отчет за 2024 г.", "Отчет за две тысячи двадцать четвертый год."),
+    ("150 г.", "сто пятьдесят граммов."),
+    ("3 кг 200 г.", "три килограмма двести граммов."),
+    ("с 9:00 до 18:00", "с девяти ноль-ноль до восемнадцати ноль-ноль"),
+    ("к 10:00", "к десяти ноль-ноль"),
+    ("с 9:05 до 13:45", "с девяти ноль пяти до тринадцати сорока пяти"),
+    ("Начало в 10:30", "Начало в десять тридцать"),
+    ("3 тыс. рублей", "три тысячи рублей"),
+    ("Стоит 3 тыс. Дорого", "Стоит три тысячи. Дорого"),
+    ("1 окно", "одно окно"),
+    ("2 ложки", "две ложки"),
+])
+def test_normalized(text, expected):
+    assert normalize_text(text) == expected
+
+
+@pytest.mark.parametrize("text", [
+    "счет 1:2",
+    "версия 1.2",
+    "5 - 3",
+    "до 1 мая",
+    "между 9:00 и 10:00",
+    "в 1 случае",
+    "по 1 таблетке",
+    "в 21 веке",
+    "на 3 этаже",
+    "в 10 классе",
+    "в 1 часу ночи",
+    "1 время",
+    "1 имя",
+    "2 имени",
+    "2 такси",
+    "Он пришел 1-м",
+    "1-й подъезд",
+    "Итоги 2024 г.",
+])
+def test_left_to_llm(text):
+    assert normalize_text(text) is None
@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+from models.mock_client import MockLLMClient
+from services.text_postprocessing import convert_with_bisection, process_jsonl_file
+
+ROWS = [
+    json.dumps({"id": index, "user_query": f"Вопрос {index}", "ai_response": f"Ответ {index}"},
+               ensure_ascii=False)
+    for index in range(1, 5)
+]
+
+
+class DroppingClient(MockLLMClient):
+    """Теряет строку с id=3, как модель, склеившая две записи"""
+
+    def __init__(self):
+        super().__init__(latency=0)
+
+    async def achat(self, messages, temperature=0.7, response_format=None):
+        response = json.loads(await super().achat(messages, temperature, response_format))
+        response["pairs"] = [pair for pair in response["pairs"] if pair["id"] != 3]
+        return json.dumps(response, ensure_ascii=False)
+
+
+class OfflineClient(MockLLMClient):
+    def __init__(self):
+        super().__init__(latency=0)
+        self.calls = 0
+
+    async def achat(self, messages, temperature=0.7, response_format=None):
+        self.calls += 1
+        raise ConnectionError("сеть недоступна")
+
+
+def test_bad_row_is_isolated():
+    rejected = []
+    pairs = convert_with_bisection(ROWS, DroppingClient(), rejected)
+    assert [pair.id for pair in pairs] == [1, 2, 4]
+    assert rejected == [ROWS[2]]
+
+
+def test_network_error_is_not_bisected():
+    client = OfflineClient()
+    rejected = []
+    with pytest.raises(ConnectionError):
+        convert_with_bisection(ROWS, client, rejected)
+    assert client.calls == 1
+    assert rejected == []
+
+
+def test_failed_batch_is_rejected_and_run_continues(tmp_path):
+    input_path = tmp_path / "input.jsonl"
+    reject_path = tmp_path / "rejected.jsonl"
+    # Первая строка решается правилами, вторая требует LLM
+    rows = [
+        json.dumps({"id": 1, "user_query": "Сколько стоит?", "ai_response": "5 рублей"}, ensure_ascii=False),
+        json.dumps({"id": 2, "user_query": "Счет?", "ai_response": "1:2"}, ensure_ascii=False),
+    ]
+    input_path.write_text("".join(row + "\n" for row in rows), encoding="utf-8")
+
+    pairs = [pair for batch in process_jsonl_file(str(input_path), OfflineClient(), batch_size=1,
+                                                  reject_file_path=str(reject_path))
+             for pair in batch]
+
+    assert [pair.id for pair in pairs] == [1]
+    assert pairs[0].ai_response == "пять рублей"
+    assert reject_path.read_text(encoding="utf-8") == rows[1] + "\n"
@@ -1,5 +1,8 @@
 import contextlib
+import gzip
+import io
 import wave
+from typing import IO, Iterator
 
 import torch
 
@@ -18,6 +21,32 @@ def get_wav_duration(file_path: str) -> float:
         duration = frames / float(rate)
         return duration
 
+
+@contextlib.contextmanager
+def open_text_stream(file_path: str) -> Iterator[tuple[IO[str], IO[bytes]]]:
+    """
+    Открывает текстовый файл для потокового чтения, в т.ч. сжатый (.gz, .zst).
+    Возвращает пару (текстовый поток, сырой файл): позиция сырого файла
+    показывает, сколько байт на диске уже прочитано.
+    """
+    raw_file = open(file_path, "rb")
+    try:
+        if file_path.endswith(".gz"):
+            binary_stream = gzip.GzipFile(fileobj=raw_file, mode="rb")
+        elif file_path.endswith(".zst"):
+            try:
+                import zstandard
+            except ImportError as e:
+                raise RuntimeError("Для чтения .zst файлов установите пакет zstandard") from e
+            binary_stream = zstandard.ZstdDecompressor().stream_reader(raw_file)
+        else:
+            binary_stream = raw_file
+        with io.TextIOWrapper(binary_stream, encoding="utf-8") as text_stream:
+            yield text_stream, raw_file
+    finally:
+        raw_file.close()
+
+
 def format_duration(seconds: float) -> str:
     hours = int(seconds // 3600)
     minutes = int((seconds % 3600) // 60)